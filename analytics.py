@@ -0,0 +1,374 @@
+"""
+Analytics - Dashboard queries over conversation qualification data
+
+Dashboards read pre-aggregated daily rollups (conversation_daily_stats)
+instead of scanning conversations. refresh_daily_rollups() recomputes the
+rollups for a range of days, plus any earlier day whose conversations were
+updated since the previous refresh started (a stage change or conversion on
+an old conversation) or that an import marked dirty. The app refreshes recent days periodically and older ranges
+can be backfilled from the command line:
+
+    python analytics.py refresh --days 90
+    python analytics.py explain            # EXPLAIN ANALYZE each dashboard query
+"""
+
+import asyncio
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import Date, Integer, cast, delete, false, func, insert, select, text
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+
+import database
+from models import Conversation, ConversationDailyStats, RollupDirtyDay, RollupRefresh
+
+logger = logging.getLogger(__name__)
+
+# Seconds between rollup refreshes in the app, 0 disables (use the CLI or cron)
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("ANALYTICS_REFRESH_SECONDS", "900"))
+
+# Days (including today) recomputed on each periodic refresh; earlier days
+# are recomputed only when their conversations were updated since the last one
+ANALYTICS_REFRESH_DAYS = int(os.getenv("ANALYTICS_REFRESH_DAYS", "2"))
+
+GROUP_BY_FIELDS = ("current_stage", "quality_tier", "industry")
+
+UNKNOWN = "unknown"
+
+# pg_advisory_xact_lock key serializing refreshes across workers and replicas
+ROLLUP_LOCK_KEY = 7301002
+
+# rollup_refreshes row holding the start of the last daily rollup refresh
+ROLLUP_REFRESH_NAME = "daily"
+
+# Updates this much older than the last refresh still count as new, for
+# writes that committed after that refresh took its snapshot
+_UPDATE_OVERLAP = timedelta(minutes=5)
+
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _rollup_key(column):
+    return func.coalesce(column, UNKNOWN)
+
+
+def rollup_statements(start: date, end: date):
+    """
+    DELETE and INSERT ... SELECT that recompute rollups for [start, end].
+
+    Days are UTC. The whole range is replaced rather than upserted so groups
+    that no longer have conversations (e.g. after a stage change) disappear.
+    """
+    day = cast(func.timezone("UTC", Conversation.created_at), Date)
+    stage = _rollup_key(Conversation.current_stage)
+    tier = _rollup_key(Conversation.quality_tier)
+    industry = _rollup_key(Conversation.industry)
+
+    aggregate = (
+        select(
+            day,
+            stage,
+            tier,
+            industry,
+            func.count(),
+            func.count().filter(Conversation.converted.is_(True)),
+            func.coalesce(func.sum(func.json_array_length(Conversation.messages)), 0),
+            func.coalesce(func.sum(Conversation.qualification_score), 0.0),
+        )
+        .where(
+            Conversation.created_at >= _day_start(start),
+            Conversation.created_at < _day_start(end + timedelta(days=1)),
+        )
+        .group_by(day, stage, tier, industry)
+    )
+
+    remove = delete(ConversationDailyStats).where(
+        ConversationDailyStats.day >= start,
+        ConversationDailyStats.day <= end,
+    )
+    add = insert(ConversationDailyStats).from_select(
+        [
+            "day", "current_stage", "quality_tier", "industry",
+            "conversations", "converted", "messages", "qualification_score_sum",
+        ],
+        aggregate,
+    )
+    return remove, add
+
+
+def updated_days_statement(since: datetime, before: date):
+    """Days (UTC, by created_at) before `before` with conversations updated since `since`"""
+    day = cast(func.timezone("UTC", Conversation.created_at), Date)
+    return (
+        select(day)
+        .where(
+            Conversation.updated_at >= since,
+            Conversation.created_at < _day_start(before),
+        )
+        .distinct()
+        .order_by(day)
+    )
+
+
+def refresh_watermark_statement():
+    """Record that a refresh started now (transaction time)"""
+    stmt = pg_insert(RollupRefresh).values(name=ROLLUP_REFRESH_NAME, started_at=func.now())
+    return stmt.on_conflict_do_update(
+        index_elements=[RollupRefresh.name],
+        set_={"started_at": stmt.excluded.started_at},
+    )
+
+
+async def refresh_daily_rollups(
+    start: date, end: date = None, if_older_than: Optional[float] = None
+) -> Optional[int]:
+    """
+    Recompute daily rollups for [start, end] in one transaction.
+
+    Days before `start` are recomputed too when their conversations were
+    updated since the previous refresh started, or when an import marked
+    them dirty, so the rollups follow stage and conversion changes on older
+    conversations. Refreshes by several workers or replicas run one at a
+    time under an advisory lock; with if_older_than, a refresh is skipped
+    when anyone started one within that many seconds.
+
+    Args:
+        start: First day (UTC)
+        end: Last day (UTC), default today
+        if_older_than: Skip if the last refresh is newer than this (seconds)
+
+    Returns:
+        Number of rollup rows written, None if skipped
+    """
+    end = end or datetime.now(timezone.utc).date()
+    async with database.engine.begin() as conn:
+        await conn.execute(select(func.pg_advisory_xact_lock(ROLLUP_LOCK_KEY)))
+        last_refresh = (await conn.execute(
+            select(RollupRefresh.started_at).where(RollupRefresh.name == ROLLUP_REFRESH_NAME)
+        )).scalar()
+        if (
+            if_older_than is not None and last_refresh is not None
+            and datetime.now(timezone.utc) - last_refresh < timedelta(seconds=if_older_than)
+        ):
+            logger.debug("Analytics rollups refreshed at %s, skipping refresh", last_refresh)
+            return None
+        # The watermark moves on every run, whether or not rows are written
+        await conn.execute(refresh_watermark_statement())
+
+        days = set((await conn.execute(delete(RollupDirtyDay).returning(RollupDirtyDay.day))).scalars())
+        if last_refresh is not None:
+            days.update((await conn.execute(
+                updated_days_statement(last_refresh - _UPDATE_OVERLAP, start)
+            )).scalars())
+        earlier = sorted(day for day in days if day < start)
+        rows = 0
+        for first, last in [(start, end)] + [(day, day) for day in earlier]:
+            remove, add = rollup_statements(first, last)
+            await conn.execute(remove)
+            rows += (await conn.execute(add)).rowcount
+    logger.info("Refreshed analytics rollups %s..%s and %d earlier days (%s rows)",
+                start, end, len(earlier), rows)
+    return rows
+
+
+def daily_series_statement(
+    start: date,
+    end: date,
+    group_by: Optional[str] = None,
+    filters: Optional[Dict[str, str]] = None
+):
+    """Per-day totals from the rollups, optionally split by one dimension"""
+    stats = ConversationDailyStats
+    columns = [stats.day]
+    if group_by:
+        columns.append(getattr(stats, group_by))
+
+    conversations = func.sum(stats.conversations)
+    statement = select(
+        *columns,
+        cast(conversations, Integer).label("conversations"),
+        cast(func.sum(stats.converted), Integer).label("converted"),
+        cast(func.sum(stats.messages), Integer).label("messages"),
+        (func.sum(stats.qualification_score_sum) / func.nullif(conversations, 0)).label("avg_qualification_score"),
+    ).where(stats.day >= start, stats.day <= end)
+
+    for field, value in (filters or {}).items():
+        statement = statement.where(getattr(stats, field) == value)
+    return statement.group_by(*columns).order_by(*columns)
+
+
+def funnel_statement(start: date, end: date, filters: Optional[Dict[str, str]] = None):
+    """Conversations and conversions per stage over a date range, from the rollups"""
+    stats = ConversationDailyStats
+    statement = select(
+        stats.current_stage,
+        cast(func.sum(stats.conversations), Integer).label("conversations"),
+        cast(func.sum(stats.converted), Integer).label("converted"),
+    ).where(stats.day >= start, stats.day <= end)
+
+    for field, value in (filters or {}).items():
+        statement = statement.where(getattr(stats, field) == value)
+    return statement.group_by(stats.current_stage).order_by(stats.current_stage)
+
+
+def open_leads_statement(
+    since: datetime,
+    quality_tier: Optional[str] = None,
+    pain_point: Optional[str] = None,
+    limit: int = 50
+):
+    """
+    Most recent unconverted conversations.
+
+    Filters on converted = false exactly as the partial index is defined, and
+    on CAST(pain_points AS JSONB) @> [pain_point] so the GIN index applies.
+    """
+    statement = select(
+        Conversation.session_id,
+        Conversation.email,
+        Conversation.name,
+        Conversation.company,
+        Conversation.industry,
+        Conversation.current_stage,
+        Conversation.quality_tier,
+        Conversation.qualification_score,
+        Conversation.created_at,
+    ).where(Conversation.converted == false(), Conversation.created_at >= since)
+
+    if quality_tier:
+        statement = statement.where(Conversation.quality_tier == quality_tier)
+    if pain_point:
+        statement = statement.where(
+            cast(Conversation.pain_points, JSONB).contains(func.jsonb_build_array(pain_point))
+        )
+    return statement.order_by(Conversation.created_at.desc()).limit(limit)
+
+
+async def _fetch_all(statement) -> List[Dict]:
+    async with database.autocommit_engine.connect() as conn:
+        result = await conn.execute(statement)
+        rows = result.mappings().all()
+    return [_serialize(row) for row in rows]
+
+
+async def daily_series(start: date, end: date, group_by: str = None, filters: Dict[str, str] = None) -> List[Dict]:
+    """Per-day conversation totals, see daily_series_statement()"""
+    return await _fetch_all(daily_series_statement(start, end, group_by, filters))
+
+
+async def funnel(start: date, end: date, filters: Dict[str, str] = None) -> List[Dict]:
+    """Per-stage totals, see funnel_statement()"""
+    return await _fetch_all(funnel_statement(start, end, filters))
+
+
+async def open_leads(since: datetime, quality_tier: str = None, pain_point: str = None, limit: int = 50) -> List[Dict]:
+    """Recent unconverted conversations, see open_leads_statement()"""
+    return await _fetch_all(open_leads_statement(since, quality_tier, pain_point, limit))
+
+
+def _serialize(row) -> Dict:
+    data = dict(row)
+    for key, value in data.items():
+        if isinstance(value, (date, datetime)):
+            data[key] = value.isoformat()
+    return data
+
+
+async def _refresh_loop():
+    while True:
+        try:
+            today = datetime.now(timezone.utc).date()
+            # Every worker runs this loop; only the first one per interval refreshes
+            await refresh_daily_rollups(
+                today - timedelta(days=ANALYTICS_REFRESH_DAYS - 1), today,
+                if_older_than=ANALYTICS_REFRESH_SECONDS / 2
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Analytics rollup refresh failed: {e}")
+        await asyncio.sleep(ANALYTICS_REFRESH_SECONDS)
+
+
+def start_rollup_refresh() -> Optional[asyncio.Task]:
+    """Refresh recent rollups every ANALYTICS_REFRESH_SECONDS in the background"""
+    global _refresh_task
+    if _refresh_task is None and ANALYTICS_REFRESH_SECONDS > 0 and database.engine is not None:
+        _refresh_task = asyncio.create_task(_refresh_loop())
+    return _refresh_task
+
+
+async def stop_rollup_refresh():
+    """Cancel the background refresh"""
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
+
+
+async def _explain(days: int):
+    """Print EXPLAIN ANALYZE plans for the dashboard queries"""
+    end = datetime.now(timezone.utc).date()
+    start = end - timedelta(days=days)
+    since = _day_start(start)
+    queries = {
+        "daily series by tier": daily_series_statement(start, end, "quality_tier"),
+        "funnel for one industry": funnel_statement(start, end, {"industry": "SaaS"}),
+        "open leads": open_leads_statement(since, limit=50),
+        "open high-tier leads": open_leads_statement(since, quality_tier="high"),
+        "open leads by pain point": open_leads_statement(since, pain_point="lead generation"),
+        "all-time count by pain point": select(func.count()).select_from(Conversation).where(
+            cast(Conversation.pain_points, JSONB).contains(func.jsonb_build_array("lead generation"))
+        ),
+        "live count by stage (no rollup)": select(func.count()).select_from(Conversation).where(
+            Conversation.current_stage == "qualification",
+            Conversation.created_at >= since,
+        ),
+    }
+    dialect = database.engine.dialect
+    async with database.autocommit_engine.connect() as conn:
+        for name, statement in queries.items():
+            sql = str(statement.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+            result = await conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"))
+            print(f"--- {name}")
+            for (line,) in result:
+                print(line)
+            print()
+
+
+async def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Conversation analytics rollups")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    refresh = subcommands.add_parser("refresh", help="recompute daily rollups")
+    refresh.add_argument("--days", type=int, default=ANALYTICS_REFRESH_DAYS, help="days back from today")
+    explain = subcommands.add_parser("explain", help="show query plans for dashboard queries")
+    explain.add_argument("--days", type=int, default=30, help="date range of the queries")
+    args = parser.parse_args()
+
+    try:
+        await database.init_db()
+        if args.command == "refresh":
+            today = datetime.now(timezone.utc).date()
+            rows = await refresh_daily_rollups(today - timedelta(days=args.days - 1), today)
+            print(f"{rows} rollup rows for the last {args.days} days")
+        else:
+            await _explain(args.days)
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
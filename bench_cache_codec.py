@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Cache Codec Benchmark
+Measure the Redis footprint of cached conversations over a synthetic corpus:
+bytes per entry for the legacy plain JSON strings and for each codec setting,
+plus encode/decode cost per entry
+
+Usage:
+    python bench_cache_codec.py
+    python bench_cache_codec.py --conversations 2000 --max-turns 80
+    REDIS_URL=redis://localhost:6379 python bench_cache_codec.py --redis   # also MEMORY USAGE per key
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+import cache_codec
+from cache_codec import RAW, ZLIB, ZSTD, decode, encode
+
+logging.disable(logging.CRITICAL)
+
+WORDS = [
+    "launch", "market", "customer", "pipeline", "revenue", "growth", "insight",
+    "platform", "strategy", "automation", "qualified", "demo", "analysis", "a",
+    "the", "and", "with", "for", "your", "team", "AI-powered", "competitor",
+    "budget", "timeline", "integration", "onboarding", "pricing", "leads",
+]
+
+
+def build_corpus(count: int, max_turns: int, seed: int = 42) -> list:
+    """Build conversation payloads shaped like the get_conversation response"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    corpus = []
+    for i in range(count):
+        # Most conversations are short, a long tail runs for many turns
+        turns = min(max_turns, int(rng.paretovariate(1.2)) * 2)
+        created = start + timedelta(minutes=rng.randrange(500000))
+        messages = []
+        for t in range(turns):
+            role = "user" if t % 2 == 0 else "assistant"
+            length = rng.randint(5, 40) if role == "user" else rng.randint(40, 250)
+            messages.append({
+                "role": role,
+                "content": " ".join(rng.choice(WORDS) for _ in range(length)),
+                "timestamp": (created + timedelta(seconds=30 * t)).isoformat(),
+            })
+        corpus.append({
+            "id": i + 1,
+            "session_id": f"session-{rng.getrandbits(64):016x}",
+            "email": f"lead{i}@example.com",
+            "name": f"Lead {i}",
+            "company": f"Company {i % 300}",
+            "messages": messages,
+            "current_stage": rng.choice(["discovery", "qualification", "demo", "closing"]),
+            "qualification_score": rng.randint(0, 100),
+            "created_at": created.isoformat(),
+        })
+    return corpus
+
+
+def measure(name: str, corpus: list, encoder, decoder, legacy_total: int):
+    start = time.perf_counter()
+    encoded = [encoder(item) for item in corpus]
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value in encoded:
+        decoder(value)
+    decode_s = time.perf_counter() - start
+
+    total = sum(len(value) for value in encoded)
+    sizes = sorted(len(value) for value in encoded)
+    print(f"{name:<22} {total / 1024:>10.0f} KB  {total / legacy_total:>6.1%}  "
+          f"p50 {sizes[len(sizes) // 2]:>7} B  max {sizes[-1]:>8} B  "
+          f"enc {encode_s / len(corpus) * 1e6:>7.1f} us  dec {decode_s / len(corpus) * 1e6:>7.1f} us")
+    return encoded
+
+
+def measure_redis(corpus: list, variants: dict):
+    """Write each variant to Redis and sum MEMORY USAGE over the keys"""
+    import redis
+    from redis_client import REDIS_URL
+
+    client = redis.from_url(REDIS_URL)
+    print()
+    print(f"Redis MEMORY USAGE ({REDIS_URL})")
+    for name, encoded in variants.items():
+        keys = [f"bench:cache_codec:{name}:{i}" for i in range(len(corpus))]
+        pipe = client.pipeline(transaction=False)
+        for key, value in zip(keys, encoded):
+            pipe.setex(key, 300, value)
+        pipe.execute()
+
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.memory_usage(key, samples=0)
+        used = sum(u or 0 for u in pipe.execute())
+        client.delete(*keys)
+        print(f"{name:<22} {used / 1024:>10.0f} KB  {used / len(corpus):>8.0f} B/key")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cache encodings for conversation payloads")
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--max-turns", type=int, default=60)
+    parser.add_argument("--redis", action="store_true", help="also measure MEMORY USAGE in Redis")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.conversations, args.max_turns)
+    legacy = [json.dumps(item) for item in corpus]
+    legacy_total = sum(len(value.encode("utf-8")) for value in legacy)
+
+    print("=" * 100)
+    print(f"{args.conversations} conversations, "
+          f"{sum(len(c['messages']) for c in corpus)} messages, codec {cache_codec.describe()}")
+    print("=" * 100)
+
+    variants = {
+        "legacy json.dumps": measure("legacy json.dumps", corpus, json.dumps, json.loads, legacy_total),
+        "codec raw": measure("codec raw", corpus, lambda d: encode(d, compression=RAW), decode, legacy_total),
+        "codec zlib": measure("codec zlib", corpus, lambda d: encode(d, compression=ZLIB), decode, legacy_total),
+    }
+    if cache_codec.zstandard is not None:
+        variants["codec zstd"] = measure(
+            "codec zstd", corpus, lambda d: encode(d, compression=ZSTD), decode, legacy_total
+        )
+    variants["codec (configured)"] = measure("codec (configured)", corpus, encode, decode, legacy_total)
+
+    if args.redis:
+        measure_redis(corpus, variants)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Content Processor Benchmark
+Measure HTML chunking throughput and peak memory on large inputs, and CPU
+per request for the full HTML pipeline (separate passes vs fused pass)
+
+Usage:
+    python bench_content_processor.py            # ~1MB input (chunker limit)
+    python bench_content_processor.py --size 100000 --runs 10
+    python bench_content_processor.py --pipeline # sanitize+validate+analyze+chunk
+"""
+import argparse
+import logging
+import random
+import time
+import tracemalloc
+
+from content_processor import MAX_CONTENT_SIZE, ChunkStream, chunk_html_by_words, iter_html_chunks
+
+# Chunker logs per call; keep benchmark output clean
+logging.disable(logging.CRITICAL)
+
+WORDS = [
+    "launch", "market", "customer", "pipeline", "revenue", "growth", "insight",
+    "platform", "strategy", "automation", "qualified", "demo", "analysis", "a",
+    "the", "and", "with", "for", "your", "team", "AI-powered", "competitor",
+]
+
+
+def build_html(size: int, seed: int = 42) -> str:
+    """Build realistic Tiptap-style HTML of roughly `size` characters"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+
+    def sentence(n):
+        words = [rng.choice(WORDS) for _ in range(n)]
+        if rng.random() < 0.2:
+            i = rng.randrange(n)
+            words[i] = f'<a href="https://example.com/{words[i]}">{words[i]}</a>'
+        if rng.random() < 0.3:
+            i = rng.randrange(n)
+            words[i] = f"<strong>{words[i]}</strong>"
+        return " ".join(words) + "."
+
+    while True:
+        kind = rng.random()
+        if kind < 0.6:
+            block = "<p>" + " ".join(sentence(rng.randint(6, 18)) for _ in range(rng.randint(1, 4))) + "</p>\n"
+        elif kind < 0.75:
+            level = rng.randint(2, 3)
+            block = f"<h{level}>{sentence(4)}</h{level}>\n"
+        elif kind < 0.9:
+            items = "".join(f"<li>{sentence(rng.randint(3, 8))}</li>" for _ in range(rng.randint(2, 5)))
+            block = f"<ul>{items}</ul>\n"
+        else:
+            block = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 40))) + "<br>\n"
+
+        if total + len(block) > size:
+            break
+        parts.append(block)
+        total += len(block)
+
+    return "".join(parts)
+
+
+def measure(label: str, fn, runs: int):
+    """Run fn `runs` times; report best wall time and peak traced memory"""
+    best = float("inf")
+    chunk_count = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        chunk_count = fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<28} {best * 1000:9.1f} ms  {chunk_count / best:12,.0f} chunks/s  "
+          f"peak {peak / 1024 / 1024:7.2f} MB")
+
+
+def measure_pipeline(label: str, html: str, fused: bool, runs: int):
+    """Report CPU time per request for the whole HTML chunking pipeline"""
+    cpu_times = []
+    chunk_count = 0
+    for _ in range(runs):
+        start = time.process_time()
+        stream = ChunkStream(html, "html", "word", fused_html=fused)
+        chunk_count = sum(1 for _ in stream)
+        cpu_times.append(time.process_time() - start)
+
+    cpu_times.sort()
+    median = cpu_times[len(cpu_times) // 2]
+    print(f"{label:<28} {median * 1000:9.2f} ms CPU/request (median)  "
+          f"best {cpu_times[0] * 1000:8.2f} ms  {chunk_count:,} chunks")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML chunking")
+    parser.add_argument("--size", type=int, default=MAX_CONTENT_SIZE, help="input size in characters")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per case (best is reported)")
+    parser.add_argument("--max-chunk-size", type=int, default=1000)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="compare CPU/request of separate vs fused HTML passes")
+    args = parser.parse_args()
+
+    html = build_html(min(args.size, MAX_CONTENT_SIZE))
+
+    if args.pipeline:
+        print("=" * 78)
+        print(f"HTML pipeline benchmark: {len(html):,} chars")
+        print("=" * 78)
+        measure_pipeline("separate passes", html, fused=False, runs=args.runs)
+        measure_pipeline("fused pass", html, fused=True, runs=args.runs)
+        return
+
+    print("=" * 78)
+    print(f"HTML chunking benchmark: {len(html):,} chars, max_chunk_size={args.max_chunk_size}")
+    print("=" * 78)
+
+    measure(
+        "chunk_html_by_words (list)",
+        lambda: len(chunk_html_by_words(html, args.max_chunk_size)),
+        args.runs,
+    )
+    measure(
+        "iter_html_chunks (stream)",
+        lambda: sum(1 for _ in iter_html_chunks(html, args.max_chunk_size)),
+        args.runs,
+    )
+
+
+if __name__ == "__main__":
+    main()
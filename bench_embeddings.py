@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Embeddings Benchmark
+Measure embeddings/sec through EmbeddingService for one request at a time
+(each text its own provider call) and for concurrent callers sharing
+micro-batches, plus cached repeats
+
+Providers: the hashing embedder, a stub gateway with a fixed round trip per
+call, the local sentence-transformers model when installed, and the real
+gateway with --gateway
+
+Usage:
+    python bench_embeddings.py
+    python bench_embeddings.py --texts 2000 --concurrency 64 --rtt-ms 40
+    LLM_GATEWAY_URL=http://gateway:8000 python bench_embeddings.py --gateway
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import random
+import time
+
+import httpx
+
+import llm_client
+from embeddings import EMBEDDING_MODEL, EmbeddingService, GatewayEmbedder, HashingEmbedder, LocalEmbedder
+
+logging.disable(logging.CRITICAL)
+
+WORDS = [
+    "pricing", "integration", "salesforce", "hubspot", "onboarding", "security",
+    "support", "contract", "trial", "seats", "api", "reporting", "leads", "team",
+    "how", "does", "do", "you", "the", "with", "for", "what", "is", "our",
+]
+
+
+def build_texts(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    return [f"{i} " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 20))) + "?" for i in range(count)]
+
+
+def stub_gateway(rtt: float, per_text: float, dim: int = 1536) -> httpx.AsyncClient:
+    """A gateway that answers after rtt seconds plus per_text per input"""
+    embedder = HashingEmbedder(dim)
+
+    async def handler(request):
+        texts = httpx.Response(200, content=request.content).json()["input"]
+        await asyncio.sleep(rtt + per_text * len(texts))
+        return httpx.Response(200, json={"data": [
+            {"index": i, "embedding": embedder.embed_one(text)} for i, text in enumerate(texts)
+        ]})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def single(provider, texts: list) -> float:
+    """One caller, one text per provider call"""
+    service = EmbeddingService(provider, window=0, cache_size=0, cache_ttl=0)
+    start = time.perf_counter()
+    for text in texts:
+        await service.embed(text)
+    return len(texts) / (time.perf_counter() - start)
+
+
+async def batched(provider, texts: list, concurrency: int, window: float, max_batch: int):
+    """`concurrency` callers sharing micro-batches; then the same texts again from the LRU"""
+    service = EmbeddingService(provider, window=window, max_batch=max_batch, cache_ttl=0)
+    queue = iter(texts)
+
+    async def caller():
+        for text in queue:
+            await service.embed(text)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    rate = len(texts) / (time.perf_counter() - start)
+    avg_batch = service.stats()["avg_batch"]
+
+    start = time.perf_counter()
+    for text in texts:
+        await service.embed(text)
+    cached = len(texts) / (time.perf_counter() - start)
+    return rate, avg_batch, cached
+
+
+async def run(name: str, provider, texts: list, args):
+    # Slow providers get a smaller sample for the one-at-a-time path
+    single_texts = texts[: args.single_texts] if args.single_texts else texts
+    single_rate = await single(provider, single_texts)
+    rate, avg_batch, cached = await batched(provider, texts, args.concurrency, args.window_ms / 1000, args.max_batch)
+    print(f"{name:<28} single {single_rate:>10.0f}/s   batched {rate:>10.0f}/s  "
+          f"(x{rate / single_rate:>5.1f}, avg batch {avg_batch:>5.1f})   cached {cached:>10.0f}/s")
+
+
+async def main_async(args):
+    texts = build_texts(args.texts)
+    print("=" * 78)
+    print(f"{args.texts} texts, {args.concurrency} concurrent callers, "
+          f"window {args.window_ms} ms, max batch {args.max_batch}")
+    print("=" * 78)
+
+    await run("hashing", HashingEmbedder(), texts, args)
+
+    client = stub_gateway(args.rtt_ms / 1000, args.per_text_us / 1e6)
+    llm_client._http_client, llm_client.LLM_GATEWAY_URL = client, "http://stub"
+    await run(f"stub gateway ({args.rtt_ms:g} ms rtt)", GatewayEmbedder(), texts, args)
+    await client.aclose()
+    llm_client._http_client = None
+
+    if importlib.util.find_spec("sentence_transformers") is not None:
+        local = LocalEmbedder()
+        await local.embed_many(["warm up"])
+        await run("local", local, texts, args)
+    else:
+        print(f"{'local':<28} skipped (pip install sentence-transformers)")
+
+    if args.gateway:
+        llm_client.LLM_GATEWAY_URL = args.gateway_url
+        await run(f"gateway ({EMBEDDING_MODEL})", GatewayEmbedder(), texts, args)
+        await llm_client.close_http_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single vs micro-batched embedding throughput")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--single-texts", type=int, default=200, help="texts for the one-at-a-time path (0: all)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--window-ms", type=float, default=5)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--rtt-ms", type=float, default=20, help="stub gateway round trip per call")
+    parser.add_argument("--per-text-us", type=float, default=50, help="stub gateway cost per text")
+    parser.add_argument("--gateway", action="store_true", help="also measure the real gateway (LLM_GATEWAY_URL)")
+    args = parser.parse_args()
+    args.gateway_url = llm_client.LLM_GATEWAY_URL
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
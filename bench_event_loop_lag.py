@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Event Loop Lag Benchmark
+Convert large markdown responses concurrently and measure how much the event
+loop stalls with inline conversion vs the conversion worker pool
+
+Usage:
+    python bench_event_loop_lag.py                     # 20 x ~100KB conversions
+    python bench_event_loop_lag.py --size 50000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+
+import conversion_executor
+from conversion_executor import convert_markdown, shutdown_conversion_pool, start_conversion_pool
+from loop_monitor import LoopLagMonitor
+
+# Converter and pool log per call; keep benchmark output clean
+logging.disable(logging.CRITICAL)
+
+WORDS = [
+    "launch", "market", "customer", "pipeline", "revenue", "growth", "insight",
+    "platform", "strategy", "automation", "qualified", "demo", "analysis", "a",
+    "the", "and", "with", "for", "your", "team", "AI-powered", "competitor",
+]
+
+
+def build_markdown(size: int, seed: int = 7) -> str:
+    """Build an LLM-style markdown response of roughly `size` characters"""
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+
+    def sentence(n):
+        words = [rng.choice(WORDS) for _ in range(n)]
+        if rng.random() < 0.3:
+            i = rng.randrange(n)
+            words[i] = f"**{words[i]}**"
+        if rng.random() < 0.2:
+            i = rng.randrange(n)
+            words[i] = f"[{words[i]}](https://example.com/{words[i]})"
+        return " ".join(words) + "."
+
+    while total < size:
+        kind = rng.random()
+        if kind < 0.15:
+            block = f"## {sentence(4)}\n\n"
+        elif kind < 0.6:
+            block = " ".join(sentence(rng.randint(6, 18)) for _ in range(rng.randint(2, 5))) + "\n\n"
+        elif kind < 0.85:
+            block = "".join(f"- {sentence(rng.randint(3, 8))}\n" for _ in range(rng.randint(2, 6))) + "\n"
+        else:
+            block = "```python\n" + "\n".join(f"x = {rng.randint(0, 99)}" for _ in range(5)) + "\n```\n\n"
+        parts.append(block)
+        total += len(block)
+
+    return "".join(parts)
+
+
+async def run_case(label: str, markdown: str, concurrency: int, inline: bool):
+    """Run `concurrency` conversions at once and report loop lag and wall time"""
+    conversion_executor.CONVERSION_INLINE_MAX_CHARS = len(markdown) + 1 if inline else 0
+
+    monitor = LoopLagMonitor(interval=0.01, window=100_000)
+    monitor.start()
+    await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(convert_markdown(markdown) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    stats = monitor.stats()
+    print(f"{label:<10} wall {elapsed * 1000:8.0f} ms   loop lag p99 {stats['p99_ms']:8.1f} ms   "
+          f"max {stats['max_ms']:8.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark event loop lag during conversion")
+    parser.add_argument("--size", type=int, default=100_000, help="markdown size in characters")
+    parser.add_argument("--concurrency", type=int, default=20, help="conversions started at once")
+    args = parser.parse_args()
+
+    markdown = build_markdown(args.size)
+
+    print("=" * 78)
+    print(f"Event loop lag: {args.concurrency} concurrent conversions of {len(markdown):,} chars, "
+          f"{conversion_executor.CONVERSION_WORKERS} workers")
+    print("=" * 78)
+
+    start_conversion_pool()
+    try:
+        # Warm the workers up so process start-up isn't measured
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = 0
+        await asyncio.gather(*(convert_markdown(markdown) for _ in range(conversion_executor.CONVERSION_WORKERS)))
+
+        await run_case("inline", markdown, args.concurrency, inline=True)
+        await run_case("pool", markdown, args.concurrency, inline=False)
+    finally:
+        shutdown_conversion_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
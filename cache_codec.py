@@ -0,0 +1,152 @@
+"""
+Cache Codec - Compact binary encoding for cached conversation payloads
+
+Encoded values start with a two-byte header: the format version and the
+compression used for the body. The body is JSON (orjson when installed),
+compressed with zstd or zlib when it is larger than CACHE_COMPRESS_MIN_BYTES.
+Anything without the header is read as a plain JSON string, so entries
+written before the codec existed stay readable until they expire.
+"""
+
+import json
+import logging
+import os
+import zlib
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on the environment
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Compression byte following the version byte
+RAW = 0
+ZLIB = 1
+ZSTD = 2
+
+_COMPRESSION_NAMES = {"none": RAW, "zlib": ZLIB, "zstd": ZSTD}
+
+# Bodies smaller than this are stored uncompressed
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "512"))
+
+# zstd|zlib|none; zstd falls back to zlib when the zstandard package is missing
+CACHE_COMPRESSION = os.getenv("CACHE_COMPRESSION", "zstd").lower()
+
+# Compression level (default: 3 for zstd, 6 for zlib)
+CACHE_COMPRESSION_LEVEL = os.getenv("CACHE_COMPRESSION_LEVEL", "")
+
+
+class CacheDecodeError(ValueError):
+    """Raised when a cached value cannot be decoded"""
+
+
+def _resolve_compression(name: str) -> int:
+    compression = _COMPRESSION_NAMES.get(name)
+    if compression is None:
+        logger.warning("Unknown CACHE_COMPRESSION %r, using zlib", name)
+        return ZLIB
+    if compression == ZSTD and zstandard is None:
+        return ZLIB
+    return compression
+
+
+def _dumps(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _loads(body: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+_compression = _resolve_compression(CACHE_COMPRESSION)
+_zstd_level = int(CACHE_COMPRESSION_LEVEL or 3) if _compression == ZSTD else 3
+_zlib_level = int(CACHE_COMPRESSION_LEVEL or 6) if _compression == ZLIB else 6
+_zstd_compressor = zstandard.ZstdCompressor(level=_zstd_level) if zstandard is not None else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+
+def encode(data: Any, compression: int = None, min_bytes: int = None) -> bytes:
+    """
+    Encode a JSON-serializable value for the cache.
+
+    Args:
+        data: Value to encode
+        compression: RAW, ZLIB or ZSTD (default: from CACHE_COMPRESSION)
+        min_bytes: Compress only bodies at least this large (default: CACHE_COMPRESS_MIN_BYTES)
+
+    Returns:
+        Header and body bytes
+    """
+    compression = _compression if compression is None else compression
+    min_bytes = CACHE_COMPRESS_MIN_BYTES if min_bytes is None else min_bytes
+    body = _dumps(data)
+
+    if compression == RAW or len(body) < min_bytes:
+        return bytes((FORMAT_VERSION, RAW)) + body
+    if compression == ZSTD:
+        if _zstd_compressor is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return bytes((FORMAT_VERSION, ZSTD)) + _zstd_compressor.compress(body)
+    return bytes((FORMAT_VERSION, ZLIB)) + zlib.compress(body, _zlib_level)
+
+
+def decode(value) -> Any:
+    """
+    Decode a cached value written by encode() or a legacy plain JSON string.
+
+    Raises:
+        CacheDecodeError: Unknown format version or compression, or a corrupt body
+    """
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+
+    # Legacy entries are JSON text, which never starts with a byte below tab
+    if not value or value[0] >= 0x09:
+        try:
+            return _loads(value)
+        except ValueError as e:
+            raise CacheDecodeError(f"Invalid legacy JSON entry: {e}") from e
+
+    if len(value) < 2 or value[0] != FORMAT_VERSION:
+        raise CacheDecodeError(f"Unsupported cache format version {value[0]}")
+
+    compression, body = value[1], value[2:]
+    try:
+        if compression == ZSTD:
+            if _zstd_decompressor is None:
+                raise CacheDecodeError("zstd entry but the zstandard package is not installed")
+            body = _zstd_decompressor.decompress(body)
+        elif compression == ZLIB:
+            body = zlib.decompress(body)
+        elif compression != RAW:
+            raise CacheDecodeError(f"Unknown cache compression {compression}")
+        return _loads(body)
+    except CacheDecodeError:
+        raise
+    except Exception as e:
+        raise CacheDecodeError(f"Corrupt cache entry: {e}") from e
+
+
+def describe() -> dict:
+    """Active codec settings, for startup logs and benchmarks"""
+    names = {code: name for name, code in _COMPRESSION_NAMES.items()}
+    return {
+        "format_version": FORMAT_VERSION,
+        "serializer": "orjson" if orjson is not None else "json",
+        "compression": names[_compression],
+        "level": _zstd_level if _compression == ZSTD else _zlib_level,
+        "min_bytes": CACHE_COMPRESS_MIN_BYTES,
+    }
@@ -0,0 +1,159 @@
+"""
+Circuit Breaker - Fail fast while a dependency is failing or too slow
+
+    closed ──(failure or slow-call rate over threshold)──> open
+    open ──(open_seconds later)──> half_open
+    half_open ──(probe calls succeed)──> closed
+    half_open ──(a probe call fails)──> open
+
+Outcomes are kept for a rolling window of `window` seconds; the breaker
+only trips once at least `min_calls` calls were recorded in it. While open,
+calls are rejected with CircuitOpenError without touching the dependency.
+Half-open lets `half_open_calls` calls through at a time to probe recovery.
+"""
+
+import logging
+import time
+from collections import deque
+from typing import Callable, Dict
+
+from metrics import CIRCUIT_REJECTED, CIRCUIT_STATE, CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit {name} is open, retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Failure- and latency-triggered circuit breaker.
+
+    Callers check `before_call()` (raises CircuitOpenError) and report each
+    call with `record(ok, seconds)`. Calls that were abandoned (e.g. the
+    losing half of a hedged request) should not be recorded.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        slow_call_rate: float = 0.8,
+        min_calls: int = 10,
+        window: float = 60.0,
+        open_seconds: float = 30.0,
+        half_open_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._clock = clock
+
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._in_flight_probes = 0
+        self._half_open_successes = 0
+        # (timestamp, failed, slow)
+        self._calls = deque()
+        CIRCUIT_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning("Circuit %s: %s -> %s", self.name, self.state, state)
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+        if state == OPEN:
+            self._opened_at = self._clock()
+        elif state == HALF_OPEN:
+            self._in_flight_probes = 0
+            self._half_open_successes = 0
+        else:
+            self._calls.clear()
+
+    def _trim(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    @property
+    def allows_calls(self) -> bool:
+        """Whether a call would be let through right now (without reserving it)"""
+        if self.state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == OPEN:
+            return False
+        if self.state == HALF_OPEN:
+            return self._in_flight_probes < self.half_open_calls
+        return True
+
+    def before_call(self):
+        """Reserve a call, or raise CircuitOpenError while the circuit is open"""
+        if not self.allows_calls:
+            CIRCUIT_REJECTED.labels(self.name).inc()
+            retry_after = max(0.0, self.open_seconds - (self._clock() - self._opened_at))
+            raise CircuitOpenError(self.name, retry_after)
+        if self.state == HALF_OPEN:
+            self._in_flight_probes += 1
+
+    def release(self):
+        """Give back a reserved call that was abandoned without an outcome"""
+        if self.state == HALF_OPEN and self._in_flight_probes > 0:
+            self._in_flight_probes -= 1
+
+    def record(self, ok: bool, seconds: float):
+        """Record the outcome of a call reserved with before_call()"""
+        slow = seconds >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self._in_flight_probes = max(0, self._in_flight_probes - 1)
+            if not ok or slow:
+                self._transition(OPEN)
+            else:
+                self._half_open_successes += 1
+                if self._half_open_successes >= self.half_open_calls:
+                    self._transition(CLOSED)
+            return
+        if self.state == OPEN:
+            # Finished after the circuit opened; it was counted already
+            return
+
+        now = self._clock()
+        self._calls.append((now, not ok, slow))
+        self._trim(now)
+        calls = len(self._calls)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for _, failed, _ in self._calls if failed)
+        slow_calls = sum(1 for _, _, was_slow in self._calls if was_slow)
+        if failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate:
+            self._transition(OPEN)
+
+    def stats(self) -> Dict:
+        self.allows_calls  # moves an expired open circuit to half-open
+        self._trim(self._clock())
+        calls = len(self._calls)
+        return {
+            "state": self.state,
+            "calls": calls,
+            "failure_rate": round(sum(1 for _, failed, _ in self._calls if failed) / calls, 3) if calls else 0.0,
+            "slow_rate": round(sum(1 for _, _, slow in self._calls if slow) / calls, 3) if calls else 0.0,
+        }
@@ -0,0 +1,299 @@
+"""
+Conversation Store - Short-lived, single-statement conversation reads and writes
+
+Writes are single INSERT ... ON CONFLICT statements run in autocommit mode,
+so creating or appending to a conversation is one round trip and never
+races with a concurrent first message for the same session.
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import JSON, Boolean, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import JSONB, aggregate_order_by, insert
+
+import database
+from models import Conversation
+
+logger = logging.getLogger(__name__)
+
+# RETURNING column that is true when the upsert inserted rather than updated
+# (a freshly inserted row version has no deleting transaction)
+_INSERTED = literal_column("(xmax = 0)", Boolean).label("inserted")
+
+
+async def load_conversation(session_id: str) -> Optional[Conversation]:
+    """
+    Load a conversation in its own short read transaction.
+
+    The returned object is detached: its connection is back in the pool
+    before this returns, so callers can hold on to it across slow awaits
+    (e.g. the LLM call) without pinning a database connection.
+
+    Args:
+        session_id: Conversation session ID
+
+    Returns:
+        Detached Conversation or None if it doesn't exist
+    """
+    async with database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Conversation).where(Conversation.session_id == session_id)
+        )
+        return result.scalar_one_or_none()
+
+
+def get_or_create_statement(session_id: str, email: str = None, name: str = None, company: str = None):
+    """
+    INSERT ... ON CONFLICT statement returning the new or existing conversation.
+
+    The conflict branch is a no-op update so RETURNING also yields the
+    existing row; its fields are left as they were.
+    """
+    stmt = insert(Conversation).values(
+        session_id=session_id,
+        email=email,
+        name=name,
+        company=company,
+        messages=[],
+        version=1
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[Conversation.session_id],
+        set_={"session_id": stmt.excluded.session_id}
+    ).returning(
+        Conversation.id, Conversation.session_id, Conversation.email, _INSERTED
+    )
+
+
+def append_statement(session_id: str, new_messages: List[Dict], email: str = None):
+    """
+    INSERT ... ON CONFLICT statement that creates the conversation or appends to it.
+
+    The append is a single jsonb concatenation evaluated under the row lock,
+    so concurrent messages to the same conversation never overwrite each
+    other. `messages` is a json column; it is concatenated as jsonb and cast
+    back.
+    """
+    stmt = insert(Conversation).values(
+        session_id=session_id,
+        email=email,
+        messages=list(new_messages),
+        version=1
+    )
+    existing = func.coalesce(cast(Conversation.messages, JSONB), literal_column("'[]'::jsonb"))
+    return stmt.on_conflict_do_update(
+        index_elements=[Conversation.session_id],
+        set_={
+            "messages": cast(existing.op("||")(cast(stmt.excluded.messages, JSONB)), JSON),
+            "updated_at": func.now(),
+            "version": Conversation.version + 1,
+        }
+    ).returning(Conversation.id, Conversation.version, _INSERTED)
+
+
+async def get_or_create_conversation(
+    session_id: str,
+    email: str = None,
+    name: str = None,
+    company: str = None
+) -> Dict:
+    """
+    Create a conversation, or return the existing one, in one round trip.
+
+    Returns:
+        Dict with id, session_id, email and created (False if it already existed)
+    """
+    async with database.autocommit_engine.connect() as conn:
+        result = await conn.execute(get_or_create_statement(session_id, email, name, company))
+        row = result.one()
+    return {"id": row.id, "session_id": row.session_id, "email": row.email, "created": row.inserted}
+
+
+async def append_messages(session_id: str, new_messages: List[Dict], email: str = None) -> Dict:
+    """
+    Append messages to a conversation, creating it if needed, in one round trip.
+
+    Args:
+        session_id: Conversation session ID
+        new_messages: Messages to append
+        email: Email for a newly created conversation (ignored if it exists)
+
+    Returns:
+        Dict with id, version and created (True if this call inserted the row)
+    """
+    async with database.autocommit_engine.connect() as conn:
+        result = await conn.execute(append_statement(session_id, new_messages, email))
+        row = result.one()
+    if row.inserted:
+        logger.debug("Created conversation %s", session_id)
+    return {"id": row.id, "version": row.version, "created": row.inserted}
+
+
+def append_turns_statement(session_id: str, new_messages: List[Dict], email: str = None):
+    """
+    Like append_statement(), but skips messages whose turn_id is already stored.
+
+    Write-behind may apply the same turn more than once (a batch is replayed
+    if the process dies before acknowledging it), so every message carries
+    the turn_id of the chat turn it belongs to and only unseen ones are
+    appended.
+    """
+    stmt = insert(Conversation).values(
+        session_id=session_id,
+        email=email,
+        messages=list(new_messages),
+        version=1
+    )
+    existing = func.coalesce(cast(Conversation.messages, JSONB), literal_column("'[]'::jsonb"))
+    incoming = func.jsonb_array_elements(cast(stmt.excluded.messages, JSONB)).table_valued(
+        "value", with_ordinality="position"
+    ).render_derived(name="incoming")
+    # Referenced as a literal column so the subquery stays correlated to the
+    # conflicting row instead of gaining its own FROM conversations
+    stored = func.coalesce(
+        cast(literal_column("conversations.messages", JSON), JSONB), literal_column("'[]'::jsonb")
+    )
+    seen = stored.op("@>")(func.jsonb_build_array(
+        func.jsonb_build_object("turn_id", incoming.c.value.op("->")("turn_id"))
+    ))
+    unseen = (
+        select(func.coalesce(
+            func.jsonb_agg(aggregate_order_by(incoming.c.value, incoming.c.position)),
+            literal_column("'[]'::jsonb")
+        ))
+        .where(~seen)
+        .scalar_subquery()
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[Conversation.session_id],
+        set_={
+            "messages": cast(existing.op("||")(unseen), JSON),
+            "updated_at": func.now(),
+            "version": Conversation.version + 1,
+        }
+    ).returning(Conversation.id, Conversation.version, _INSERTED)
+
+
+async def append_turns(appends: Sequence[Tuple[str, List[Dict], Optional[str]]]):
+    """
+    Apply several (session_id, messages, email) appends in one transaction.
+
+    Each session should appear once, with its messages in order; see
+    append_turns_statement() for how repeated turns are skipped.
+    """
+    async with database.engine.begin() as conn:
+        for session_id, messages, email in appends:
+            await conn.execute(append_turns_statement(session_id, messages, email))
+
+
+# Fields a conversation read can project, in response order; all but
+# "messages" are scalar columns
+CONVERSATION_FIELDS = (
+    "id", "session_id", "email", "name", "company",
+    "messages", "current_stage", "qualification_score", "created_at"
+)
+
+SUMMARY_FIELDS = (
+    "id", "session_id", "email", "name", "company", "current_stage",
+    "industry", "company_size", "role", "qualification_score", "quality_tier",
+    "converted", "created_at", "updated_at"
+)
+
+
+def _message_count():
+    return func.coalesce(func.json_array_length(Conversation.messages), 0)
+
+
+def conversation_read_statement(
+    session_id: str,
+    fields: Sequence[str] = CONVERSATION_FIELDS,
+    limit: Optional[int] = None,
+    before: Optional[int] = None
+):
+    """
+    SELECT only the requested fields, slicing messages in the database.
+
+    With `limit` or `before`, only messages[start:end] are returned, where
+    end = min(before, total) and start = max(end - limit, 0), so a page of
+    the latest messages doesn't ship the whole history. The page is
+    returned as messages, with messages_total and messages_start.
+    """
+    columns = []
+    for field in fields:
+        if field != "messages":
+            columns.append(getattr(Conversation, field))
+        elif limit is None and before is None:
+            columns.append(Conversation.messages)
+        else:
+            total = _message_count()
+            end = func.least(before, total) if before is not None else total
+            start = func.greatest(end - limit, 0) if limit is not None else literal_column("0")
+            elements = func.json_array_elements(Conversation.messages).table_valued(
+                "value", with_ordinality="position"
+            ).render_derived(name="message")
+            page = (
+                select(func.coalesce(
+                    func.json_agg(aggregate_order_by(elements.c.value, elements.c.position)),
+                    literal_column("'[]'::json"),
+                    type_=JSON
+                ))
+                .where(elements.c.position > start, elements.c.position <= end)
+                .scalar_subquery()
+            )
+            columns.extend([
+                page.label("messages"),
+                total.label("messages_total"),
+                start.label("messages_start"),
+            ])
+
+    return select(*columns).where(Conversation.session_id == session_id)
+
+
+async def fetch_conversation(
+    session_id: str,
+    fields: Sequence[str] = CONVERSATION_FIELDS,
+    limit: Optional[int] = None,
+    before: Optional[int] = None
+) -> Optional[Dict]:
+    """
+    Read a projection of a conversation in one statement.
+
+    Args:
+        session_id: Conversation session ID
+        fields: Fields from CONVERSATION_FIELDS to return
+        limit: Maximum number of messages to return (latest first page)
+        before: Only return messages before this index
+
+    Returns:
+        Dict of the requested fields, or None if the conversation doesn't exist
+    """
+    async with database.autocommit_engine.connect() as conn:
+        result = await conn.execute(conversation_read_statement(session_id, fields, limit, before))
+        row = result.mappings().one_or_none()
+    return _serialize(row) if row is not None else None
+
+
+async def fetch_summary(session_id: str) -> Optional[Dict]:
+    """
+    Read the scalar columns of a conversation plus its message count.
+
+    The JSON columns (messages, pain_points, goals) are never read.
+    """
+    statement = select(
+        *(getattr(Conversation, field) for field in SUMMARY_FIELDS),
+        _message_count().label("message_count")
+    ).where(Conversation.session_id == session_id)
+
+    async with database.autocommit_engine.connect() as conn:
+        result = await conn.execute(statement)
+        row = result.mappings().one_or_none()
+    return _serialize(row) if row is not None else None
+
+
+def _serialize(row) -> Dict:
+    data = dict(row)
+    for key in ("created_at", "updated_at"):
+        if key in data:
+            data[key] = data[key].isoformat() if data[key] else None
+    return data
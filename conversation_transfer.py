@@ -0,0 +1,402 @@
+"""
+Conversation Transfer - Bulk export and import of conversations as NDJSON
+
+Exports stream rows from a server-side cursor in batches of
+EXPORT_BATCH_SIZE, so memory stays flat however large the table is.
+Imports COPY batches of IMPORT_BATCH_SIZE rows into a temporary staging
+table and merge them with one INSERT ... SELECT ... ON CONFLICT per batch.
+
+    python conversation_transfer.py export -o conversations.ndjson.gz
+    python conversation_transfer.py import conversations.ndjson.gz --on-conflict update
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import date, datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import BigInteger, Boolean, Date, cast, column, func, literal_column, select, table, text, union
+from sqlalchemy.dialects.postgresql import insert
+
+import database
+from metrics import CONVERSATION_EXPORT_ROWS, CONVERSATION_IMPORT_ROWS
+from models import Conversation, RollupDirtyDay
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the cursor (and encoded) per round trip
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# Rows COPYed and merged per transaction on import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+EXPORT_FIELDS = (
+    "id", "session_id", "email", "name", "company", "messages", "current_stage",
+    "pain_points", "goals", "industry", "company_size", "role",
+    "qualification_score", "quality_tier", "converted", "created_at", "updated_at", "version"
+)
+
+
+def export_statement(updated_since: Optional[datetime] = None):
+    """
+    SELECT of all exported columns in id order.
+
+    Rows never updated have no updated_at; they count as updated when created.
+    """
+    statement = select(*(getattr(Conversation, field) for field in EXPORT_FIELDS))
+    if updated_since is not None:
+        statement = statement.where(
+            func.coalesce(Conversation.updated_at, Conversation.created_at) >= updated_since
+        )
+    return statement.order_by(Conversation.id)
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def encode_lines(rows: Iterable[Dict]) -> bytes:
+    """Encode rows as NDJSON: one JSON object per line"""
+    if orjson is not None:
+        return b"".join(orjson.dumps(row, default=_default) + b"\n" for row in rows)
+    return "".join(
+        json.dumps(row, default=_default, separators=(",", ":"), ensure_ascii=False) + "\n" for row in rows
+    ).encode("utf-8")
+
+
+async def iter_export(updated_since: Optional[datetime] = None, batch_size: int = None) -> AsyncIterator[bytes]:
+    """
+    Yield NDJSON chunks, one per batch of rows.
+
+    The connection is opened inside the generator, so it is held only while
+    the response body is being sent and released when the client finishes
+    or disconnects.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    statement = export_statement(updated_since).execution_options(yield_per=batch_size)
+    exported = 0
+
+    async with database.engine.connect() as conn:
+        result = await conn.stream(statement)
+        async for batch in result.mappings().partitions():
+            exported += len(batch)
+            CONVERSATION_EXPORT_ROWS.inc(len(batch))
+            yield encode_lines(dict(row) for row in batch)
+
+    logger.info("Exported %s conversations (updated_since=%s)", exported, updated_since)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Compress a byte stream as a single gzip member, chunk by chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Import: every exported field except id, which is assigned by the target
+IMPORT_FIELDS = tuple(field for field in EXPORT_FIELDS if field != "id")
+
+IMPORT_CONFLICT_MODES = ("skip", "update")
+
+_JSON_FIELDS = {"messages", "pain_points", "goals"}
+_TIMESTAMP_FIELDS = {"created_at", "updated_at"}
+
+# Values for fields missing from an imported line (same as the model defaults)
+_IMPORT_DEFAULTS = {
+    "messages": [], "pain_points": [], "goals": [], "current_stage": "greeting",
+    "qualification_score": 0.0, "converted": False, "version": 1,
+}
+
+_STAGING_TABLE = "conversation_import"
+
+# Imported lines are staged with their position so the last line wins when a
+# batch has the same session_id more than once
+_staging = table(_STAGING_TABLE, *(column(field) for field in IMPORT_FIELDS), column("line", BigInteger))
+
+# RETURNING column that is true when the row was inserted rather than updated
+_INSERTED = literal_column("(xmax = 0)", Boolean).label("inserted")
+
+
+class ImportLineError(ValueError):
+    """Raised for an NDJSON line that cannot be imported"""
+
+
+def parse_line(line: Union[str, bytes]) -> Optional[Tuple]:
+    """
+    Convert one NDJSON line to a staging record (IMPORT_FIELDS order).
+
+    Returns None for blank lines. JSON columns are passed to COPY as JSON
+    text and timestamps as datetimes.
+
+    Raises:
+        ImportLineError: Invalid JSON or a missing session_id
+    """
+    if not line.strip():
+        return None
+    try:
+        data = orjson.loads(line) if orjson is not None else json.loads(line)
+    except ValueError as e:
+        raise ImportLineError(f"invalid JSON: {e}") from e
+    if not isinstance(data, dict) or not data.get("session_id"):
+        raise ImportLineError("missing session_id")
+
+    record = []
+    for field in IMPORT_FIELDS:
+        value = data.get(field)
+        if value is None:
+            value = _IMPORT_DEFAULTS.get(field)
+        try:
+            if field in _JSON_FIELDS:
+                value = orjson.dumps(value).decode("utf-8") if orjson is not None else json.dumps(value)
+            elif field in _TIMESTAMP_FIELDS and value is not None:
+                value = datetime.fromisoformat(value)
+                if value.tzinfo is None:
+                    value = value.replace(tzinfo=timezone.utc)
+            elif field == "qualification_score":
+                value = float(value)
+            elif field == "version":
+                value = int(value)
+        except (TypeError, ValueError) as e:
+            raise ImportLineError(f"invalid {field}: {e}") from e
+        record.append(value)
+
+    if record[IMPORT_FIELDS.index("created_at")] is None:
+        record[IMPORT_FIELDS.index("created_at")] = datetime.now(timezone.utc)
+    return tuple(record)
+
+
+def merge_statement(on_conflict: str = "skip"):
+    """
+    INSERT ... SELECT from the staging table into conversations.
+
+    "skip" leaves existing conversations untouched; "update" overwrites them
+    with the imported values and bumps their version.
+    """
+    latest = (
+        select(*(_staging.c[field] for field in IMPORT_FIELDS))
+        .distinct(_staging.c.session_id)
+        .order_by(_staging.c.session_id, _staging.c.line.desc())
+    )
+    stmt = insert(Conversation).from_select(list(IMPORT_FIELDS), latest)
+    if on_conflict == "update":
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Conversation.session_id],
+            set_={
+                **{field: stmt.excluded[field] for field in IMPORT_FIELDS if field not in ("session_id", "version")},
+                "version": Conversation.version + 1,
+            }
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Conversation.session_id])
+    return stmt.returning(_INSERTED)
+
+
+def dirty_days_statement():
+    """
+    Mark the rollup days a staged batch touches as dirty (see analytics.py).
+
+    Imported rows keep their updated_at, so the rollup refresh can't find
+    them by it. Both the imported created_at days and, for updates, the days
+    of the rows being overwritten are marked; run it before the merge.
+    """
+    imported = select(cast(func.timezone("UTC", _staging.c.created_at), Date))
+    replaced = (
+        select(cast(func.timezone("UTC", Conversation.created_at), Date))
+        .join(_staging, _staging.c.session_id == Conversation.session_id)
+    )
+    return insert(RollupDirtyDay).from_select(["day"], union(imported, replaced)).on_conflict_do_nothing()
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without reading it all into memory"""
+    # Pieces of the current line; only new chunks are searched for newlines,
+    # so a long line costs linear time
+    pending: List[bytes] = []
+    async for chunk in chunks:
+        first, *lines = chunk.split(b"\n")
+        pending.append(first)
+        if not lines:
+            continue
+        yield b"".join(pending)
+        *lines, rest = lines
+        for line in lines:
+            yield line
+        pending = [rest]
+    tail = b"".join(pending)
+    if tail:
+        yield tail
+
+
+async def gunzip_stream(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Decompress a gzip byte stream chunk by chunk"""
+    decompressor = zlib.decompressobj(31)
+    async for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+async def _merge_batch(conn, batch: List[Tuple], statement) -> Tuple[int, int]:
+    async with conn.begin():
+        # The first statement opens the transaction the COPY then runs in
+        await conn.execute(text(f"TRUNCATE {_STAGING_TABLE}"))
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            _STAGING_TABLE, records=batch, columns=[*IMPORT_FIELDS, "line"]
+        )
+        await conn.execute(dirty_days_statement())
+        result = await conn.execute(statement)
+        inserted = [row.inserted for row in result]
+    return sum(inserted), len(inserted) - sum(inserted)
+
+
+async def import_conversations(
+    lines: Union[AsyncIterable[Union[str, bytes]], Iterable[Union[str, bytes]]],
+    on_conflict: str = "skip",
+    batch_size: int = None,
+    max_errors: int = 20
+) -> Dict:
+    """
+    Load NDJSON conversations (as produced by the export) in COPY batches.
+
+    Each batch is its own transaction, so a failure part way through keeps
+    the batches already merged. Lines that can't be parsed are skipped and
+    reported.
+
+    Args:
+        lines: NDJSON lines, sync or async iterable
+        on_conflict: "skip" existing session_ids or "update" them
+        batch_size: Rows per COPY and merge (default IMPORT_BATCH_SIZE)
+        max_errors: Parse errors to include in the report
+
+    Returns:
+        Dict with rows, inserted, updated, skipped, invalid, errors, seconds and rows_per_second
+    """
+    if on_conflict not in IMPORT_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {', '.join(IMPORT_CONFLICT_MODES)}")
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    statement = merge_statement(on_conflict)
+    report = {"rows": 0, "inserted": 0, "updated": 0, "skipped": 0, "invalid": 0, "errors": []}
+    start = time.perf_counter()
+
+    if not hasattr(lines, "__aiter__"):
+        lines = _aiter(lines)
+
+    async with database.engine.connect() as conn:
+        await conn.execute(text(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {_STAGING_TABLE} AS "
+            f"SELECT {', '.join(IMPORT_FIELDS)}, 0::bigint AS line FROM conversations WITH NO DATA"
+        ))
+        await conn.commit()
+
+        async def flush(batch):
+            inserted, updated = await _merge_batch(conn, batch, statement)
+            report["rows"] += len(batch)
+            report["inserted"] += inserted
+            report["updated"] += updated
+            report["skipped"] += len({record[0] for record in batch}) - inserted - updated
+            CONVERSATION_IMPORT_ROWS.inc(len(batch))
+
+        try:
+            batch = []
+            number = 0
+            async for line in lines:
+                number += 1
+                try:
+                    record = parse_line(line)
+                except ImportLineError as e:
+                    report["invalid"] += 1
+                    if len(report["errors"]) < max_errors:
+                        report["errors"].append({"line": number, "error": str(e)})
+                    continue
+                if record is None:
+                    continue
+                batch.append((*record, number))
+                if len(batch) >= batch_size:
+                    await flush(batch)
+                    batch = []
+            if batch:
+                await flush(batch)
+        finally:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {_STAGING_TABLE}"))
+            await conn.commit()
+
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    report["rows_per_second"] = round(report["rows"] / report["seconds"], 1) if report["seconds"] else None
+    logger.info(
+        "Imported %s conversations (%s inserted, %s updated, %s skipped, %s invalid) at %s rows/s",
+        report["rows"], report["inserted"], report["updated"], report["skipped"],
+        report["invalid"], report["rows_per_second"]
+    )
+    return report
+
+
+async def _aiter(iterable):
+    for item in iterable:
+        yield item
+
+
+async def _read_file(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export or import conversations as NDJSON")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export = subcommands.add_parser("export", help="write conversations to an NDJSON file")
+    export.add_argument("-o", "--output", required=True, help="output file (.gz to compress)")
+    export.add_argument("--updated-since", type=datetime.fromisoformat, help="ISO 8601 timestamp")
+    load = subcommands.add_parser("import", help="load conversations from an NDJSON file")
+    load.add_argument("path", help="NDJSON file (.gz is decompressed)")
+    load.add_argument("--on-conflict", choices=IMPORT_CONFLICT_MODES, default="skip")
+    load.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        await database.init_db()
+        if args.command == "export":
+            start = time.perf_counter()
+            chunks = iter_export(args.updated_since)
+            if args.output.endswith(".gz"):
+                chunks = gzip_stream(chunks)
+            with open(args.output, "wb") as f:
+                async for chunk in chunks:
+                    await asyncio.to_thread(f.write, chunk)
+            print(f"Exported to {args.output} in {time.perf_counter() - start:.1f}s")
+        else:
+            chunks = _read_file(args.path)
+            if args.path.endswith(".gz"):
+                chunks = gunzip_stream(chunks)
+            report = await import_conversations(iter_lines(chunks), args.on_conflict, args.batch_size)
+            print(json.dumps(report, indent=2))
+    finally:
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,145 @@
+"""
+Conversion Executor - Run CPU-heavy content conversion off the event loop
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional
+
+from content_processor import ChunkStream, smart_chunk_content
+from markdown_to_tiptap import convert_markdown_to_tiptap
+
+logger = logging.getLogger(__name__)
+
+# Inputs up to this many characters are converted inline - for small content
+# the pickling round trip to a worker costs more than the conversion itself
+CONVERSION_INLINE_MAX_CHARS = int(os.getenv("CONVERSION_INLINE_MAX_CHARS", "20000"))
+
+# Worker processes; 0 disables the pool and converts everything inline
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# multiprocessing start method (fork|forkserver|spawn); empty uses the platform default
+CONVERSION_START_METHOD = os.getenv("CONVERSION_START_METHOD", "")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def start_conversion_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Create the worker pool if it is enabled and not running yet.
+
+    Called from the app lifespan so workers are forked before the server
+    starts its own threads; otherwise the pool is created on first use.
+    """
+    global _pool
+    if _pool is not None or CONVERSION_WORKERS <= 0:
+        return _pool
+
+    context = multiprocessing.get_context(CONVERSION_START_METHOD or None)
+    _pool = ProcessPoolExecutor(max_workers=CONVERSION_WORKERS, mp_context=context)
+    logger.info(f"⚙️ Conversion pool started: {CONVERSION_WORKERS} workers ({context.get_start_method()})")
+    return _pool
+
+
+def shutdown_conversion_pool(wait: bool = True):
+    """
+    Stop the worker pool, cancelling conversions that have not started.
+
+    Args:
+        wait: Join the worker processes before returning; pass False from
+            the event loop so it isn't held while they exit
+    """
+    global _pool
+    if _pool is None:
+        return
+    pool, _pool = _pool, None
+    pool.shutdown(wait=wait, cancel_futures=True)
+    logger.info("Conversion pool stopped")
+
+
+def should_offload(content: str) -> bool:
+    """Whether content is large enough to be converted in the worker pool"""
+    return CONVERSION_WORKERS > 0 and len(content) > CONVERSION_INLINE_MAX_CHARS
+
+
+async def run_conversion(func: Callable[..., Any], content: str, *args) -> Any:
+    """
+    Run func(content, *args) inline for small content, in the pool for large.
+
+    func and its arguments must be picklable (module-level functions). If the
+    pool has died (e.g. a worker was OOM-killed) it is replaced and the call
+    falls back to running inline.
+
+    Args:
+        func: Conversion function taking the content as first argument
+        content: Content to convert
+        *args: Extra positional arguments for func
+
+    Returns:
+        Whatever func returns
+    """
+    if not should_offload(content):
+        return func(content, *args)
+
+    pool = start_conversion_pool()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, func, content, *args)
+    except BrokenProcessPool:
+        logger.error("❌ Conversion pool broken, restarting and converting inline")
+        # Concurrent calls on the same pool all land here; only drop it once
+        if _pool is pool:
+            shutdown_conversion_pool(wait=False)
+        return func(content, *args)
+
+
+async def convert_markdown(markdown: str) -> List[Dict[str, Any]]:
+    """Convert markdown to Tiptap JSON nodes without blocking the event loop"""
+    return await run_conversion(convert_markdown_to_tiptap, markdown)
+
+
+class ChunkedContent:
+    """
+    Chunks produced in a worker, exposed like an exhausted ChunkStream.
+
+    Offers the attributes process_and_stream_content() reads from a
+    ChunkStream (iteration, `metadata`, `prepare_time_ms`) so callers don't
+    need to know where the chunking ran.
+    """
+
+    def __init__(self, chunks: List[str], metadata: Dict[str, Any]):
+        self.chunks = chunks
+        self.metadata = metadata
+        self.analysis = metadata.get("analysis", {})
+        self.prepare_time_ms = metadata.get("processing_time_ms", 0)
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+async def chunk_content(
+    content: str,
+    content_type: str,
+    chunk_by: str = "word",
+    max_chunk_size: int = 1000
+):
+    """
+    Sanitize and chunk content without blocking the event loop.
+
+    Small content gets a lazy ChunkStream; large content is chunked in the
+    worker pool and returned as a ChunkedContent.
+
+    Raises:
+        ValueError: If content type or chunk strategy is invalid
+    """
+    if not should_offload(content):
+        return ChunkStream(content, content_type, chunk_by, max_chunk_size)
+
+    chunks, metadata = await run_conversion(
+        smart_chunk_content, content, content_type, chunk_by, max_chunk_size
+    )
+    return ChunkedContent(chunks, metadata)
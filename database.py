@@ -2,9 +2,17 @@
 Database connection for Sales API
 """
 
+from sqlalchemy import event, exc, text
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from models import Base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from models import Base, Conversation
+from metrics import (
+    DB_POOL_CHECKED_OUT, DB_POOL_OVERFLOW, DB_POOL_WAIT_SECONDS,
+    DB_POOL_TIMEOUTS, DB_POOL_PINGS
+)
 import os
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -21,15 +29,98 @@ if DATABASE_URL.startswith("postgresql://"):
 
 logger.info(f"Database URL configured: {DATABASE_URL.split('@')[0]}@...")
 
+# Connection pool settings (per replica/worker)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # Max connection age in seconds, -1 = never
+
+# Liveness check on checkout: "always" pings every checkout, "never" skips it,
+# "idle" only pings connections that sat in the pool longer than
+# DB_POOL_PRE_PING_IDLE seconds (where server/proxy idle timeouts bite)
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "idle").lower()
+DB_POOL_PRE_PING_IDLE = float(os.getenv("DB_POOL_PRE_PING_IDLE", "30"))
+
+if DB_POOL_PRE_PING not in ("always", "never", "idle"):
+    logger.warning(f"Unknown DB_POOL_PRE_PING '{DB_POOL_PRE_PING}', using 'idle'")
+    DB_POOL_PRE_PING = "idle"
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that records how long checkouts wait for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+
+def _install_pool_events(sync_engine):
+    """Track pool occupancy and, for the "idle" strategy, ping stale connections"""
+
+    def update_gauges(returning: int = 0):
+        # engine.dispose() swaps the pool; the listeners carry over
+        pool = sync_engine.pool
+        DB_POOL_CHECKED_OUT.set(max(0, pool.checkedout() - returning))
+        DB_POOL_OVERFLOW.set(max(0, pool.overflow()))
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        if DB_POOL_PRE_PING == "idle":
+            last_checkin = connection_record.info.get("last_checkin")
+            if last_checkin is not None and time.monotonic() - last_checkin > DB_POOL_PRE_PING_IDLE:
+                try:
+                    sync_engine.dialect.do_ping(dbapi_connection)
+                    DB_POOL_PINGS.labels("ok").inc()
+                except Exception as e:
+                    DB_POOL_PINGS.labels("failed").inc()
+                    # Makes the pool discard this connection and retry with a new one
+                    raise exc.DisconnectionError(f"Idle connection failed ping: {e}") from e
+        update_gauges()
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        connection_record.info["last_checkin"] = time.monotonic()
+        # Fires before the connection is back in the queue
+        update_gauges(returning=1)
+
+
+def pool_status() -> dict:
+    """Current pool occupancy, or None without an engine"""
+    if engine is None:
+        return None
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pre_ping": DB_POOL_PRE_PING,
+    }
+
+
 # Create async engine with connection pool settings
 try:
     engine = create_async_engine(
         DATABASE_URL,
         echo=False,  # Set to True for SQL query logging
-        pool_size=5,
-        max_overflow=10,
-        pool_pre_ping=True,  # Verify connections before using
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING == "always",
     )
+    _install_pool_events(engine.sync_engine)
+    
+    # Same pool, no BEGIN/COMMIT - for single statements that are atomic on
+    # their own (e.g. upserts), saving two round trips per write
+    autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
 
     # Create async session maker
     AsyncSessionLocal = async_sessionmaker(
@@ -37,23 +128,47 @@ try:
         class_=AsyncSession,
         expire_on_commit=False
     )
-    logger.info("Database engine created successfully")
+    logger.info(
+        f"Database engine created successfully (pool_size={DB_POOL_SIZE}, max_overflow={DB_MAX_OVERFLOW}, "
+        f"timeout={DB_POOL_TIMEOUT}s, recycle={DB_POOL_RECYCLE}s, pre_ping={DB_POOL_PRE_PING})"
+    )
 except Exception as e:
     logger.error(f"Failed to create database engine: {e}")
     engine = None
+    autocommit_engine = None
     AsyncSessionLocal = None
 
 
-async def init_db():
-    """Initialize database tables"""
+# pg_advisory_xact_lock key; workers and replicas starting together run the
+# schema setup one at a time instead of racing on CREATE TABLE/INDEX
+SCHEMA_LOCK_KEY = 7301001
+
+# Idempotent DDL for columns added after tables were first created;
+# create_all() only creates missing tables, not missing columns
+SCHEMA_UPGRADES = [
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0",
+]
+
+
+async def init_db() -> bool:
+    """Initialize database tables; False if the database is unavailable"""
     try:
         async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
             await conn.run_sync(Base.metadata.create_all)
+            for statement in SCHEMA_UPGRADES:
+                await conn.execute(text(statement))
+            # Indexes added to an existing table; on a large table create them
+            # by hand first with CREATE INDEX CONCURRENTLY to avoid blocking writes
+            for index in sorted(Conversation.__table__.indexes, key=lambda i: i.name):
+                await conn.execute(CreateIndex(index, if_not_exists=True))
         logger.info("Database tables created successfully")
+        return True
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
         logger.warning("Continuing without database - health check will still work")
         # Don't raise - allow app to start even if DB fails
+        return False
 
 
 async def get_db():
@@ -67,5 +182,7 @@ async def get_db():
 
 async def close_db():
     """Close database connections"""
+    if engine is None:
+        return
     await engine.dispose()
     logger.info("Database connections closed")
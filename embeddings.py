@@ -0,0 +1,351 @@
+"""
+Embeddings - Text embeddings with micro-batching and caching
+
+    vector = await embedding_service.embed("Do you integrate with HubSpot?")
+    vectors = await embedding_service.embed_many(texts)
+
+Concurrent embed() calls are collected for EMBEDDING_BATCH_WINDOW_MS (or
+until EMBEDDING_MAX_BATCH texts are waiting) and sent to the provider as
+one request. Vectors are cached by a hash of provider and text in an
+in-process LRU and in Redis (float32 bytes, EMBEDDING_CACHE_TTL), so
+repeated questions and re-stored documents never reach the provider.
+
+Providers (EMBEDDING_PROVIDER):
+- gateway: the LLM gateway's embeddings endpoint
+- local: a small sentence-transformers model on the CPU (optional
+  dependency), zero-padded to EMBEDDING_DIM
+- hashing: deterministic feature hashing; no model, for tests and
+  development
+- auto (default): gateway if LLM_GATEWAY_URL is set, else local if
+  sentence-transformers is installed, else hashing
+
+Vectors from different providers are not comparable: the Qdrant collection
+must be written and searched with the same provider.
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import llm_client
+from metrics import EMBEDDING_BATCH_SIZE, EMBEDDING_PROVIDER_SECONDS, EMBEDDING_REQUESTS
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# gateway|local|hashing|auto
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "auto").lower()
+
+# Vector size of the sales_knowledge collection
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1536"))
+
+# Gateway embeddings endpoint, model and timeout
+EMBEDDING_GATEWAY_PATH = os.getenv("EMBEDDING_GATEWAY_PATH", "/embeddings")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "5"))
+
+# sentence-transformers model for the local provider
+EMBEDDING_LOCAL_MODEL = os.getenv("EMBEDDING_LOCAL_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+# How long the first request of a batch waits for others, and the batch cap
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+
+# Vectors kept in process, and seconds vectors stay in Redis (0 disables)
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(7 * 24 * 3600)))
+
+EMBEDDING_CACHE_PREFIX = os.getenv("EMBEDDING_CACHE_PREFIX", "embedding")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector))
+    return [v / norm for v in vector] if norm else vector
+
+
+class HashingEmbedder:
+    """
+    Deterministic embeddings from hashed word and word-pair features.
+
+    Texts sharing words get similar vectors, which is enough to exercise
+    retrieval end to end without a model; it is not semantic search.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        words = _TOKEN.findall(text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        return _normalize(vector)
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return [self.embed_one(text) for text in texts]
+
+
+class GatewayEmbedder:
+    """Embeddings from the LLM gateway, one request per batch"""
+
+    def __init__(self, model: str = EMBEDDING_MODEL, path: str = EMBEDDING_GATEWAY_PATH,
+                 timeout: float = EMBEDDING_TIMEOUT):
+        self.model = model
+        self.path = path
+        self.timeout = timeout
+        self.name = f"gateway:{model}"
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        response = await llm_client.get_http_client().post(
+            f"{llm_client.LLM_GATEWAY_URL}{self.path}",
+            json={"model": self.model, "input": list(texts)},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        # OpenAI-style {"data": [{"index", "embedding"}]}, or plain lists
+        if "data" in data:
+            vectors = [item["embedding"] for item in sorted(data["data"], key=lambda item: item.get("index", 0))]
+        elif "embeddings" in data:
+            vectors = data["embeddings"]
+        else:
+            vectors = [data["embedding"]]
+        if len(vectors) != len(texts):
+            raise ValueError(f"Gateway returned {len(vectors)} embeddings for {len(texts)} texts")
+        return vectors
+
+
+class LocalEmbedder:
+    """A sentence-transformers model on the CPU, loaded on first use"""
+
+    def __init__(self, model: str = EMBEDDING_LOCAL_MODEL, dim: int = EMBEDDING_DIM):
+        self.model_name = model
+        self.dim = dim
+        self.name = f"local:{model}"
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _encode(self, texts: Sequence[str]) -> List[List[float]]:
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+                logger.info(f"Loaded local embedding model {self.model_name}")
+            vectors = self._model.encode(list(texts), normalize_embeddings=True).tolist()
+        if vectors and len(vectors[0]) > self.dim:
+            raise ValueError(f"{self.model_name} has {len(vectors[0])} dimensions, more than EMBEDDING_DIM={self.dim}")
+        # Zero padding keeps cosine similarity unchanged
+        return [vector + [0.0] * (self.dim - len(vector)) for vector in vectors]
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._encode, texts)
+
+
+def make_provider(setting: str = EMBEDDING_PROVIDER):
+    """The embedder for an EMBEDDING_PROVIDER value"""
+    if setting == "auto":
+        if llm_client.LLM_GATEWAY_URL:
+            setting = "gateway"
+        elif importlib.util.find_spec("sentence_transformers") is not None:
+            setting = "local"
+        else:
+            setting = "hashing"
+        logger.info(f"Embedding provider: {setting}")
+    if setting == "gateway":
+        return GatewayEmbedder()
+    if setting == "local":
+        return LocalEmbedder()
+    if setting != "hashing":
+        logger.warning(f"Unknown EMBEDDING_PROVIDER '{setting}', using hashing")
+    return HashingEmbedder()
+
+
+class EmbeddingService:
+    """Micro-batching, caching front for an embedding provider"""
+
+    def __init__(
+        self,
+        provider=None,
+        window: float = EMBEDDING_BATCH_WINDOW_MS / 1000,
+        max_batch: int = EMBEDDING_MAX_BATCH,
+        cache_size: int = EMBEDDING_CACHE_SIZE,
+        cache_ttl: int = EMBEDDING_CACHE_TTL,
+        client=None,
+        prefix: str = EMBEDDING_CACHE_PREFIX,
+    ):
+        self._provider = provider
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.prefix = prefix
+        self._client = client
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        # key -> (text, futures waiting for it)
+        self._pending: Dict[str, Tuple[str, List[asyncio.Future]]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self._counts = {"requests": 0, "lru": 0, "redis": 0, "provider": 0, "batches": 0, "failed": 0}
+        # Provider texts and seconds for calls with one text and with several
+        self._throughput = {"single": [0, 0.0], "batched": [0, 0.0]}
+
+    @property
+    def provider(self):
+        if self._provider is None:
+            self._provider = make_provider()
+        return self._provider
+
+    def _redis(self):
+        if self.cache_ttl <= 0:
+            return None
+        return self._client if self._client is not None else get_redis()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.provider.name}\0{text}".encode()).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]):
+        if self.cache_size <= 0:
+            return
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.cache_size:
+            self._lru.popitem(last=False)
+
+    async def embed(self, text: str) -> List[float]:
+        """
+        Embedding of `text`. The returned list may be shared with other
+        callers and the cache; don't modify it.
+        """
+        self._counts["requests"] += 1
+        key = self._key(text)
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            self._counts["lru"] += 1
+            EMBEDDING_REQUESTS.labels("lru").inc()
+            return vector
+
+        future = asyncio.get_running_loop().create_future()
+        # Identical texts in one batch share a single provider input
+        self._pending.setdefault(key, (text, []))[1].append(future)
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embeddings of several texts; they share batches with other callers"""
+        return list(await asyncio.gather(*(self.embed(text) for text in texts)))
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: Dict[str, Tuple[str, List[asyncio.Future]]]):
+        keys = list(batch)
+        try:
+            vectors = await self._cached(keys)
+            missing = [key for key in keys if key not in vectors]
+            if missing:
+                start = time.perf_counter()
+                embedded = await self.provider.embed_many([batch[key][0] for key in missing])
+                seconds = time.perf_counter() - start
+                path = self._throughput["single" if len(missing) == 1 else "batched"]
+                path[0] += len(missing)
+                path[1] += seconds
+                EMBEDDING_PROVIDER_SECONDS.labels(self.provider.name.split(":", 1)[0]).observe(seconds)
+                EMBEDDING_BATCH_SIZE.observe(len(missing))
+                self._counts["batches"] += 1
+                self._counts["provider"] += len(missing)
+                EMBEDDING_REQUESTS.labels("provider").inc(len(missing))
+                fresh = dict(zip(missing, embedded))
+                vectors.update(fresh)
+                await self._store(fresh)
+        except Exception as e:
+            self._counts["failed"] += len(keys)
+            for _, futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for key in keys:
+            self._remember(key, vectors[key])
+            for future in batch[key][1]:
+                if not future.done():
+                    future.set_result(vectors[key])
+
+    async def _cached(self, keys: List[str]) -> Dict[str, List[float]]:
+        client = self._redis()
+        if client is None:
+            return {}
+        try:
+            values = await asyncio.to_thread(client.mget, [f"{self.prefix}:{key}" for key in keys])
+        except Exception as e:
+            logger.debug("Embedding cache read failed: %s", e)
+            return {}
+        found = {}
+        for key, value in zip(keys, values):
+            if value:
+                vector = array("f")
+                vector.frombytes(value)
+                found[key] = vector.tolist()
+        if found:
+            self._counts["redis"] += len(found)
+            EMBEDDING_REQUESTS.labels("redis").inc(len(found))
+        return found
+
+    async def _store(self, vectors: Dict[str, List[float]]):
+        client = self._redis()
+        if client is None or not vectors:
+            return
+
+        def write():
+            pipe = client.pipeline(transaction=False)
+            for key, vector in vectors.items():
+                pipe.setex(f"{self.prefix}:{key}", self.cache_ttl, array("f", vector).tobytes())
+            pipe.execute()
+
+        try:
+            await asyncio.to_thread(write)
+        except Exception as e:
+            logger.debug("Embedding cache write failed: %s", e)
+
+    def stats(self) -> Dict:
+        """Counts, and provider embeddings/sec for single-text and batched calls"""
+        provider = self._counts["provider"]
+        return {
+            "provider": self.provider.name,
+            **self._counts,
+            "avg_batch": round(provider / self._counts["batches"], 1) if self._counts["batches"] else 0.0,
+            "provider_embeddings_per_sec": {
+                path: round(count / seconds, 1) if seconds else 0.0
+                for path, (count, seconds) in self._throughput.items()
+            },
+            "lru_size": len(self._lru),
+        }
+
+
+embedding_service = EmbeddingService()
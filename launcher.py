@@ -0,0 +1,198 @@
+"""
+Launcher - Run the API with one or more Uvicorn worker processes
+
+    python launcher.py                  # MAX_WORKERS workers (default: one per usable CPU)
+    MAX_WORKERS=1 python launcher.py    # single process, as before
+
+With several workers, startup work against shared services - database
+schema setup and the Qdrant collection check - runs once here before the
+workers are spawned, concurrently and bounded by STARTUP_STEP_TIMEOUT like
+the workers' own warm-up. Only if it all succeeded do workers see
+SALES_API_STARTUP_DONE and skip it; otherwise they retry it in their
+background warm-up. Replicas and workers starting together serialize
+schema setup on an advisory lock (see database.init_db).
+
+Per-process resources that would otherwise multiply with the worker count
+are divided between workers unless set explicitly: DB_POOL_SIZE,
+DB_MAX_OVERFLOW and CONVERSION_WORKERS. Metrics and /health stats stay per
+worker and are labelled with its pid (see worker_labels).
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from typing import Dict, Optional
+
+from startup import STARTUP_STEP_TIMEOUT, Warmup
+
+logger = logging.getLogger(__name__)
+
+# Worker processes: a number, or "auto" for one per usable CPU
+MAX_WORKERS = os.getenv("MAX_WORKERS", "auto")
+
+# Set for workers whose startup work was done by the launcher
+STARTUP_DONE_ENV = "SALES_API_STARTUP_DONE"
+
+# Number of workers the launcher started, seen by each of them
+WORKERS_ENV = "SALES_API_WORKERS"
+
+# Single-worker defaults from database.py and conversion_executor.py
+_DB_POOL_SIZE = 5
+_DB_MAX_OVERFLOW = 10
+
+
+def usable_cpus() -> int:
+    """CPUs this process may run on, honouring affinity and cgroup CPU quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def worker_count(setting: str = MAX_WORKERS) -> int:
+    """Number of workers for a MAX_WORKERS value"""
+    if str(setting).strip().lower() in ("", "auto"):
+        return usable_cpus()
+    try:
+        return max(1, int(setting))
+    except ValueError:
+        logger.warning(f"Invalid MAX_WORKERS '{setting}', using auto")
+        return usable_cpus()
+
+
+def per_worker_defaults(workers: int, cpus: Optional[int] = None) -> Dict[str, str]:
+    """
+    Settings that keep totals across workers close to one worker's.
+
+    The database pool is split so N workers don't open N times the
+    connections, down to a floor of 2 pooled + 2 overflow connections per
+    worker. Past 4 workers the total grows by 4 per worker (8 workers: 32,
+    16 workers: 64, against 15 for one); serve() logs the total.
+    Conversion processes share the CPUs with the workers.
+    """
+    cpus = cpus or usable_cpus()
+    return {
+        "DB_POOL_SIZE": str(max(2, math.ceil(_DB_POOL_SIZE / workers))),
+        "DB_MAX_OVERFLOW": str(max(2, math.ceil(_DB_MAX_OVERFLOW / workers))),
+        "CONVERSION_WORKERS": str(max(1, cpus // workers)),
+    }
+
+
+def max_connections(workers: int, env=os.environ) -> int:
+    """Database connections the workers may open in total (pool + overflow each)"""
+    pool = int(env.get("DB_POOL_SIZE", _DB_POOL_SIZE))
+    overflow = int(env.get("DB_MAX_OVERFLOW", _DB_MAX_OVERFLOW))
+    return workers * (pool + overflow)
+
+
+def worker_labels() -> Dict[str, str]:
+    """
+    Labels telling this worker's /metrics and /health apart from its siblings'.
+
+    Metrics and stats are per process and a scrape reaches whichever worker
+    accepts it, so with several workers each sample carries the worker's pid.
+    """
+    if int(os.getenv(WORKERS_ENV, "1")) <= 1:
+        return {}
+    return {"worker": str(os.getpid())}
+
+
+def startup_done() -> bool:
+    """Whether the launcher already ran the one-time startup work"""
+    return os.getenv(STARTUP_DONE_ENV) == "1"
+
+
+async def run_startup_tasks(step_timeout: float = STARTUP_STEP_TIMEOUT) -> bool:
+    """
+    Schema setup and the Qdrant collection check, once for all workers.
+
+    Returns whether every step succeeded within `step_timeout`.
+    """
+    # Imported here so per-worker settings are in the environment first
+    from database import close_db, init_db
+    from qdrant_service import QDRANT_URL, ensure_collection
+
+    steps = {"database": init_db}
+    if QDRANT_URL:
+        steps["qdrant"] = ensure_collection
+    tasks = Warmup(step_timeout)
+    try:
+        tasks.start(steps)
+        await tasks.wait()
+    finally:
+        # Workers open their own connections; don't hand sockets to them
+        await close_db()
+    return all(step["status"] == "ok" for step in tasks.steps.values())
+
+
+def serve(app=None):
+    """
+    Run the server on PORT with worker_count() workers.
+
+    Args:
+        app: The ASGI app for the single-worker case; workers import main:app
+    """
+    host = "0.0.0.0"
+    port = int(os.getenv("PORT", 8080))
+    workers = worker_count()
+
+    import uvicorn
+
+    if workers <= 1:
+        uvicorn.run(app or "main:app", host=host, port=port)
+        return
+
+    os.environ[WORKERS_ENV] = str(workers)
+    for name, value in per_worker_defaults(workers).items():
+        if name not in os.environ:
+            os.environ[name] = value
+            logger.info(f"{name}={value} per worker")
+    total = max_connections(workers)
+    if total > _DB_POOL_SIZE + _DB_MAX_OVERFLOW:
+        logger.warning(f"Up to {total} database connections across {workers} workers "
+                       f"(single process: {_DB_POOL_SIZE + _DB_MAX_OVERFLOW}); keep below Postgres max_connections "
+                       f"or set MAX_WORKERS, DB_POOL_SIZE and DB_MAX_OVERFLOW")
+    else:
+        logger.info(f"Up to {total} database connections across {workers} workers")
+
+    start = time.perf_counter()
+    if asyncio.run(run_startup_tasks()):
+        os.environ[STARTUP_DONE_ENV] = "1"
+        logger.info(f"🚀 Startup tasks done in {time.perf_counter() - start:.2f}s, starting {workers} workers")
+    else:
+        logger.warning(f"Startup tasks incomplete after {time.perf_counter() - start:.2f}s; "
+                       f"starting {workers} workers, which retry them in their warm-up")
+
+    uvicorn.run("main:app", host=host, port=port, workers=workers)
+
+
+if __name__ == "__main__":
+    from logging_setup import configure_logging
+
+    configure_logging()
+    serve()
@@ -3,10 +3,26 @@ LLM Gateway Client - Calls the LLM Gateway for AI responses
 """
 
 import httpx
+import asyncio
+import hashlib
+import json
 import os
 import logging
-from typing import List, Dict, Optional
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Dict, Optional, Tuple
 from constants.system_messages import SYSTEM_MESSAGE_TYPES, get_system_message_response
+from circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from metrics import (
+    LLM_COST_USD, LLM_HEDGES, LLM_ROUTE_REQUESTS, LLM_ROUTE_SECONDS, LLM_TOKENS,
+    PROMPT_BUILD_SECONDS, PROMPT_BYTES
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
@@ -14,14 +30,84 @@ logger = logging.getLogger(__name__)
 LLM_GATEWAY_URL = os.getenv("LLM_GATEWAY_URL")
 
 if not LLM_GATEWAY_URL:
+    # Not fatal at import: the app still starts and answers /live and /ready,
+    # and chat falls back to its canned reply until this is configured
     logger.error("LLM_GATEWAY_URL environment variable not set!")
-    raise ValueError("LLM_GATEWAY_URL is required")
 
 # Model configuration from environment
 DEFAULT_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
 DEFAULT_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
 DEFAULT_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "3000"))
 
+# Model routing: "light" turns (early-stage chit-chat, short messages) get a
+# cheaper model and a smaller max_tokens; "full" turns (qualification,
+# pitch, objections, long messages, test mode) get the full budget
+LLM_ROUTING = os.getenv("LLM_ROUTING", "true").lower() == "true"
+LLM_LIGHT_MODEL = os.getenv("LLM_LIGHT_MODEL", DEFAULT_MODEL)
+LLM_LIGHT_MAX_TOKENS = int(os.getenv("LLM_LIGHT_MAX_TOKENS", "800"))
+LLM_FULL_MODEL = os.getenv("LLM_FULL_MODEL", DEFAULT_MODEL)
+LLM_FULL_MAX_TOKENS = int(os.getenv("LLM_FULL_MAX_TOKENS", str(DEFAULT_MAX_TOKENS)))
+
+# Stages answered on the light route, and the longest message it takes
+LLM_LIGHT_STAGES = frozenset(
+    stage.strip() for stage in os.getenv("LLM_LIGHT_STAGES", "greeting,discovery").split(",") if stage.strip()
+)
+LLM_LIGHT_MAX_MESSAGE_CHARS = int(os.getenv("LLM_LIGHT_MAX_MESSAGE_CHARS", "500"))
+
+# Send prompt-cache hints (prefix key and length) in the gateway payload
+LLM_PROMPT_CACHE_HINTS = os.getenv("LLM_PROMPT_CACHE_HINTS", "true").lower() == "true"
+
+# USD per million input/output tokens, for cost accounting:
+# "model=input/output,model=input/output"
+LLM_PRICES = os.getenv(
+    "LLM_PRICES",
+    "gpt-4o-mini=0.15/0.60,gpt-4o=2.50/10.00,"
+    "claude-3-5-haiku-20241022=0.80/4.00,claude-3-5-sonnet-20241022=3.00/15.00"
+)
+
+# Seconds to wait for one gateway call
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Circuit breaker: open when LLM_BREAKER_FAILURE_RATE of the calls in the last
+# LLM_BREAKER_WINDOW seconds failed, or LLM_BREAKER_SLOW_RATE of them took
+# LLM_BREAKER_SLOW_SECONDS or longer; then fail fast for LLM_BREAKER_OPEN_SECONDS
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_SLOW_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "30"))
+LLM_BREAKER_SLOW_RATE = float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.8"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_WINDOW = float(os.getenv("LLM_BREAKER_WINDOW", "60"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+
+# Hedged requests: "off", "p95" (of recent successful calls) or a number of
+# seconds after which a second attempt is sent; the first answer wins
+LLM_HEDGE_AFTER = os.getenv("LLM_HEDGE_AFTER", "off").strip().lower()
+
+# Model for the hedged attempt (default: same model)
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL") or None
+
+# Shortest p95 hedge delay, and calls observed before p95 hedging starts
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "2"))
+_HEDGE_MIN_SAMPLES = 20
+
+gateway_breaker = CircuitBreaker(
+    "llm_gateway",
+    failure_rate=LLM_BREAKER_FAILURE_RATE,
+    slow_call_seconds=LLM_BREAKER_SLOW_SECONDS,
+    slow_call_rate=LLM_BREAKER_SLOW_RATE,
+    min_calls=LLM_BREAKER_MIN_CALLS,
+    window=LLM_BREAKER_WINDOW,
+    open_seconds=LLM_BREAKER_OPEN_SECONDS,
+)
+
+# Latencies of recent successful gateway calls, for the p95 hedge delay
+_latencies = deque(maxlen=500)
+
+# Shared client: keeps connections to the gateway alive between calls
+_http_client: Optional[httpx.AsyncClient] = None
+
+# System message markers, for a constant-time match on every incoming message
+SYSTEM_MESSAGE_VALUES = frozenset(SYSTEM_MESSAGE_TYPES.values())
+
 # Sales-specific system prompt
 SALES_SYSTEM_PROMPT = """You are an expert B2B sales assistant specializing in the iLaunching platform. 
 
@@ -189,13 +275,321 @@ NOT: `python print("wrong") `
 When user requests a specific format, demonstrate it clearly. Otherwise, have a normal helpful conversation using Markdown formatting naturally.
 """
 
+# Built once and reused by every request. The system message starts the
+# prompt prefix that stays byte-identical across turns, which providers can
+# serve from their prompt cache
+_SYSTEM_MESSAGES = {
+    False: {"role": "system", "content": SALES_SYSTEM_PROMPT},
+    True: {"role": "system", "content": TEST_MODE_SYSTEM_PROMPT},
+}
+_SYSTEM_DIGESTS = {
+    test_mode: hashlib.sha256(message["content"].encode()).digest()
+    for test_mode, message in _SYSTEM_MESSAGES.items()
+}
+
+# Lead details that don't change between turns, in a fixed order; they go
+# into the cached prefix. Stage is left out because it moves every few turns.
+_STABLE_CONTEXT_FIELDS = (("name", "Name"), ("company", "Company"))
+
+
+@dataclass
+class Prompt:
+    """Messages for one request; the first `prefix_messages` are stable per conversation"""
+    messages: List[Dict[str, str]]
+    prefix_messages: int
+    cache_key: str
+
+
+def _context_message(context: Optional[Dict]) -> Optional[Dict[str, str]]:
+    lines = [
+        f"{label}: {context[key]}" for key, label in _STABLE_CONTEXT_FIELDS
+        if context and context.get(key)
+    ]
+    if not lines:
+        return None
+    return {"role": "system", "content": "Lead context:\n" + "\n".join(lines)}
+
+
+def build_prompt(
+    messages: List[Dict[str, str]],
+    test_mode: bool = False,
+    context: Optional[Dict] = None,
+    knowledge: Optional[str] = None
+) -> Prompt:
+    """
+    Lay out a request as
+    [system prompt, stable context, history..., knowledge, message].
+
+    History is append-only, so each turn's prompt starts with the previous
+    turn's prompt and only the tail is new to the provider. Retrieved
+    knowledge differs per turn, so it goes last, just before the message.
+    """
+    test_mode = bool(test_mode)
+    prefix = [_SYSTEM_MESSAGES[test_mode]]
+    digest = hashlib.sha256(_SYSTEM_DIGESTS[test_mode])
+    context_message = _context_message(context)
+    if context_message is not None:
+        prefix.append(context_message)
+        digest.update(context_message["content"].encode())
+    if knowledge:
+        messages = messages[:-1] + [{"role": "system", "content": knowledge}] + messages[-1:]
+    return Prompt(prefix + messages, len(prefix), digest.hexdigest()[:32])
+
+
+def _encode(payload: Dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode()
+
+
+
+def parse_prices(setting: str) -> Dict[str, Tuple[float, float]]:
+    """Parse LLM_PRICES into model -> (input, output) USD per million tokens"""
+    prices = {}
+    for item in setting.split(","):
+        if not item.strip():
+            continue
+        try:
+            model, rates = item.split("=", 1)
+            prompt, completion = rates.split("/", 1)
+            prices[model.strip()] = (float(prompt), float(completion))
+        except ValueError:
+            logger.warning(f"Ignoring invalid LLM_PRICES entry '{item}'")
+    return prices
+
+
+_PRICES = parse_prices(LLM_PRICES)
+
+
+@dataclass(frozen=True)
+class Route:
+    """Model and response budget for a class of turns"""
+    name: str
+    model: str
+    max_tokens: int
+
+
+ROUTES = {
+    "light": Route("light", LLM_LIGHT_MODEL, LLM_LIGHT_MAX_TOKENS),
+    "full": Route("full", LLM_FULL_MODEL, LLM_FULL_MAX_TOKENS),
+    "test": Route("test", LLM_FULL_MODEL, LLM_FULL_MAX_TOKENS),
+}
+
+
+def route_request(stage: Optional[str], user_message: str, test_mode: bool = False) -> Route:
+    """
+    Pick the route for a turn.
+
+    Test mode always gets the full budget (format demos are long). Stages
+    in LLM_LIGHT_STAGES with a short message go to the light route;
+    everything else, and every turn with LLM_ROUTING off, goes to full.
+    """
+    if test_mode:
+        return ROUTES["test"]
+    if not LLM_ROUTING:
+        return ROUTES["full"]
+    if (stage or "greeting") in LLM_LIGHT_STAGES and len(user_message) <= LLM_LIGHT_MAX_MESSAGE_CHARS:
+        return ROUTES["light"]
+    return ROUTES["full"]
+
+
+def _estimate_tokens(text: str) -> int:
+    # About 4 characters per token for English text
+    return max(1, len(text) // 4)
+
+
+def _usage(data: Dict, messages: List[Dict[str, str]], content: str) -> Tuple[int, int]:
+    """Prompt and completion tokens, from the gateway if it reports them"""
+    usage = data.get("usage") or {}
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens"))
+    completion = usage.get("completion_tokens", usage.get("output_tokens"))
+    if prompt is None:
+        prompt = sum(_estimate_tokens(m.get("content") or "") for m in messages)
+    if completion is None:
+        completion = _estimate_tokens(content)
+    return int(prompt), int(completion)
+
+
+def request_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """USD cost of one call, or None for models without a price"""
+    price = _PRICES.get(model)
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+# Per-route totals since start, for /health
+_route_totals: Dict[str, Dict[str, float]] = {}
+
+
+def _account(route: str, model: str, outcome: str, seconds: float,
+             prompt_tokens: int = 0, completion_tokens: int = 0):
+    LLM_ROUTE_REQUESTS.labels(route, outcome).inc()
+    LLM_ROUTE_SECONDS.labels(route).observe(seconds)
+    totals = _route_totals.setdefault(
+        route, {"requests": 0, "failed": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+    )
+    totals["requests"] += 1
+    totals["seconds"] += seconds
+    if outcome != "ok":
+        totals["failed"] += 1
+        return
+    LLM_TOKENS.labels(route, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(route, "completion").inc(completion_tokens)
+    totals["prompt_tokens"] += prompt_tokens
+    totals["completion_tokens"] += completion_tokens
+    cost = request_cost(model, prompt_tokens, completion_tokens)
+    if cost is not None:
+        LLM_COST_USD.labels(route).inc(cost)
+        totals["cost_usd"] += cost
+
+
+def route_stats() -> Dict:
+    """Routes and their request, latency, token and cost totals"""
+    stats = {}
+    for name in list(ROUTES) + [name for name in _route_totals if name not in ROUTES]:
+        route = ROUTES.get(name)
+        totals = _route_totals.get(name, {})
+        requests = totals.get("requests", 0)
+        stats[name] = {
+            "model": route.model if route else None,
+            "max_tokens": route.max_tokens if route else None,
+            "requests": requests,
+            "failed": totals.get("failed", 0),
+            "avg_ms": round(totals["seconds"] / requests * 1000, 1) if requests else 0.0,
+            "prompt_tokens": totals.get("prompt_tokens", 0),
+            "completion_tokens": totals.get("completion_tokens", 0),
+            "cost_usd": round(totals.get("cost_usd", 0.0), 6),
+        }
+    return {"enabled": LLM_ROUTING, "routes": stats}
+
+
+class GatewayError(Exception):
+    """The gateway answered with an error status"""
+
+    def __init__(self, status_code: int, body: str):
+        super().__init__(f"LLM Gateway HTTP {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared gateway client, created on first use"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(timeout=LLM_TIMEOUT)
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared gateway client"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def hedge_delay(setting: str = None) -> Optional[float]:
+    """Seconds before a hedged second attempt, or None for no hedging"""
+    setting = LLM_HEDGE_AFTER if setting is None else setting
+    if setting in ("", "off", "0"):
+        return None
+    if setting == "p95":
+        if len(_latencies) < _HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(_latencies)
+        return max(LLM_HEDGE_MIN_SECONDS, ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))])
+    try:
+        return float(setting)
+    except ValueError:
+        logger.warning(f"Invalid LLM_HEDGE_AFTER '{setting}', hedging off")
+        return None
+
+
+async def _generate(body: bytes, model: str) -> Dict:
+    """One gateway call with an encoded payload, through the circuit breaker; returns the response JSON"""
+    gateway_breaker.before_call()
+    start = time.perf_counter()
+    try:
+        response = await get_http_client().post(
+            f"{LLM_GATEWAY_URL}/generate", content=body, headers={"Content-Type": "application/json"}
+        )
+    except asyncio.CancelledError:
+        # The other half of a hedged request won; no outcome to record
+        gateway_breaker.release()
+        raise
+    except Exception:
+        gateway_breaker.record(False, time.perf_counter() - start)
+        raise
+    elapsed = time.perf_counter() - start
+
+    if response.status_code == 200:
+        gateway_breaker.record(True, elapsed)
+        _latencies.append(elapsed)
+        data = response.json()
+        data.setdefault("model", model)
+        return data
+    # Other 4xx are problems with this request, not with the gateway
+    gateway_breaker.record(response.status_code < 500 and response.status_code != 429, elapsed)
+    raise GatewayError(response.status_code, response.text[:500])
+
+
+async def _generate_hedged(payload: Dict, body: bytes, delay: float) -> Dict:
+    """
+    Send a second attempt (to LLM_HEDGE_MODEL if set) when the first has not
+    answered within `delay` seconds, and return whichever succeeds first.
+    No hedge is sent unless the circuit is closed.
+    """
+    first = asyncio.create_task(_generate(body, payload["model"]))
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or gateway_breaker.state != CLOSED:
+            return await first
+
+        LLM_HEDGES.labels("fired").inc()
+        if LLM_HEDGE_MODEL:
+            second = asyncio.create_task(_generate(_encode(dict(payload, model=LLM_HEDGE_MODEL)), LLM_HEDGE_MODEL))
+        else:
+            second = asyncio.create_task(_generate(body, payload["model"]))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    LLM_HEDGES.labels("hedge_won" if task is second else "primary_won").inc()
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Also reached when the caller is cancelled while waiting; don't leave
+        # attempts holding gateway connections and probe slots
+        for task in pending:
+            if not task.done():
+                task.cancel()
+
+
+def gateway_stats() -> Dict:
+    """Circuit state, hedging settings and per-route totals for /health"""
+    delay = hedge_delay()
+    return {
+        "circuit": gateway_breaker.stats(),
+        "hedge_after": LLM_HEDGE_AFTER,
+        "hedge_delay_ms": round(delay * 1000) if delay is not None else None,
+        "routing": route_stats(),
+    }
+
 
 async def get_ai_response(
     messages: List[Dict[str, str]],
     model: str = "gpt-4o-mini",
     temperature: float = 0.7,
     max_tokens: int = 500,
-    test_mode: bool = False
+    test_mode: bool = False,
+    route: str = "direct",
+    context: Optional[Dict] = None,
+    knowledge: Optional[str] = None
 ) -> Optional[str]:
     """
     Get AI response from LLM Gateway
@@ -206,42 +600,60 @@ async def get_ai_response(
         temperature: Sampling temperature
         max_tokens: Max response tokens
         test_mode: If True, use test mode prompt for demonstrating formats
+        route: Route name the call's latency, tokens and cost are counted under
+        context: Lead details (name, company) for the stable prompt prefix
+        knowledge: Retrieved sales knowledge to add before the last message
     
     Returns:
-        AI response text or None if failed
+        AI response text or None if failed (or the circuit is open)
     """
+    if not LLM_GATEWAY_URL:
+        logger.error("LLM_GATEWAY_URL not set - no AI response")
+        return None
+
+    start = time.perf_counter()
+    outcome = "error"
     try:
-        # Choose system prompt based on mode
-        system_prompt = TEST_MODE_SYSTEM_PROMPT if test_mode else SALES_SYSTEM_PROMPT
+        # System prompt (test mode or sales) and stable context first
+        prompt = build_prompt(messages, test_mode, context, knowledge)
+        payload = {
+            "model": model,
+            "messages": prompt.messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        }
+        if LLM_PROMPT_CACHE_HINTS:
+            payload["prompt_cache"] = {"key": prompt.cache_key, "prefix_messages": prompt.prefix_messages}
+        body = _encode(payload)
+        build_seconds = time.perf_counter() - start
+        PROMPT_BUILD_SECONDS.labels(route).observe(build_seconds)
+        PROMPT_BYTES.labels(route).observe(len(body))
+        logger.debug("Prompt (%s route): %d messages, %d in cached prefix, %d bytes, built in %.2fms",
+                     route, len(prompt.messages), prompt.prefix_messages, len(body), build_seconds * 1000)
         
-        # Prepend system prompt
-        full_messages = [
-            {"role": "system", "content": system_prompt}
-        ] + messages
+        delay = hedge_delay()
+        if delay is None:
+            data = await _generate(body, model)
+        else:
+            data = await _generate_hedged(payload, body, delay)
+        ai_message = data.get("content", "")
         
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{LLM_GATEWAY_URL}/generate",
-                json={
-                    "model": model,
-                    "messages": full_messages,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens
-                }
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                ai_message = data.get("content", "")
-                logger.info(f"✅ LLM Gateway success: {len(ai_message)} chars")
-                return ai_message
-            else:
-                logger.error(f"❌ LLM Gateway HTTP error: {response.status_code}")
-                logger.error(f"Response body: {response.text[:500]}")
-                return None
+        outcome = "ok"
+        prompt_tokens, completion_tokens = _usage(data, prompt.messages, ai_message)
+        _account(route, data["model"], outcome, time.perf_counter() - start, prompt_tokens, completion_tokens)
+        logger.debug("✅ LLM Gateway success (%s route, %s): %d chars", route, data["model"], len(ai_message))
+        return ai_message
                 
+    except CircuitOpenError as e:
+        outcome = "circuit_open"
+        logger.warning("⚡ LLM Gateway circuit open - failing fast (retry in %.0fs)", e.retry_after)
+        return None
+    except GatewayError as e:
+        logger.error(f"❌ LLM Gateway HTTP error: {e.status_code}")
+        logger.error(f"Response body: {e.body}")
+        return None
     except httpx.TimeoutException:
-        logger.error(f"LLM Gateway timeout after 60s - URL: {LLM_GATEWAY_URL}")
+        logger.error(f"LLM Gateway timeout after {LLM_TIMEOUT:g}s - URL: {LLM_GATEWAY_URL}")
         return None
     except httpx.ConnectError as e:
         logger.error(f"LLM Gateway connection error - URL: {LLM_GATEWAY_URL} - Error: {e}")
@@ -249,13 +661,17 @@ async def get_ai_response(
     except Exception as e:
         logger.error(f"LLM Gateway request failed - URL: {LLM_GATEWAY_URL} - Error: {type(e).__name__}: {e}")
         return None
+    finally:
+        if outcome != "ok":
+            _account(route, model, outcome, time.perf_counter() - start)
 
 
 async def get_sales_response(
     conversation_history: List[Dict[str, str]],
     user_message: str,
     context: Optional[Dict] = None,
-    test_mode: bool = False
+    test_mode: bool = False,
+    knowledge: Optional[str] = None
 ) -> str:
     """
     Get contextual sales response based on conversation history
@@ -265,6 +681,7 @@ async def get_sales_response(
         user_message: Latest user message
         context: Optional context (company, email, stage, etc)
         test_mode: If True, use test mode for demonstrating formats
+        knowledge: Retrieved sales knowledge for this turn (see retrieval.py)
     
     Returns:
         AI-generated sales response or system message
@@ -276,21 +693,18 @@ async def get_sales_response(
     # Trim whitespace from user message to avoid match failures
     user_message_clean = user_message.strip()
     
-    logger.info(f"📨 Incoming message: '{user_message_clean[:100]}...'")
-    logger.info(f"🔍 System message types available: {list(SYSTEM_MESSAGE_TYPES.values())}")
+    logger.debug("📨 Incoming message: '%.100s...'", user_message_clean)
     
     message_parts = user_message_clean.split('|USER:', 1)
     base_message = message_parts[0].strip()
     user_name = message_parts[1].strip() if len(message_parts) > 1 else ''
     
-    logger.info(f"🔎 Parsed - base_message: '{base_message}', user_name: '{user_name}'")
-    
-    if base_message in SYSTEM_MESSAGE_TYPES.values():
-        logger.info(f"✅ System message MATCHED: {base_message}, user: {user_name}")
+    if base_message in SYSTEM_MESSAGE_VALUES:
+        logger.info("✅ System message MATCHED: %s, user: %s", base_message, user_name)
         try:
             system_response = get_system_message_response(base_message, user_name)
             message_content = system_response.get("message", "Hello! How can I help you today?")
-            logger.info(f"📤 Returning system message: {len(message_content)} chars")
+            logger.debug("📤 Returning system message: %d chars", len(message_content) if message_content else 0)
             
             # Verify we have valid content before returning
             if not message_content or not isinstance(message_content, str):
@@ -302,11 +716,9 @@ async def get_sales_response(
             logger.error(f"❌ System message generation failed: {sys_error}", exc_info=True)
             # Return a safe fallback - don't let it fall through to LLM
             return "Welcome! I'm here to help you. Let's get started - what brings you here today?"
-    else:
-        logger.info(f"⚠️ NOT a system message. Base message '{base_message}' not in system types.")
     
     # Otherwise, continue with normal LLM processing
-    logger.info(f"💬 Processing user message with LLM: {user_message[:50]}...")
+    logger.debug("💬 Processing user message with LLM: %.50s...", user_message)
     
     # Build message list from history
     messages = []
@@ -323,13 +735,17 @@ async def get_sales_response(
         "content": user_message
     })
     
-    # Get AI response with configured defaults
+    # Model and response budget for this kind of turn
+    route = route_request((context or {}).get("stage"), user_message, test_mode)
     response = await get_ai_response(
         messages=messages,
-        model=DEFAULT_MODEL,
+        model=route.model,
         temperature=DEFAULT_TEMPERATURE,
-        max_tokens=DEFAULT_MAX_TOKENS,
-        test_mode=test_mode
+        max_tokens=route.max_tokens,
+        test_mode=test_mode,
+        route=route.name,
+        context=context,
+        knowledge=knowledge
     )
     
     # Fallback if LLM fails
@@ -337,5 +753,5 @@ async def get_sales_response(
         logger.warning("⚠️ LLM returned no response, using fallback")
         return "Thank you for your message. I'm having trouble connecting right now. Could you please tell me more about what you're looking for, and I'll get back to you shortly?"
     
-    logger.info(f"✅ LLM response successful: {len(response)} chars")
+    logger.debug("✅ LLM response successful: %d chars", len(response))
     return response
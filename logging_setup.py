@@ -0,0 +1,192 @@
+"""
+Logging Setup - Structured, queue-based logging with per-module sampling
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from metrics import LOG_RECORDS_DROPPED
+
+# Root log level (DEBUG, INFO, WARNING, ERROR)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# "text" for human-readable lines, "json" for one JSON object per line
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+# Per-module sampling of DEBUG/INFO records, e.g. "redis_client=0.01,main=0.5".
+# A rate applies to the named logger and its children; WARNING and above are
+# never sampled.
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# Records buffered for the writer thread; further records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = "%(levelname)s:%(name)s:%(message)s"
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Parse "name=rate,name=rate" into a dict.
+
+    Malformed entries are ignored and rates are clamped to [0, 1].
+    """
+    rates = {}
+    for entry in spec.split(","):
+        name, _, rate = entry.partition("=")
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON objects, including `extra=` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a fraction of DEBUG/INFO records per logger.
+
+    The most specific configured prefix wins, so "main=0.1,main.ws=1" samples
+    main at 10% but keeps everything from main.ws.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._cache: Dict[str, float] = {}
+
+    def rate_for(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to the writer thread without formatting them.
+
+    The stock QueueHandler formats every record in the calling thread so it
+    can be pickled; our queue is in-process, so formatting is left to the
+    listener thread. Records are dropped when the queue is full rather than
+    blocking the event loop; drops are counted in sales_log_records_dropped_total.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+def configure_logging(
+    level: str = LOG_LEVEL,
+    fmt: str = LOG_FORMAT,
+    sample_rates: str = LOG_SAMPLE_RATES,
+    stream=None
+) -> NonBlockingQueueHandler:
+    """
+    Route root logging through a queue to a background writer thread.
+
+    Replaces any handlers already on the root logger. Safe to call more than
+    once; the previous writer thread is stopped first.
+
+    Args:
+        level: Root log level name
+        fmt: "text" or "json"
+        sample_rates: LOG_SAMPLE_RATES-style sampling spec
+        stream: Output stream (default: stdout)
+
+    Returns:
+        The queue handler installed on the root logger
+    """
+    global _handler, _listener
+    stop_logging()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    rates = parse_sample_rates(sample_rates)
+    if rates:
+        handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    _handler = handler
+    return handler
+
+
+def stats() -> Dict[str, int]:
+    """Queue depth and records dropped by the installed handler, for /health"""
+    if _handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _handler.queue.qsize(), "dropped": _handler.dropped}
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
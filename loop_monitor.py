@@ -0,0 +1,89 @@
+"""
+Event Loop Monitor - Sample event loop lag
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from metrics import EVENT_LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# How often the sampler wakes up; lag is how late each wake-up is
+LOOP_LAG_INTERVAL_MS = int(os.getenv("LOOP_LAG_INTERVAL_MS", "100"))
+
+# Lag above this is logged as a warning
+LOOP_LAG_WARN_MS = int(os.getenv("LOOP_LAG_WARN_MS", "250"))
+
+
+class LoopLagMonitor:
+    """
+    Measure how late the event loop runs a periodic timer.
+
+    A task sleeps for `interval` and records how much later than requested it
+    woke up. Any coroutine or callback that holds the loop (e.g. a large
+    inline markdown conversion) shows up directly as lag, and every other
+    connection on the worker is delayed by the same amount.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_MS / 1000, window: int = 600):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.total_samples = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start sampling on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop sampling"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.record(lag)
+
+    def record(self, lag: float):
+        """Record one lag sample in seconds"""
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        self.samples.append(lag)
+        self.total_samples += 1
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if lag * 1000 > LOOP_LAG_WARN_MS:
+            logger.warning(f"🐢 Event loop lag {lag * 1000:.0f}ms")
+
+    def stats(self) -> Dict[str, float]:
+        """Lag statistics in milliseconds over the recent window"""
+        if not self.samples:
+            return {"samples": 0, "current_ms": 0.0, "avg_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        ordered = sorted(self.samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return {
+            "samples": self.total_samples,
+            "current_ms": round(self.samples[-1] * 1000, 2),
+            "avg_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p99_ms": round(p99 * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+        }
+
+
+loop_monitor = LoopLagMonitor()
@@ -3,25 +3,54 @@ Minimal Sales API - Full Stack with Vector Search
 Version: 2.4.1 - WebSocket streaming with metadata
 """
 
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
 import logging
 import asyncio
+import hmac
+import itertools
+import os
+import time
 
-from database import init_db, close_db, get_db
-from models import Conversation
-from redis_client import close_redis, cache_conversation, get_cached_conversation, invalidate_cache
-from llm_client import get_sales_response
+from database import init_db, close_db, pool_status
+from conversation_store import (
+    CONVERSATION_FIELDS, load_conversation, get_or_create_conversation, append_messages,
+    fetch_conversation, fetch_summary
+)
+from conversation_transfer import (
+    IMPORT_CONFLICT_MODES, iter_export, gzip_stream, gunzip_stream, iter_lines, import_conversations
+)
+from redis_client import init_redis, close_redis, cache_conversation, get_cached_conversation, invalidate_cache
+from llm_client import close_http_client as close_llm_client, gateway_stats, get_sales_response
 from mcp_client import handle_objection, get_pitch_template, calculate_value
-from qdrant_service import ensure_collection, get_qdrant_stats
-from content_processor import smart_chunk_content, analyze_content_complexity
-from markdown_to_tiptap import convert_markdown_to_tiptap
+from qdrant_service import QDRANT_URL, ensure_collection, close_qdrant, get_qdrant_stats
+from content_processor import analyze_content_complexity
+from conversion_executor import (
+    start_conversion_pool, shutdown_conversion_pool, run_conversion,
+    convert_markdown, chunk_content
+)
+from loop_monitor import loop_monitor
+from write_behind import write_behind
+from rate_limit import SESSION_MAX_SECONDS, client_identity, rate_limiter
+from stream_buffer import new_request_id, stream_buffer
+from retrieval import start_retrieval
+from embeddings import embedding_service
+from launcher import WORKERS_ENV, startup_done, worker_labels
+from startup import warmup
+from readiness import prober
+import analytics
+from logging_setup import configure_logging, stats as logging_stats
+from metrics import (
+    REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE, RequestSpans,
+    STREAM_FIRST_FRAME_SECONDS, STREAM_LAST_FRAME_SECONDS, STREAM_SEND_SECONDS,
+    STREAM_PACING_SECONDS, STREAM_REQUESTS, WEBSOCKET_CONNECTIONS
+)
 
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -30,33 +59,50 @@ async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     logger.info("Starting Sales API...")
     
-    # Initialize database
-    try:
-        await init_db()
-        logger.info("Database initialized")
-    except Exception as e:
-        logger.warning(f"Database init failed: {e}. Running without DB.")
+    # Start conversion workers before anything else spawns threads
+    start_conversion_pool()
+    loop_monitor.start()
     
-    # Qdrant initialization - don't block startup if it fails
-    # Run in background to avoid blocking healthcheck
-    import asyncio
-    asyncio.create_task(initialize_qdrant())
+    # Connect to dependencies in the background so the server binds right
+    # away; /ready turns 200 once this is done. Schema setup and the Qdrant
+    # collection check are done once by the launcher with several workers.
+    steps = {"redis": lambda: asyncio.to_thread(init_redis)}
+    if startup_done():
+        logger.info("Database and Qdrant setup done by the launcher")
+    else:
+        steps["database"] = init_db
+        if QDRANT_URL:
+            steps["qdrant"] = ensure_collection
+    
+    def after_warmup():
+        # Background persistence of chat turns (WRITE_BEHIND=redis|file) needs
+        # Redis, and rollups need the schema
+        try:
+            write_behind.start()
+        except Exception as e:
+            logger.warning(f"Write-behind start failed: {e}. Writing turns synchronously.")
+        # Keep recent analytics rollups fresh
+        analytics.start_rollup_refresh()
+        # Dependency probes behind /ready
+        prober.start()
+    
+    warmup.start(steps, on_complete=after_warmup)
     
     yield
     logger.info("Shutting down...")
+    await warmup.stop()
+    await prober.stop()
+    # Flush queued turns while the database is still open
+    await write_behind.stop()
+    await analytics.stop_rollup_refresh()
+    await loop_monitor.stop()
+    shutdown_conversion_pool()
     await close_db()
+    await close_qdrant()
+    await close_llm_client()
     close_redis()
 
 
-async def initialize_qdrant():
-    """Initialize Qdrant collection in background"""
-    try:
-        await ensure_collection()
-        logger.info("Qdrant collection ready")
-    except Exception as e:
-        logger.warning(f"Qdrant init failed: {e}. Running without vector search.")
-
-
 app = FastAPI(
     title="Sales API - Complete System",
     version="1.5.0",
@@ -77,6 +123,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Token for the bulk conversation export/import endpoints, sent as
+# X-Admin-Token; while unset those endpoints are disabled
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
 
 @app.get("/")
 async def root():
@@ -88,9 +138,36 @@ async def root():
     }
 
 
+@app.get("/live")
+async def live():
+    """Liveness: the process is up and serving, whatever its dependencies"""
+    return {"status": "alive"}
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: 200 once warm-up has finished and every required dependency
+    answered its last background probe; 503 otherwise. Served from cached
+    probe results, so polling it never touches a dependency.
+    """
+    startup = warmup.report()
+    probes = prober.report()
+    if not startup["ready"]:
+        status = "starting"
+    elif not probes["ready"]:
+        status = "unavailable"
+    else:
+        status = "ready"
+    content = {"status": status, "startup": startup, **probes}
+    if status != "ready":
+        return JSONResponse(status_code=503, content=content)
+    return content
+
+
 @app.get("/health")
 async def health():
-    """Health check with system status"""
+    """Health check with system status; all but dependencies are this worker's own"""
     try:
         qdrant_stats = get_qdrant_stats()
     except Exception as e:
@@ -98,70 +175,157 @@ async def health():
         qdrant_stats = None
     
     return {
-        "status": "healthy",
-        "qdrant": qdrant_stats if qdrant_stats else "not_configured"
+        "status": "healthy" if prober.ready else "degraded",
+        "dependencies": prober.report()["dependencies"],
+        "worker": {"pid": os.getpid(), "workers": int(os.getenv(WORKERS_ENV, "1"))},
+        "qdrant": qdrant_stats if qdrant_stats else "not_configured",
+        "llm_gateway": gateway_stats(),
+        "embeddings": embedding_service.stats(),
+        "event_loop": loop_monitor.stats(),
+        "logging": logging_stats(),
+        "write_behind": await write_behind.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "database_pool": pool_status(),
+        "startup": warmup.report()
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text-format metrics"""
+    return Response(content=REGISTRY.render(worker_labels()), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.post("/api/sales/conversations")
-async def create_conversation(data: dict, db: AsyncSession = Depends(get_db)):
-    """Create a new sales conversation"""
+async def create_conversation(data: dict):
+    """Create a new sales conversation, or return the existing one for this session"""
     try:
-        conversation = Conversation(
+        conversation = await get_or_create_conversation(
             session_id=data.get("session_id", f"session-{datetime.now().timestamp()}"),
             email=data.get("email"),
             name=data.get("name"),
-            company=data.get("company"),
-            messages=[]
+            company=data.get("company")
         )
-        db.add(conversation)
-        await db.commit()
-        await db.refresh(conversation)
         
         return {
-            "id": conversation.id,
-            "session_id": conversation.session_id,
-            "email": conversation.email,
-            "status": "created"
+            "id": conversation["id"],
+            "session_id": conversation["session_id"],
+            "email": conversation["email"],
+            "status": "created" if conversation["created"] else "exists"
         }
     except Exception as e:
         logger.error(f"Error creating conversation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/sales/conversations:export")
+async def export_conversations(
+    request: Request,
+    updated_since: Optional[datetime] = Query(None, description="Only conversations created or updated at or after this time (ISO 8601)"),
+    gzip: bool = Query(False, description="gzip the response (Content-Encoding: gzip)")
+):
+    """
+    Export conversations as NDJSON, one conversation per line, in id order.
+    
+    Rows are streamed from a server-side cursor, so memory stays constant
+    regardless of table size. X-Export-Started-At is the time the export
+    began; pass it as updated_since on the next sync to get only changes.
+    
+    Needs the X-Admin-Token header; rate limited per client IP and API key.
+    """
+    await _enforce_rate_limit(request)
+    _require_admin(request)
+    
+    if updated_since is not None and updated_since.tzinfo is None:
+        updated_since = updated_since.replace(tzinfo=timezone.utc)
+    
+    body = iter_export(updated_since)
+    headers = {"X-Export-Started-At": datetime.now(timezone.utc).isoformat()}
+    if gzip:
+        body = gzip_stream(body)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(body, media_type="application/x-ndjson", headers=headers)
+
+
+@app.post("/api/sales/conversations:import")
+async def import_conversations_endpoint(
+    request: Request,
+    on_conflict: str = Query("skip", description="skip: keep existing conversations; update: overwrite them")
+):
+    """
+    Import NDJSON conversations (the export format) from the request body.
+    
+    The body is read as a stream and loaded with COPY in batches, so large
+    files don't have to fit in memory. Send `Content-Encoding: gzip` for a
+    compressed body. Returns counts and rows/sec.
+    
+    Needs the X-Admin-Token header; rate limited per client IP and API key.
+    """
+    await _enforce_rate_limit(request)
+    _require_admin(request)
+    
+    if on_conflict not in IMPORT_CONFLICT_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown on_conflict: {on_conflict}. Allowed: {', '.join(IMPORT_CONFLICT_MODES)}"
+        )
+    
+    chunks = request.stream()
+    if request.headers.get("content-encoding", "").lower() == "gzip":
+        chunks = gunzip_stream(chunks)
+    try:
+        return await import_conversations(iter_lines(chunks), on_conflict)
+    except Exception as e:
+        logger.error(f"Error importing conversations: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/api/sales/conversations/{session_id}")
-async def get_conversation(session_id: str, db: AsyncSession = Depends(get_db)):
-    """Get conversation by session ID - with Redis caching"""
+async def get_conversation(
+    session_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Return at most this many messages (latest first page)"),
+    before: Optional[int] = Query(None, ge=0, description="Only return messages before this index"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return")
+):
+    """
+    Get conversation by session ID - with Redis caching
+    
+    Only the requested fields are read from the database, and with
+    limit/before only that page of messages (the response then includes
+    messages_total and messages_start; pass messages_start as `before` to
+    get the previous page). Only the default full view is cached.
+    """
     try:
+        if fields:
+            requested = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = set(requested) - set(CONVERSATION_FIELDS)
+            if unknown:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(CONVERSATION_FIELDS)}"
+                )
+            requested = [field for field in CONVERSATION_FIELDS if field in requested]
+        else:
+            requested = list(CONVERSATION_FIELDS)
+        
+        default_view = fields is None and limit is None and before is None
+        
         # Try cache first
-        cached = get_cached_conversation(session_id)
-        if cached:
-            logger.info(f"Returning cached conversation for {session_id}")
-            return cached
+        if default_view:
+            cached = get_cached_conversation(session_id)
+            if cached:
+                logger.debug("Returning cached conversation for %s", session_id)
+                return cached
         
         # Cache miss - get from database
-        result = await db.execute(
-            select(Conversation).where(Conversation.session_id == session_id)
-        )
-        conversation = result.scalar_one_or_none()
+        response = await fetch_conversation(session_id, requested, limit, before)
         
-        if not conversation:
+        if not response:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        response = {
-            "id": conversation.id,
-            "session_id": conversation.session_id,
-            "email": conversation.email,
-            "name": conversation.name,
-            "company": conversation.company,
-            "messages": conversation.messages,
-            "current_stage": conversation.current_stage,
-            "qualification_score": conversation.qualification_score,
-            "created_at": conversation.created_at.isoformat() if conversation.created_at else None
-        }
-        
         # Cache for 30 minutes
-        cache_conversation(session_id, response, ttl=1800)
+        if default_view:
+            cache_conversation(session_id, response, ttl=1800)
         
         return response
     except HTTPException:
@@ -171,60 +335,114 @@ async def get_conversation(session_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/sales/conversations/{session_id}/summary")
+async def get_conversation_summary(session_id: str):
+    """Get conversation metadata and message count, without any JSON columns"""
+    try:
+        summary = await fetch_summary(session_id)
+        if not summary:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+        return summary
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting conversation summary: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _enforce_rate_limit(request: Request, session_id: Optional[str] = None):
+    """Reject with 429 when the session, client IP or API key is over its limit"""
+    decision = await rate_limiter.check(session=session_id, **client_identity(request))
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded ({decision.scope})",
+            headers={"Retry-After": decision.retry_after_header}
+        )
+
+
+def _require_admin(request: Request):
+    """Reject unless the request carries ADMIN_TOKEN (404 while none is configured)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("x-admin-token", "")
+    if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Admin-Token")
+
+
 @app.post("/api/sales/message")
-async def send_message(data: dict, db: AsyncSession = Depends(get_db)):
-    """Send message and save to database"""
+async def send_message(data: dict, request: Request):
+    """
+    Send message and save to database
+    
+    The conversation is read, then created or appended to with a single
+    upsert once the LLM has answered; no database connection is held while
+    waiting for the LLM, and concurrent messages are all appended.
+    
+    With write-behind enabled the turn is queued instead and written in the
+    background ("persisted": "queued"); conversation_id is then null for a
+    conversation that doesn't exist yet.
+    
+    Rate limited per session, client IP and API key (429 with Retry-After).
+    """
+    await _enforce_rate_limit(request, data.get("session_id", "default"))
+    retrieval = None
     try:
         session_id = data.get("session_id", "default")
         message_text = data.get("message", "")
         test_mode = data.get("test_mode", False)  # Add test mode flag
         
-        # Get or create conversation
-        result = await db.execute(
-            select(Conversation).where(Conversation.session_id == session_id)
-        )
-        conversation = result.scalar_one_or_none()
+        # Knowledge base lookup runs while the history loads
+        retrieval = start_retrieval(message_text)
         
-        if not conversation:
-            conversation = Conversation(
-                session_id=session_id,
-                email=data.get("email"),
-                messages=[]
-            )
-            db.add(conversation)
+        # Short read transaction - the connection goes back to the pool here
+        conversation = await load_conversation(session_id)
         
-        # Add message to conversation
-        messages = conversation.messages or []
-        messages.append({
+        user_entry = {
             "role": "user",
             "content": message_text,
             "timestamp": datetime.now().isoformat()
-        })
+        }
+        history = ((conversation.messages or []) if conversation else [])
+        if write_behind.enabled:
+            history = history + write_behind.pending_messages(session_id)
+        history = history + [user_entry]
         
         # Get AI response from LLM Gateway (with test mode support)
         response_text = await get_sales_response(
-            conversation_history=messages,
+            conversation_history=history,
             user_message=message_text,
             context={
-                "email": conversation.email,
-                "name": conversation.name,
-                "company": conversation.company,
-                "stage": conversation.current_stage
+                "email": conversation.email if conversation else data.get("email"),
+                "name": conversation.name if conversation else None,
+                "company": conversation.company if conversation else None,
+                "stage": conversation.current_stage if conversation else "greeting"
             },
-            test_mode=test_mode
+            test_mode=test_mode,
+            knowledge=await retrieval.knowledge()
         )
         
-        messages.append({
+        turn = [user_entry, {
             "role": "assistant",
             "content": response_text,
             "timestamp": datetime.now().isoformat()
-        })
+        }]
         
-        conversation.messages = messages
-        conversation.updated_at = datetime.now()
+        if write_behind.enabled:
+            try:
+                await write_behind.enqueue(session_id, turn, email=data.get("email"))
+                return {
+                    "message": response_text,
+                    "session_id": session_id,
+                    "conversation_id": conversation.id if conversation else None,
+                    "status": "ok",
+                    "persisted": "queued"
+                }
+            except Exception as e:
+                logger.warning(f"Write-behind enqueue failed, writing synchronously: {e}")
         
-        await db.commit()
-        await db.refresh(conversation)
+        # Create-or-append in one statement
+        written = await append_messages(session_id, turn, email=data.get("email"))
         
         # Invalidate cache since conversation updated
         invalidate_cache(session_id)
@@ -232,19 +450,25 @@ async def send_message(data: dict, db: AsyncSession = Depends(get_db)):
         return {
             "message": response_text,
             "session_id": session_id,
-            "conversation_id": conversation.id,
-            "status": "ok"
+            "conversation_id": written["id"],
+            "status": "ok",
+            "persisted": "written"
         }
     except Exception as e:
         logger.error(f"Error sending message: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Don't leave the lookup running when loading or the LLM call failed
+        if retrieval is not None:
+            retrieval.cancel()
 
 
 # ============= MCP TOOL ENDPOINTS =============
 
 @app.post("/api/mcp/objection")
-async def handle_sales_objection(data: dict):
+async def handle_sales_objection(data: dict, request: Request):
     """Handle sales objection using MCP"""
+    await _enforce_rate_limit(request)
     try:
         objection_type = data.get("objection_type")
         context = data.get("context", {})
@@ -261,8 +485,9 @@ async def handle_sales_objection(data: dict):
 
 
 @app.post("/api/mcp/pitch")
-async def get_sales_pitch(data: dict):
+async def get_sales_pitch(data: dict, request: Request):
     """Get pitch template using MCP"""
+    await _enforce_rate_limit(request)
     try:
         industry = data.get("industry")
         pain_points = data.get("pain_points", [])
@@ -280,8 +505,9 @@ async def get_sales_pitch(data: dict):
 
 
 @app.post("/api/mcp/value")
-async def calculate_roi(data: dict):
+async def calculate_roi(data: dict, request: Request):
     """Calculate value/ROI using MCP"""
+    await _enforce_rate_limit(request)
     try:
         company_size = data.get("company_size")
         industry = data.get("industry")
@@ -298,22 +524,111 @@ async def calculate_roi(data: dict):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============================================================================
+# ANALYTICS - Dashboard queries (daily rollups, open leads)
+# ============================================================================
+
+def _analytics_range(start: Optional[date], end: Optional[date]):
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return start, end
+
+
+def _analytics_filters(**filters):
+    return {field: value for field, value in filters.items() if value}
+
+
+@app.get("/api/analytics/daily")
+async def analytics_daily(
+    start: Optional[date] = Query(None, description="First day (UTC), default 29 days before end"),
+    end: Optional[date] = Query(None, description="Last day (UTC), default today"),
+    group_by: Optional[str] = Query(None, description="Split each day by current_stage, quality_tier or industry"),
+    current_stage: Optional[str] = None,
+    quality_tier: Optional[str] = None,
+    industry: Optional[str] = None
+):
+    """Daily conversation, conversion and score totals from the rollups"""
+    start, end = _analytics_range(start, end)
+    if group_by and group_by not in analytics.GROUP_BY_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown group_by: {group_by}. Allowed: {', '.join(analytics.GROUP_BY_FIELDS)}"
+        )
+    try:
+        rows = await analytics.daily_series(
+            start, end, group_by,
+            _analytics_filters(current_stage=current_stage, quality_tier=quality_tier, industry=industry)
+        )
+        return {"start": start.isoformat(), "end": end.isoformat(), "group_by": group_by, "days": rows}
+    except Exception as e:
+        logger.error(f"Error getting daily analytics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/analytics/funnel")
+async def analytics_funnel(
+    start: Optional[date] = Query(None, description="First day (UTC), default 29 days before end"),
+    end: Optional[date] = Query(None, description="Last day (UTC), default today"),
+    quality_tier: Optional[str] = None,
+    industry: Optional[str] = None
+):
+    """Conversations and conversions per stage from the rollups"""
+    start, end = _analytics_range(start, end)
+    try:
+        stages = await analytics.funnel(
+            start, end, _analytics_filters(quality_tier=quality_tier, industry=industry)
+        )
+        return {"start": start.isoformat(), "end": end.isoformat(), "stages": stages}
+    except Exception as e:
+        logger.error(f"Error getting funnel analytics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/analytics/open-leads")
+async def analytics_open_leads(
+    days: int = Query(30, ge=1, le=365, description="Created within this many days"),
+    quality_tier: Optional[str] = None,
+    pain_point: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500)
+):
+    """Most recent unconverted conversations (live, not from the rollups)"""
+    since = datetime.now(timezone.utc) - timedelta(days=days)
+    try:
+        leads = await analytics.open_leads(since, quality_tier, pain_point, limit)
+        return {"leads": leads}
+    except Exception as e:
+        logger.error(f"Error getting open leads: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================================================
 # STREAMING ENDPOINT - Tiptap Editor Content Streaming
 # ============================================================================
 
 @app.websocket("/ws/stream/{session_id}")
-async def stream_content_websocket(websocket: WebSocket, session_id: str):
+async def stream_content_websocket(
+    websocket: WebSocket,
+    session_id: str,
+    resume_from_index: Optional[int] = None,
+    request_id: Optional[str] = None
+):
     """
     Production-ready WebSocket endpoint for streaming content to Tiptap editor.
     
     Security & Reliability Features:
     - Session validation and timeout handling
-    - Rate limiting per session
+    - Rate limiting per session, client IP and API key, shared across
+      workers and replicas (see rate_limit.py)
     - Comprehensive error recovery
     - Resource cleanup on disconnect
     - Request validation and sanitization
     - Stream control (pause/resume/skip)
+    - Resumable streams: generated nodes are buffered in Redis, so a client
+      that reconnects (to any replica) with ?resume_from_index=N, and
+      optionally &request_id=..., gets the remaining nodes replayed without
+      a new LLM call (see stream_buffer.py)
     
     Flow:
     1. Client connects and sends content request
@@ -323,10 +638,10 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
     5. Client receives chunks and displays in editor
     
     Message Types:
-    - Client → Server: {"type": "stream_request", "content": "...", "content_type": "text|html|markdown", "speed": "normal", "chunk_by": "word"}
+    - Client → Server: {"type": "stream_request", "content": "...", "content_type": "text|html|markdown", "speed": "normal", "chunk_by": "word", "request_id": "optional"}
     - Client → Server: {"type": "stream_control", "action": "pause|resume|skip"}
-    - Server → Client: {"type": "connected", "session_id": "...", "limits": {...}}
-    - Server → Client: {"type": "stream_start", "total_chunks": 100, "metadata": {...}}
+    - Server → Client: {"type": "connected", "session_id": "...", "limits": {...}, "resumable": true}
+    - Server → Client: {"type": "stream_start", "total_nodes": 100, "request_id": "...", "start_index": 0, "metadata": {...}}
     - Server → Client: {"type": "chunk", "data": "...", "index": 0}
     - Server → Client: {"type": "stream_complete", "total_chunks": 100}
     - Server → Client: {"type": "stream_paused"}
@@ -334,11 +649,9 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
     - Server → Client: {"type": "stream_skipped"}
     - Server → Client: {"type": "error", "message": "...", "code": "..."}
     """
-    # Session tracking and rate limiting
-    session_start = datetime.utcnow()
+    # Session tracking; request limits are enforced by rate_limiter
     request_count = 0
-    MAX_REQUESTS_PER_SESSION = 100
-    MAX_SESSION_DURATION = 3600  # 1 hour
+    MAX_SESSION_DURATION = SESSION_MAX_SECONDS
     MAX_CONTENT_SIZE = 100_000  # 100KB per request
     
     # Stream control state
@@ -350,6 +663,11 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
     }
     
     await websocket.accept()
+    WEBSOCKET_CONNECTIONS.inc()
+    identity = client_identity(websocket)
+    # Reconnecting with the same session id keeps the original start time
+    session_start = await rate_limiter.session_started(session_id)
+    session_limit = rate_limiter.limits.get("session")
     logger.info(f"✅ WebSocket connected: {session_id}")
     
     # Start background task to handle incoming messages
@@ -375,16 +693,43 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
             "session_id": session_id,
             "timestamp": datetime.utcnow().isoformat(),
             "limits": {
-                "max_requests": MAX_REQUESTS_PER_SESSION,
+                "max_requests": session_limit.capacity if session_limit else None,
                 "max_content_size": MAX_CONTENT_SIZE,
-                "max_session_duration": MAX_SESSION_DURATION
-            }
+                "max_session_duration": MAX_SESSION_DURATION,
+                "rate_limits": rate_limiter.describe()
+            },
+            "resumable": stream_buffer.enabled
         })
         
+        # Replay the rest of a stream interrupted by a disconnect
+        if resume_from_index is not None:
+            buffered = await stream_buffer.replay(session_id, request_id, resume_from_index)
+            if buffered is None:
+                logger.info("Nothing to resume for %s (request %s)", session_id, request_id or "latest")
+                await websocket.send_json({
+                    "type": "error",
+                    "code": "RESUME_UNAVAILABLE",
+                    "message": "Stream is not buffered or has expired; send the request again",
+                    "request_id": request_id
+                })
+            else:
+                logger.info("⏯️ Resuming %s/%s from node %d of %d",
+                            session_id, buffered.request_id, buffered.start_index, buffered.total_nodes)
+                STREAM_REQUESTS.labels("resumed").inc()
+                await _stream_with_controls(websocket, stream_control, stream_tiptap_nodes(
+                    websocket=websocket,
+                    nodes=buffered.nodes,
+                    speed=buffered.speed,
+                    session_id=session_id,
+                    stream_control=stream_control,
+                    request_id=buffered.request_id,
+                    start_index=buffered.start_index
+                ))
+        
         # Wait for streaming requests
         while True:
             # Check session duration
-            session_duration = (datetime.utcnow() - session_start).total_seconds()
+            session_duration = time.time() - session_start
             if session_duration > MAX_SESSION_DURATION:
                 logger.warning(f"Session {session_id} exceeded max duration: {session_duration}s")
                 await websocket.send_json({
@@ -421,14 +766,20 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
             
             if data.get("type") == "stream_request":
                 request_count += 1
+                spans = RequestSpans()
                 
                 # Rate limiting
-                if request_count > MAX_REQUESTS_PER_SESSION:
-                    logger.warning(f"Session {session_id} exceeded rate limit: {request_count}")
+                decision = await rate_limiter.check(session=session_id, **identity)
+                if not decision.allowed:
+                    logger.warning("Session %s rate limited by %s limit (request %d)",
+                                   session_id, decision.scope, request_count)
+                    STREAM_REQUESTS.labels("rate_limited").inc()
                     await websocket.send_json({
                         "type": "error",
                         "code": "RATE_LIMIT_EXCEEDED",
-                        "message": f"Maximum {MAX_REQUESTS_PER_SESSION} requests per session"
+                        "message": f"Too many requests for this {decision.scope.replace('_', ' ')}",
+                        "scope": decision.scope,
+                        "retry_after": round(decision.retry_after, 3)
                     })
                     continue
                 
@@ -441,6 +792,7 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
                 # Validate content size
                 if len(content) > MAX_CONTENT_SIZE:
                     logger.warning(f"Content too large: {len(content)} bytes")
+                    STREAM_REQUESTS.labels("rejected").inc()
                     await websocket.send_json({
                         "type": "error",
                         "code": "CONTENT_TOO_LARGE",
@@ -450,6 +802,7 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
                 
                 # Validate parameters
                 if content_type not in ["text", "html", "markdown"]:
+                    STREAM_REQUESTS.labels("rejected").inc()
                     await websocket.send_json({
                         "type": "error",
                         "code": "INVALID_CONTENT_TYPE",
@@ -458,6 +811,7 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
                     continue
                 
                 if chunk_by not in ["word", "sentence", "paragraph", "character"]:
+                    STREAM_REQUESTS.labels("rejected").inc()
                     await websocket.send_json({
                         "type": "error",
                         "code": "INVALID_CHUNK_STRATEGY",
@@ -465,31 +819,42 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
                     })
                     continue
                 
-                logger.info(f"🔄 Stream request #{request_count}: session={session_id}, length={len(content)}, type={content_type}, speed={speed}")
+                stream_request_id = new_request_id(data.get("request_id"))
+                logger.info("🔄 Stream request #%d: session=%s, request=%s, length=%d, type=%s, speed=%s",
+                            request_count, session_id, stream_request_id, len(content), content_type, speed)
+                # Knowledge base lookup overlaps the buffer write
+                retrieval = start_retrieval(content)
+                await stream_buffer.begin(session_id, stream_request_id, speed)
                 
                 # Get LLM response for the user's query
                 try:
                     # Check if test_mode is enabled
                     test_mode = data.get("test_mode", False)
                     
-                    logger.info(f"🤖 Calling LLM with user query: {content[:100]}... (test_mode={test_mode})")
-                    llm_response = await get_sales_response(
-                        conversation_history=[],  # TODO: Track conversation history per session
-                        user_message=content,
-                        test_mode=test_mode
-                    )
-                    logger.info(f"✅ LLM response received: {len(llm_response)} chars")
+                    logger.debug("🤖 Calling LLM with user query: %.100s... (test_mode=%s)", content, test_mode)
+                    with spans.span("retrieval"):
+                        knowledge = await retrieval.knowledge()
+                    with spans.span("llm"):
+                        llm_response = await get_sales_response(
+                            conversation_history=[],  # TODO: Track conversation history per session
+                            user_message=content,
+                            test_mode=test_mode,
+                            knowledge=knowledge
+                        )
+                    logger.debug("✅ LLM response received: %d chars", len(llm_response) if llm_response else 0)
                     
                     # Verify we got valid content
                     if not llm_response or not isinstance(llm_response, str):
                         logger.error(f"❌ Invalid LLM response type: {type(llm_response)}")
                         raise ValueError("Invalid LLM response")
                     
-                    # Convert LLM markdown to Tiptap JSON nodes
-                    logger.info("🔄 Converting markdown to Tiptap JSON...")
+                    # Convert LLM markdown to Tiptap JSON nodes (large
+                    # responses are converted in the worker pool)
+                    logger.debug("🔄 Converting markdown to Tiptap JSON...")
                     try:
-                        tiptap_nodes = convert_markdown_to_tiptap(llm_response)
-                        logger.info(f"✅ Converted to {len(tiptap_nodes)} Tiptap nodes")
+                        with spans.span("conversion"):
+                            tiptap_nodes = await convert_markdown(llm_response)
+                        logger.debug("✅ Converted to %d Tiptap nodes", len(tiptap_nodes))
                     except Exception as convert_error:
                         logger.error(f"❌ Markdown conversion failed: {convert_error}", exc_info=True)
                         # Fallback: create simple paragraph node with raw text
@@ -514,69 +879,25 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
                         }]
                     }]
                 
+                # Buffer before sending, so a reconnect can replay the rest
+                await stream_buffer.store(session_id, stream_request_id, tiptap_nodes)
+                
                 # Process and stream LLM response with error handling
                 try:
-                    stream_control["paused"] = False
-                    stream_control["skip"] = False
-                    
-                    # Create streaming task with Tiptap JSON nodes
-                    streaming_task = asyncio.create_task(
-                        stream_tiptap_nodes(
-                            websocket=websocket,
-                            nodes=tiptap_nodes,
-                            speed=speed,
-                            session_id=session_id,
-                            stream_control=stream_control
-                        )
-                    )
-                    
-                    # Process control messages while streaming
-                    while not streaming_task.done():
-                        try:
-                            # Check for control messages without blocking
-                            control_msg = await asyncio.wait_for(
-                                stream_control["message_queue"].get(), 
-                                timeout=0.1
-                            )
-                            
-                            if control_msg.get("type") == "stream_control":
-                                action = control_msg.get("action")
-                                logger.info(f"🎮 Stream control during streaming: {action}")
-                                
-                                if action == "pause":
-                                    stream_control["paused"] = True
-                                    await websocket.send_json({
-                                        "type": "stream_paused",
-                                        "timestamp": datetime.utcnow().isoformat()
-                                    })
-                                elif action == "resume":
-                                    stream_control["paused"] = False
-                                    await websocket.send_json({
-                                        "type": "stream_resumed",
-                                        "timestamp": datetime.utcnow().isoformat()
-                                    })
-                                elif action == "skip":
-                                    stream_control["skip"] = True
-                                    await websocket.send_json({
-                                        "type": "stream_skipped",
-                                        "timestamp": datetime.utcnow().isoformat()
-                                    })
-                            else:
-                                # Put non-control messages back in queue
-                                await stream_control["message_queue"].put(control_msg)
-                                
-                        except asyncio.TimeoutError:
-                            # No control message, continue
-                            pass
-                        
-                        # Small delay to prevent busy loop
-                        await asyncio.sleep(0.05)
-                    
-                    # Wait for streaming to complete
-                    await streaming_task
+                    await _stream_with_controls(websocket, stream_control, stream_tiptap_nodes(
+                        websocket=websocket,
+                        nodes=tiptap_nodes,
+                        speed=speed,
+                        session_id=session_id,
+                        stream_control=stream_control,
+                        spans=spans,
+                        request_id=stream_request_id
+                    ))
+                    STREAM_REQUESTS.labels("completed").inc()
                     
                 except Exception as e:
                     logger.error(f"❌ Stream processing failed: {type(e).__name__}: {e}")
+                    STREAM_REQUESTS.labels("failed").inc()
                     await websocket.send_json({
                         "type": "error",
                         "code": "PROCESSING_ERROR",
@@ -612,15 +933,71 @@ async def stream_content_websocket(websocket: WebSocket, session_id: str):
     finally:
         # Cleanup
         message_handler_task.cancel()
+        WEBSOCKET_CONNECTIONS.dec()
         logger.info(f"🧹 Cleaning up session: {session_id}")
 
 
+async def _stream_with_controls(websocket: WebSocket, stream_control: dict, stream):
+    """Run a stream coroutine, applying pause/resume/skip messages that arrive meanwhile"""
+    stream_control["paused"] = False
+    stream_control["skip"] = False
+    streaming_task = asyncio.create_task(stream)
+    
+    # Process control messages while streaming
+    while not streaming_task.done():
+        try:
+            # Check for control messages without blocking
+            control_msg = await asyncio.wait_for(
+                stream_control["message_queue"].get(), 
+                timeout=0.1
+            )
+            
+            if control_msg.get("type") == "stream_control":
+                action = control_msg.get("action")
+                logger.info(f"🎮 Stream control during streaming: {action}")
+                
+                if action == "pause":
+                    stream_control["paused"] = True
+                    await websocket.send_json({
+                        "type": "stream_paused",
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+                elif action == "resume":
+                    stream_control["paused"] = False
+                    await websocket.send_json({
+                        "type": "stream_resumed",
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+                elif action == "skip":
+                    stream_control["skip"] = True
+                    await websocket.send_json({
+                        "type": "stream_skipped",
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+            else:
+                # Put non-control messages back in queue
+                await stream_control["message_queue"].put(control_msg)
+                
+        except asyncio.TimeoutError:
+            # No control message, continue
+            pass
+        
+        # Small delay to prevent busy loop
+        await asyncio.sleep(0.05)
+    
+    # Wait for streaming to complete
+    await streaming_task
+
+
 async def stream_tiptap_nodes(
     websocket: WebSocket,
     nodes: list,
     speed: str,
     session_id: str = "unknown",
-    stream_control: dict = None
+    stream_control: dict = None,
+    spans: RequestSpans = None,
+    request_id: Optional[str] = None,
+    start_index: int = 0
 ):
     """
     Stream Tiptap JSON nodes directly to the client.
@@ -642,9 +1019,16 @@ async def stream_tiptap_nodes(
         speed: Speed preset ("slow"|"normal"|"fast"|"superfast")
         session_id: Session identifier for logging
         stream_control: Dict with pause/skip state
+        spans: Timings of the request; first/last frame, send and pacing
+            time are added to it
+        request_id: Identifies the buffered stream, for resuming
+        start_index: Index of the first node when resuming; `nodes` is the
+            remainder of the response
     """
     if stream_control is None:
         stream_control = {"paused": False, "skip": False}
+    if spans is None:
+        spans = RequestSpans()
     
     try:
         # Speed preset delays (seconds)
@@ -656,21 +1040,24 @@ async def stream_tiptap_nodes(
         }
         delay = speed_delays.get(speed, 0.2)
         
-        logger.info(f"🎬 Starting Tiptap node stream: {len(nodes)} nodes, speed={speed}")
+        logger.debug("🎬 Starting Tiptap node stream: %d nodes, speed=%s", len(nodes), speed)
         
         # Send stream start event
+        total_nodes = start_index + len(nodes)
         await websocket.send_json({
             "type": "stream_start",
-            "total_nodes": len(nodes),
+            "total_nodes": total_nodes,
+            "request_id": request_id,
+            "start_index": start_index,
             "metadata": {
-                "node_count": len(nodes),
+                "node_count": total_nodes,
                 "speed_used": speed,
                 "format": "tiptap_json"
             },
             "timestamp": datetime.utcnow().isoformat()
         })
         
-        sent_nodes = 0
+        sent_nodes = start_index
         
         for i, node in enumerate(nodes):
             try:
@@ -679,12 +1066,12 @@ async def stream_tiptap_nodes(
                     logger.info("⏭️ Stream skipped, sending all remaining nodes")
                     # Send all remaining nodes immediately
                     for remaining_node in nodes[i:]:
-                        await websocket.send_json({
+                        await _send_frame(websocket, {
                             "type": "node",
                             "data": remaining_node,
                             "index": sent_nodes,
                             "timestamp": datetime.utcnow().isoformat()
-                        })
+                        }, spans)
                         sent_nodes += 1
                     break
                 
@@ -698,28 +1085,29 @@ async def stream_tiptap_nodes(
                 if stream_control.get("skip"):
                     logger.info("⏭️ Stream skipped after pause")
                     for remaining_node in nodes[i:]:
-                        await websocket.send_json({
+                        await _send_frame(websocket, {
                             "type": "node",
                             "data": remaining_node,
                             "index": sent_nodes,
                             "timestamp": datetime.utcnow().isoformat()
-                        })
+                        }, spans)
                         sent_nodes += 1
                     break
                 
                 # Send the Tiptap JSON node
-                await websocket.send_json({
+                await _send_frame(websocket, {
                     "type": "node",
                     "data": node,
                     "index": sent_nodes,
                     "shouldAnimate": True,  # Frontend can use this for animation control
                     "timestamp": datetime.utcnow().isoformat()
-                })
+                }, spans)
                 sent_nodes += 1
-                logger.debug(f"Sent node {sent_nodes}/{len(nodes)}: {node.get('type', 'unknown')}")
+                logger.debug("Sent node %d/%d: %s", sent_nodes, total_nodes, node.get("type", "unknown"))
                 
                 # Throttle based on speed preset
                 if i < len(nodes) - 1:  # Don't delay after last node
+                    pacing_start = time.perf_counter()
                     elapsed = 0
                     interval = 0.05  # Check every 50ms
                     while elapsed < delay:
@@ -727,6 +1115,9 @@ async def stream_tiptap_nodes(
                             break
                         await asyncio.sleep(min(interval, delay - elapsed))
                         elapsed += interval
+                    pacing = time.perf_counter() - pacing_start
+                    STREAM_PACING_SECONDS.inc(pacing)
+                    spans.add("pacing", pacing)
                         
             except Exception as e:
                 logger.error(f"Error sending node {i}: {type(e).__name__}: {e}")
@@ -736,10 +1127,14 @@ async def stream_tiptap_nodes(
         await websocket.send_json({
             "type": "stream_complete",
             "total_nodes": sent_nodes,
+            "request_id": request_id,
             "session_id": session_id,
             "timestamp": datetime.utcnow().isoformat()
         })
-        logger.info(f"✅ Tiptap stream complete: {sent_nodes} nodes sent for session {session_id}")
+        spans.add("last_frame", spans.elapsed())
+        STREAM_LAST_FRAME_SECONDS.observe(spans.stages["last_frame"])
+        logger.info("✅ Tiptap stream complete: %d nodes sent for session %s", sent_nodes, session_id)
+        logger.info("⏱️ Stream timings for %s: %s", session_id, spans)
         
     except Exception as e:
         logger.error(f"❌ Tiptap stream error: {type(e).__name__}: {e}", exc_info=True)
@@ -788,8 +1183,8 @@ async def process_and_stream_content(
     try:
         # Analyze content for optimal strategy
         try:
-            analysis = analyze_content_complexity(content)
-            logger.info(f"📊 Content analysis: {analysis}")
+            analysis = await run_conversion(analyze_content_complexity, content)
+            logger.debug("📊 Content analysis: %s", analysis)
         except Exception as e:
             logger.error(f"Analysis failed: {e}, using defaults")
             analysis = {"recommended_speed": "normal", "complexity": "unknown"}
@@ -797,7 +1192,7 @@ async def process_and_stream_content(
         # Use adaptive speed if requested
         if speed == "adaptive":
             speed = analysis.get("recommended_speed", "normal")
-            logger.info(f"⚡ Adaptive speed selected: {speed}")
+            logger.debug("⚡ Adaptive speed selected: %s", speed)
         
         # Speed preset delays (seconds) - increased for better visual streaming
         speed_delays = {
@@ -808,13 +1203,16 @@ async def process_and_stream_content(
         }
         delay = speed_delays.get(speed, 0.2)
         
-        # Smart chunking with content processing
+        # Smart chunking with content processing - small content is chunked
+        # lazily while we stream, large content in the worker pool
         try:
-            chunks, metadata = smart_chunk_content(
+            chunk_stream = await chunk_content(
                 content=content,
                 content_type=content_type,
                 chunk_by=chunk_by
             )
+            chunks = _with_lookahead(chunk_stream)
+            first_chunk = next(chunks, None)
         except Exception as e:
             logger.error(f"Chunking failed: {type(e).__name__}: {e}")
             await websocket.send_json({
@@ -824,7 +1222,7 @@ async def process_and_stream_content(
             })
             return
         
-        if not chunks:
+        if first_chunk is None:
             logger.warning("No chunks generated, sending error")
             await websocket.send_json({
                 "type": "error",
@@ -833,57 +1231,50 @@ async def process_and_stream_content(
             })
             return
         
-        logger.info(f"✅ Processed content: {metadata.get('chunk_count', 0)} chunks, complexity: {analysis.get('complexity', 'unknown')}")
+        logger.debug("✅ Processed content in %sms, complexity: %s", chunk_stream.prepare_time_ms, analysis.get('complexity', 'unknown'))
         
-        # Send stream start event with metadata
+        # Send stream start event with metadata. The chunk count is only
+        # known once the stream is exhausted and is reported in stream_complete.
         await websocket.send_json({
             "type": "stream_start",
-            "total_chunks": len(chunks),
+            "total_chunks": None,
             "content_type": content_type,
             "metadata": {
                 "complexity": analysis.get("complexity", "unknown"),
                 "word_count": analysis.get("word_count", 0),
                 "has_html": analysis.get("has_html", False),
                 "speed_used": speed,
-                "processing_time_ms": metadata.get("processing_time_ms", 0),
-                "avg_chunk_size": metadata.get("avg_chunk_size", 0)
+                "processing_time_ms": chunk_stream.prepare_time_ms
             },
             "timestamp": datetime.utcnow().isoformat()
         })
         
-        # Diff-based streaming: accumulate and send complete HTML fragments
-        accumulated = ""
-        previous_length = 0
+        # Diff-based streaming: hold back only the content not yet sent
+        pending = ""
         sent_chunks = 0
         
-        for i, chunk in enumerate(chunks):
+        for i, (chunk, is_last) in enumerate(itertools.chain([first_chunk], chunks)):
             try:
-                # Check if stream should be skipped (check at start)
-                if stream_control.get("skip"):
+                # Check if stream should be skipped (check at start), or
+                # again once a pause ends
+                skipped = stream_control.get("skip")
+                if not skipped:
+                    # Wait while paused (also check for skip during pause)
+                    while stream_control.get("paused"):
+                        if stream_control.get("skip"):
+                            # Skip even while paused
+                            break
+                        await asyncio.sleep(0.1)  # Check every 100ms
+                    skipped = stream_control.get("skip")
+                    if skipped:
+                        logger.info("⏭️ Stream skipped after pause, sending all remaining content")
+                else:
                     logger.info("⏭️ Stream skipped, sending all remaining content")
-                    # Send all remaining chunks immediately
-                    remaining_content = "".join(chunks[i:])
-                    await websocket.send_json({
-                        "type": "chunk",
-                        "data": remaining_content,
-                        "index": sent_chunks,
-                        "timestamp": datetime.utcnow().isoformat()
-                    })
-                    sent_chunks += 1
-                    break
                 
-                # Wait while paused (also check for skip during pause)
-                while stream_control.get("paused"):
-                    if stream_control.get("skip"):
-                        # Skip even while paused
-                        break
-                    await asyncio.sleep(0.1)  # Check every 100ms
-                
-                # Check skip again after pause
-                if stream_control.get("skip"):
-                    logger.info("⏭️ Stream skipped after pause, sending all remaining content")
-                    remaining_content = "".join(chunks[i:])
-                    await websocket.send_json({
+                if skipped:
+                    # Send all remaining content immediately
+                    remaining_content = pending + chunk + "".join(rest for rest, _ in chunks)
+                    await _send_frame(websocket, {
                         "type": "chunk",
                         "data": remaining_content,
                         "index": sent_chunks,
@@ -892,38 +1283,35 @@ async def process_and_stream_content(
                     sent_chunks += 1
                     break
                 
-                # Accumulate content
-                accumulated += chunk
-                
-                # Calculate new content to send (diff from previous state)
-                new_content = accumulated[previous_length:]
+                # Accumulate content not yet sent
+                pending += chunk
                 
                 # Only send if we have complete HTML or enough content
                 # For HTML: ensure we're not breaking in the middle of a tag
                 if content_type == "html":
                     # Simple tag balance check: count < and >
-                    open_tags = new_content.count("<")
-                    close_tags = new_content.count(">")
+                    open_tags = pending.count("<")
+                    close_tags = pending.count(">")
                     
                     # If tags are unbalanced, wait for more chunks (unless last chunk)
-                    if open_tags != close_tags and i < len(chunks) - 1:
-                        logger.debug(f"Chunk {i}: Tag imbalance ({open_tags} < vs {close_tags} >), accumulating...")
+                    if open_tags != close_tags and not is_last:
+                        logger.debug("Chunk %d: Tag imbalance (%d < vs %d >), accumulating...", i, open_tags, close_tags)
                         continue
                 
                 # Send the complete fragment
-                if new_content.strip():
-                    await websocket.send_json({
+                if pending.strip():
+                    await _send_frame(websocket, {
                         "type": "chunk",
-                        "data": new_content,
+                        "data": pending,
                         "index": sent_chunks,
                         "timestamp": datetime.utcnow().isoformat()
                     })
                     sent_chunks += 1
-                    previous_length = len(accumulated)
-                    logger.debug(f"Sent chunk {sent_chunks}: {len(new_content)} chars")
+                    logger.debug("Sent chunk %d: %d chars", sent_chunks, len(pending))
+                    pending = ""
                 
                 # Throttle based on speed preset with backpressure detection
-                if i < len(chunks) - 1:  # Don't delay after last chunk
+                if not is_last:  # Don't delay after last chunk
                     try:
                         # Break delay into smaller intervals to check skip flag
                         elapsed = 0
@@ -944,13 +1332,19 @@ async def process_and_stream_content(
                 continue
         
         # Stream complete
+        stream_metadata = chunk_stream.metadata
         await websocket.send_json({
             "type": "stream_complete",
             "total_chunks": sent_chunks,
             "session_id": session_id,
+            "metadata": {
+                "chunk_count": stream_metadata.get("chunk_count", 0),
+                "processing_time_ms": stream_metadata.get("processing_time_ms", 0),
+                "avg_chunk_size": stream_metadata.get("avg_chunk_size", 0)
+            },
             "timestamp": datetime.utcnow().isoformat()
         })
-        logger.info(f"✅ Stream complete: {sent_chunks} chunks sent for session {session_id}")
+        logger.info("✅ Stream complete: %d chunks sent for session %s", sent_chunks, session_id)
         
     except Exception as e:
         logger.error(f"❌ Stream processing error: {type(e).__name__}: {e}", exc_info=True)
@@ -964,8 +1358,32 @@ async def process_and_stream_content(
             pass
 
 
+async def _send_frame(websocket: WebSocket, payload: dict, spans: RequestSpans = None):
+    """Send a content frame, recording send time and the request's first frame"""
+    start = time.perf_counter()
+    await websocket.send_json(payload)
+    duration = time.perf_counter() - start
+    STREAM_SEND_SECONDS.observe(duration)
+    if spans is not None:
+        spans.add("send", duration)
+        if spans.mark("first_frame"):
+            STREAM_FIRST_FRAME_SECONDS.observe(spans.stages["first_frame"])
+
+
+def _with_lookahead(items):
+    """Yield (item, is_last) pairs without materializing the iterable"""
+    iterator = iter(items)
+    try:
+        current = next(iterator)
+    except StopIteration:
+        return
+    for upcoming in iterator:
+        yield current, False
+        current = upcoming
+    yield current, True
+
+
 if __name__ == "__main__":
-    import uvicorn
-    import os
-    port = int(os.getenv("PORT", 8080))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # MAX_WORKERS=1 runs this app in-process; more workers import main:app
+    from launcher import serve
+    serve(app)
@@ -0,0 +1,506 @@
+"""
+Metrics - In-process counters, gauges and histograms with Prometheus text output
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds: 1ms .. 60s
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base class: a named metric with optional labels, one child per label set"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        """Return the child for a label set, creating it on first use"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels {self.labelnames}; use .labels()")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self, const_labels: Optional[Dict[str, str]] = None) -> List[str]:
+        """Exposition lines; const_labels are added to every sample"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        const_labels = const_labels or {}
+        names = tuple(const_labels) + self.labelnames
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._render_child(names, tuple(const_labels.values()) + key, child))
+        return lines
+
+    def _render_child(self, names, key, child) -> List[str]:
+        return [f"{self.name}{_format_labels(names, key)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("upper_bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.upper_bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the with-block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram.
+
+    Memory is bounded by the number of buckets and label sets, independent of
+    how many values are observed.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(b for b in buckets if not math.isinf(b)))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _render_child(self, names, key, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), child.counts):
+            cumulative += bucket_count
+            labels = _format_labels(names, key, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(names, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self, const_labels: Optional[Dict[str, str]] = None) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Args:
+            const_labels: Labels added to every sample, e.g. the worker
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect(const_labels))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    """Create and register a Counter"""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    """Create and register a Gauge"""
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Iterable[str] = (),
+    buckets: Iterable[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    """Create and register a Histogram"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Streaming pipeline metrics
+STREAM_STAGE_SECONDS = histogram(
+    "sales_stream_stage_seconds",
+    "Time spent in each stage of a stream request (llm, conversion)",
+    ["stage"]
+)
+STREAM_FIRST_FRAME_SECONDS = histogram(
+    "sales_stream_first_frame_seconds",
+    "Time from stream request to the first node sent"
+)
+STREAM_LAST_FRAME_SECONDS = histogram(
+    "sales_stream_last_frame_seconds",
+    "Time from stream request to stream_complete"
+)
+STREAM_SEND_SECONDS = histogram(
+    "sales_stream_send_seconds",
+    "Time spent in a single WebSocket send",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+STREAM_PACING_SECONDS = counter(
+    "sales_stream_pacing_seconds_total",
+    "Time spent sleeping between nodes to pace the stream"
+)
+STREAM_REQUESTS = counter(
+    "sales_stream_requests_total",
+    "Stream requests by outcome",
+    ["outcome"]
+)
+WEBSOCKET_CONNECTIONS = gauge(
+    "sales_websocket_connections",
+    "Open WebSocket connections"
+)
+EVENT_LOOP_LAG_SECONDS = histogram(
+    "sales_event_loop_lag_seconds",
+    "How late the event loop ran a periodic timer",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+
+DB_POOL_CHECKED_OUT = gauge(
+    "sales_db_pool_checked_out",
+    "Database connections currently checked out of the pool"
+)
+DB_POOL_OVERFLOW = gauge(
+    "sales_db_pool_overflow",
+    "Database connections open beyond pool_size"
+)
+DB_POOL_WAIT_SECONDS = histogram(
+    "sales_db_pool_wait_seconds",
+    "Time a checkout waited for a database connection (including connect)"
+)
+DB_POOL_TIMEOUTS = counter(
+    "sales_db_pool_timeouts_total",
+    "Checkouts that gave up after pool_timeout"
+)
+DB_POOL_PINGS = counter(
+    "sales_db_pool_pings_total",
+    "Liveness pings of idle connections on checkout",
+    ["result"]
+)
+
+# Bulk transfer
+CONVERSATION_EXPORT_ROWS = counter(
+    "sales_conversation_export_rows_total",
+    "Conversations written to NDJSON exports"
+)
+CONVERSATION_IMPORT_ROWS = counter(
+    "sales_conversation_import_rows_total",
+    "NDJSON lines loaded by conversation imports"
+)
+
+# Write-behind persistence
+WRITE_BEHIND_PENDING = gauge(
+    "sales_write_behind_pending",
+    "Turns queued by this process and not yet written to Postgres"
+)
+WRITE_BEHIND_LAG_SECONDS = histogram(
+    "sales_write_behind_lag_seconds",
+    "Time from queueing a turn to committing it"
+)
+WRITE_BEHIND_TURNS = counter(
+    "sales_write_behind_turns_total",
+    "Turns written to Postgres by the write-behind consumer"
+)
+WRITE_BEHIND_BATCHES = counter(
+    "sales_write_behind_batches_total",
+    "Write-behind batches by result",
+    ["result"]
+)
+
+# Rate limiting
+RATE_LIMIT_DECISIONS = counter(
+    "sales_rate_limit_decisions_total",
+    "Rate limit checks by result and where they were decided (lease, redis, local)",
+    ["result", "source"]
+)
+RATE_LIMIT_REJECTIONS = counter(
+    "sales_rate_limit_rejections_total",
+    "Rejected requests by the limit that was exhausted",
+    ["scope"]
+)
+
+# LLM gateway resilience
+CIRCUIT_STATE = gauge(
+    "sales_circuit_state",
+    "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+    ["circuit"]
+)
+CIRCUIT_TRANSITIONS = counter(
+    "sales_circuit_transitions_total",
+    "Circuit breaker state changes by new state",
+    ["circuit", "state"]
+)
+CIRCUIT_REJECTED = counter(
+    "sales_circuit_rejected_total",
+    "Calls failed fast because the circuit was open",
+    ["circuit"]
+)
+LLM_HEDGES = counter(
+    "sales_llm_hedges_total",
+    "Hedged gateway requests: fired, and which attempt answered first",
+    ["outcome"]
+)
+
+LLM_ROUTE_REQUESTS = counter(
+    "sales_llm_route_requests_total",
+    "Gateway calls by model route and outcome (ok, error, circuit_open)",
+    ["route", "outcome"]
+)
+LLM_ROUTE_SECONDS = histogram(
+    "sales_llm_route_seconds",
+    "Gateway call latency by model route",
+    ["route"]
+)
+LLM_TOKENS = counter(
+    "sales_llm_tokens_total",
+    "Tokens by model route and kind (prompt, completion); estimated when the gateway doesn't report usage",
+    ["route", "kind"]
+)
+LLM_COST_USD = counter(
+    "sales_llm_cost_usd_total",
+    "Estimated gateway spend in USD by model route (models priced in LLM_PRICES)",
+    ["route"]
+)
+
+PROMPT_BUILD_SECONDS = histogram(
+    "sales_prompt_build_seconds",
+    "Time to assemble and encode a gateway request by model route",
+    ["route"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05)
+)
+PROMPT_BYTES = histogram(
+    "sales_prompt_bytes",
+    "Encoded gateway request size by model route",
+    ["route"],
+    buckets=(1024, 4096, 8192, 16384, 32768, 65536, 131072, 262144, 524288, 1048576)
+)
+
+# Retrieval (RAG)
+RAG_STAGE_SECONDS = histogram(
+    "sales_rag_stage_seconds",
+    "Retrieval time by stage (intent, embed, search, wait); wait is time the prompt was held up",
+    ["stage"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+RAG_REQUESTS = counter(
+    "sales_rag_requests_total",
+    "Chat turns by retrieval outcome (used, empty, skipped, late, failed)",
+    ["outcome"]
+)
+
+# Embeddings
+EMBEDDING_REQUESTS = counter(
+    "sales_embedding_requests_total",
+    "Embedded texts by where the vector came from (lru, redis, provider)",
+    ["source"]
+)
+EMBEDDING_BATCH_SIZE = histogram(
+    "sales_embedding_batch_size",
+    "Texts sent to the embedding provider per call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+EMBEDDING_PROVIDER_SECONDS = histogram(
+    "sales_embedding_provider_seconds",
+    "Embedding provider call duration by provider (gateway, local, hashing)",
+    ["provider"]
+)
+
+# Logging
+LOG_RECORDS_DROPPED = counter(
+    "sales_log_records_dropped_total",
+    "Log records dropped because the writer thread's queue was full (LOG_QUEUE_SIZE)"
+)
+
+# Dependency readiness probes
+DEPENDENCY_UP = gauge(
+    "sales_dependency_up",
+    "Whether the last readiness probe of a dependency succeeded (1) or not (0)",
+    ["dependency"]
+)
+DEPENDENCY_PROBE_SECONDS = histogram(
+    "sales_dependency_probe_seconds",
+    "Readiness probe duration by dependency",
+    ["dependency"]
+)
+
+
+class RequestSpans:
+    """
+    Stage timings for a single stream request.
+
+    `span(stage)` times a block and also records it in
+    STREAM_STAGE_SECONDS; `add(stage, seconds)` only accumulates locally
+    (for totals such as send or pacing time that have their own metrics)
+    and `mark(stage)` records the offset from the request start once.
+    `summary()` formats everything for one log line per request.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.add(stage, duration)
+            STREAM_STAGE_SECONDS.labels(stage).observe(duration)
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def mark(self, stage: str) -> bool:
+        """Record the time since the request started, once; True if newly set"""
+        if stage in self.stages:
+            return False
+        self.stages[stage] = self.elapsed()
+        return True
+
+    def elapsed(self) -> float:
+        """Seconds since the request started"""
+        return time.perf_counter() - self.start
+
+    def summary(self) -> str:
+        return " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.stages.items())
+
+    __str__ = summary
@@ -2,7 +2,8 @@
 Database models for Sales API
 """
 
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Float, Boolean, JSON, Index, cast, false
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime
@@ -40,5 +41,74 @@ class Conversation(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Change counter - set to 1 on insert and bumped by every upsert in
+    # conversation_store and conversation_transfer. Writes are single
+    # statements, so it is not checked on write (no optimistic locking)
+    version = Column(Integer, nullable=False, server_default="0")
+    
     def __repr__(self):
         return f"<Conversation {self.session_id} - {self.email}>"
+
+
+# Dashboard indexes: filters on stage/tier/industry combined with created_at
+# ranges, open leads (partial, only rows with converted = false), and
+# containment searches on pain points (GIN over the column cast to jsonb, so
+# queries must filter on CAST(pain_points AS JSONB) to use it)
+Index("ix_conversations_created_at", Conversation.created_at)
+# Rollup refreshes look up days with recently updated conversations
+Index("ix_conversations_updated_at", Conversation.updated_at)
+Index("ix_conversations_stage_created", Conversation.current_stage, Conversation.created_at)
+Index("ix_conversations_tier_created", Conversation.quality_tier, Conversation.created_at)
+Index("ix_conversations_industry_created", Conversation.industry, Conversation.created_at)
+Index(
+    "ix_conversations_unconverted_created",
+    Conversation.created_at,
+    postgresql_where=Conversation.converted == false()
+)
+Index(
+    "ix_conversations_pain_points",
+    cast(Conversation.pain_points, JSONB),
+    postgresql_using="gin"
+)
+
+
+class ConversationDailyStats(Base):
+    """Daily conversation rollups per stage, tier and industry (see analytics.py)"""
+    __tablename__ = "conversation_daily_stats"
+    
+    # Missing stage/tier/industry are grouped as "unknown" so they can be key columns
+    day = Column(Date, primary_key=True)
+    current_stage = Column(String(50), primary_key=True)
+    quality_tier = Column(String(20), primary_key=True)
+    industry = Column(String(255), primary_key=True)
+    
+    conversations = Column(Integer, nullable=False, default=0)
+    converted = Column(Integer, nullable=False, default=0)
+    messages = Column(Integer, nullable=False, default=0)
+    # Sum rather than average so rollups can be re-aggregated across days
+    qualification_score_sum = Column(Float, nullable=False, default=0.0)
+    refreshed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ConversationDailyStats {self.day} {self.current_stage}/{self.quality_tier}/{self.industry}>"
+
+
+class RollupRefresh(Base):
+    """When a rollup refresh last started; updates after it are picked up next time"""
+    __tablename__ = "rollup_refreshes"
+    
+    name = Column(String(50), primary_key=True)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    
+    def __repr__(self):
+        return f"<RollupRefresh {self.name} {self.started_at}>"
+
+
+class RollupDirtyDay(Base):
+    """Days whose rollups are stale because of writes that keep updated_at (imports)"""
+    __tablename__ = "rollup_dirty_days"
+    
+    day = Column(Date, primary_key=True)
+    
+    def __repr__(self):
+        return f"<RollupDirtyDay {self.day}>"
@@ -3,8 +3,6 @@ Qdrant Client - Vector database for semantic search
 """
 
 import httpx
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
 import os
 import logging
 from typing import List, Dict, Optional
@@ -17,40 +15,52 @@ logger = logging.getLogger(__name__)
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 
-# Initialize client - use HTTP client instead of native Qdrant client for Railway
+# HTTP client instead of the native Qdrant client for Railway; created on
+# first use so importing this module opens nothing
 http_client = None
 
-if QDRANT_URL:
-    try:
-        logger.info(f"Initializing Qdrant HTTP client with URL: {QDRANT_URL}")
-        logger.info(f"Qdrant API Key present: {bool(QDRANT_API_KEY)}")
-        
-        # Use httpx for direct HTTP communication - more reliable on Railway
-        headers = {}
-        if QDRANT_API_KEY:
-            headers["api-key"] = QDRANT_API_KEY
-        
-        http_client = httpx.AsyncClient(
-            base_url=QDRANT_URL,
-            headers=headers,
-            timeout=30.0,
-            follow_redirects=True  # Follow HTTP -> HTTPS redirects
-        )
-        
-        logger.info("Qdrant HTTP client initialized successfully")
-            
-    except Exception as e:
-        logger.error(f"Failed to initialize Qdrant client: {type(e).__name__}: {e}")
-        http_client = None
-else:
+if not QDRANT_URL:
     logger.info("QDRANT_URL not set - semantic search unavailable")
 
 
+def get_http_client() -> Optional[httpx.AsyncClient]:
+    """The Qdrant HTTP client, created on first call; None without QDRANT_URL"""
+    global http_client
+    if http_client is None and QDRANT_URL:
+        try:
+            logger.info(f"Initializing Qdrant HTTP client with URL: {QDRANT_URL}")
+            logger.info(f"Qdrant API Key present: {bool(QDRANT_API_KEY)}")
+
+            headers = {}
+            if QDRANT_API_KEY:
+                headers["api-key"] = QDRANT_API_KEY
+
+            http_client = httpx.AsyncClient(
+                base_url=QDRANT_URL,
+                headers=headers,
+                timeout=30.0,
+                follow_redirects=True  # Follow HTTP -> HTTPS redirects
+            )
+        except Exception as e:
+            logger.error(f"Failed to initialize Qdrant client: {type(e).__name__}: {e}")
+            http_client = None
+    return http_client
+
+
+async def close_qdrant():
+    """Close the Qdrant HTTP client if it was created"""
+    global http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+
+
 COLLECTION_NAME = "sales_knowledge"
 
 
 async def ensure_collection():
     """Ensure Qdrant collection exists using HTTP API"""
+    http_client = get_http_client()
     if not http_client:
         logger.warning("Qdrant HTTP client not initialized - skipping collection setup")
         return False
@@ -95,6 +105,7 @@ async def search_knowledge(query_vector: List[float], limit: int = 5) -> List[Di
     Returns:
         List of matching documents
     """
+    http_client = get_http_client()
     if not http_client:
         logger.warning("Qdrant not available for search")
         return []
@@ -138,6 +149,7 @@ async def store_knowledge(content: str, metadata: Dict, embedding: List[float])
     Returns:
         Success status
     """
+    http_client = get_http_client()
     if not http_client:
         return False
     
@@ -174,6 +186,7 @@ async def store_knowledge(content: str, metadata: Dict, embedding: List[float])
 
 def get_qdrant_stats() -> Optional[Dict]:
     """Get Qdrant collection stats using HTTP API"""
+    http_client = get_http_client()
     if not http_client:
         return None
     
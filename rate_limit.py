@@ -0,0 +1,393 @@
+"""
+Rate Limiting - Token buckets shared by all workers and replicas through Redis
+
+Every LLM-backed request spends one token from each bucket that applies to
+it: its session, its client IP and its API key. Buckets live in Redis and
+are checked and debited together by one Lua script, so a limit holds across
+uvicorn workers, replicas and reconnects, and a request that is rejected by
+one bucket spends nothing from the others.
+
+Fast path: once a key is hot - it needs Redis again within
+RATE_LIMIT_LEASE_SECONDS of its last grant - a Redis check that passes also
+leases up to RATE_LIMIT_LEASE of each bucket's capacity to this process,
+which spends it without a round trip until it runs out or the lease
+expires. Tokens left in an expired lease are handed back to the bucket by
+the key's next Redis check, so clients slower than one request per lease
+only ever take what they spend. A bucket can admit fewer requests than its
+limit while other processes hold leases on it, never more.
+RATE_LIMIT_LEASE=0 checks Redis on every request.
+
+Without Redis, or when a call fails, each process enforces the same limits
+with its own in-memory buckets.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from metrics import RATE_LIMIT_DECISIONS, RATE_LIMIT_REJECTIONS
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@dataclass(frozen=True)
+class Limit:
+    """Up to `capacity` requests, refilled evenly over `period` seconds"""
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_limit(spec: str) -> Optional[Limit]:
+    """Parse "100/h", "30/m" or "100/3600"; empty, "0" and "off" mean no limit"""
+    spec = (spec or "").strip().lower()
+    if spec in ("", "0", "off"):
+        return None
+    count, sep, period = spec.partition("/")
+    if not sep:
+        raise ValueError(f"Rate limit must look like '<count>/<period>': {spec!r}")
+    seconds = _PERIODS[period] if period in _PERIODS else float(period)
+    if int(count) <= 0 or seconds <= 0:
+        raise ValueError(f"Rate limit count and period must be positive: {spec!r}")
+    return Limit(int(count), seconds)
+
+
+def _limit_setting(name: str, default: str) -> Optional[Limit]:
+    try:
+        return parse_limit(os.getenv(name, default))
+    except ValueError as e:
+        logger.warning(f"Invalid {name}: {e}. Using '{default}'")
+        return parse_limit(default)
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# Requests per session, client IP and API key: "<count>/<period>", period in
+# s, m, h, d or seconds; "off" disables that limit
+RATE_LIMIT_SESSION = _limit_setting("RATE_LIMIT_SESSION", "100/h")
+RATE_LIMIT_IP = _limit_setting("RATE_LIMIT_IP", "120/m")
+RATE_LIMIT_API_KEY = _limit_setting("RATE_LIMIT_API_KEY", "600/m")
+
+# Fraction of a bucket's capacity leased per Redis round trip (0 = no lease)
+RATE_LIMIT_LEASE = float(os.getenv("RATE_LIMIT_LEASE", "0.05"))
+
+# Seconds a lease lasts; unspent tokens go back to the bucket afterwards
+RATE_LIMIT_LEASE_SECONDS = float(os.getenv("RATE_LIMIT_LEASE_SECONDS", "1"))
+
+# Leases and fallback buckets kept per process before idle ones are dropped
+RATE_LIMIT_LOCAL_KEYS = int(os.getenv("RATE_LIMIT_LOCAL_KEYS", "10000"))
+
+RATE_LIMIT_PREFIX = os.getenv("RATE_LIMIT_PREFIX", "ratelimit")
+
+# Longest a WebSocket session may last; its start time is kept in Redis, so
+# reconnecting with the same session id does not restart the clock
+SESSION_MAX_SECONDS = int(os.getenv("SESSION_MAX_SECONDS", "3600"))
+
+# KEYS: one bucket per limit. ARGV: now_ms, cost, then capacity, period_ms,
+# wanted tokens and unspent tokens from an expired lease for each key.
+# Returns {retry_after_ms, limiting key index, granted tokens per key};
+# nothing is debited unless every bucket has `cost`, but unspent tokens are
+# always handed back.
+TOKEN_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local tokens = {}
+local retry, limiting = 0, 0
+for i = 1, #KEYS do
+    local base = 4 * i - 1
+    local capacity = tonumber(ARGV[base])
+    local period = tonumber(ARGV[base + 1])
+    local state = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local available = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    if now > ts then
+        available = available + (now - ts) * capacity / period
+    end
+    available = math.min(capacity, available + tonumber(ARGV[base + 3]))
+    tokens[i] = available
+    if available < cost then
+        local wait = math.ceil((cost - available) * period / capacity)
+        if wait > retry then
+            retry, limiting = wait, i - 1
+        end
+    end
+end
+local result = {retry, limiting}
+for i = 1, #KEYS do
+    local base = 4 * i - 1
+    local grant = 0
+    if retry == 0 then
+        local want = tonumber(ARGV[base + 2])
+        grant = math.max(cost, math.min(want, math.floor(tokens[i])))
+    end
+    if grant > 0 or tonumber(ARGV[base + 3]) ~= 0 then
+        redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i] - grant), 'ts', tostring(now))
+        redis.call('PEXPIRE', KEYS[i], ARGV[base + 1])
+    end
+    result[i + 2] = grant
+end
+return result
+"""
+
+
+@dataclass(frozen=True)
+class Decision:
+    """Outcome of a rate limit check"""
+    allowed: bool
+    scope: Optional[str] = None
+    retry_after: float = 0.0
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+ALLOWED = Decision(True)
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires")
+
+    def __init__(self, tokens: float, expires: float):
+        self.tokens = tokens
+        self.expires = expires
+
+
+class _Bucket:
+    """In-memory token bucket used when Redis is unavailable"""
+    __slots__ = ("tokens", "updated", "period")
+
+    def __init__(self, limit: Limit, now: float):
+        self.tokens = float(limit.capacity)
+        self.updated = now
+        self.period = limit.period
+
+    def refill(self, limit: Limit, now: float) -> float:
+        self.tokens = min(limit.capacity, self.tokens + (now - self.updated) * limit.rate)
+        self.updated = now
+        return self.tokens
+
+
+def client_identity(connection) -> Dict[str, Optional[str]]:
+    """Client IP and API key (X-API-Key or a bearer token) of a Request or WebSocket"""
+    headers = connection.headers
+    api_key = headers.get("x-api-key")
+    authorization = headers.get("authorization", "")
+    if not api_key and authorization[:7].lower() == "bearer ":
+        api_key = authorization[7:].strip()
+    return {
+        "ip": connection.client.host if connection.client else None,
+        "api_key": api_key or None,
+    }
+
+
+class RateLimiter:
+    """Per-session, per-IP and per-API-key token buckets"""
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Optional[Limit]]] = None,
+        client=None,
+        lease: float = RATE_LIMIT_LEASE,
+        lease_seconds: float = RATE_LIMIT_LEASE_SECONDS,
+        enabled: bool = RATE_LIMIT_ENABLED,
+        prefix: str = RATE_LIMIT_PREFIX,
+        max_local_keys: int = RATE_LIMIT_LOCAL_KEYS,
+    ):
+        if limits is None:
+            limits = {"session": RATE_LIMIT_SESSION, "ip": RATE_LIMIT_IP, "api_key": RATE_LIMIT_API_KEY}
+        self.limits = {scope: limit for scope, limit in limits.items() if limit}
+        self.lease = lease
+        self.lease_seconds = lease_seconds
+        self.enabled = enabled
+        self.prefix = prefix
+        self.max_local_keys = max_local_keys
+        self._client = client
+        self._script = None
+        self._script_client = None
+        self._leases: Dict[str, _Lease] = {}
+        self._buckets: Dict[str, _Bucket] = {}
+
+    def _redis(self):
+        return self._client if self._client is not None else get_redis()
+
+    def _key(self, scope: str, identity: str) -> str:
+        if scope == "api_key":
+            # Keys are secrets; keep only a digest in Redis
+            identity = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+        return f"{self.prefix}:{scope}:{identity}"
+
+    def _lease_size(self, limit: Limit, cost: int) -> int:
+        return max(cost, int(limit.capacity * self.lease))
+
+    async def check(self, cost: int = 1, **identities: Optional[str]) -> Decision:
+        """
+        Spend `cost` tokens from the bucket of every given identity, e.g.
+        check(session="abc", ip="1.2.3.4", api_key=None). Identities that are
+        None, and scopes without a limit, are not checked.
+        """
+        if not self.enabled:
+            return ALLOWED
+        buckets = [
+            (scope, self._key(scope, identity), self.limits[scope])
+            for scope, identity in identities.items()
+            if identity and scope in self.limits
+        ]
+        if not buckets:
+            return ALLOWED
+
+        now = time.monotonic()
+        short = [bucket for bucket in buckets if not self._lease_covers(bucket[1], cost, now)]
+        if not short:
+            for _, key, _ in buckets:
+                self._leases[key].tokens -= cost
+            RATE_LIMIT_DECISIONS.labels("allowed", "lease").inc()
+            return ALLOWED
+
+        client = self._redis()
+        if client is not None:
+            requests = [self._lease_request(key, limit, cost, now) for _, key, limit in short]
+            try:
+                retry_ms, limiting, grants = await asyncio.to_thread(self._take_remote, client, short, requests, cost)
+            except Exception as e:
+                logger.warning("Rate limit check against Redis failed, using local buckets: %s", e)
+            else:
+                if retry_ms:
+                    return self._reject(short[limiting][0], retry_ms / 1000, "redis")
+                now = time.monotonic()
+                for (_, key, _), grant in zip(short, grants):
+                    self._add_lease(key, grant - cost, now)
+                leased = {key for _, key, _ in short}
+                for _, key, _ in buckets:
+                    lease = self._leases.get(key)
+                    if key not in leased and lease is not None:
+                        # May dip below zero if spent meanwhile; the next grant repays it
+                        lease.tokens -= cost
+                RATE_LIMIT_DECISIONS.labels("allowed", "redis").inc()
+                return ALLOWED
+
+        return self._take_local(buckets, cost, now)
+
+    def _lease_request(self, key: str, limit: Limit, cost: int, now: float) -> Tuple[int, float]:
+        """Tokens to ask Redis for, and unspent tokens of an expired lease to return"""
+        lease = self._leases.get(key)
+        if lease is None:
+            return cost, 0
+        if lease.expires <= now:
+            # Cold again: take only what this request needs. The lease goes
+            # now, before any await, so concurrent checks can't return its
+            # tokens a second time; a new one only comes from Redis' grant.
+            del self._leases[key]
+            return cost, lease.tokens
+        return self._lease_size(limit, cost), 0
+
+    def _lease_covers(self, key: str, cost: int, now: float) -> bool:
+        lease = self._leases.get(key)
+        return lease is not None and lease.expires > now and lease.tokens >= cost
+
+    def _add_lease(self, key: str, tokens: int, now: float):
+        lease = self._leases.get(key)
+        if lease is None or lease.expires <= now:
+            if len(self._leases) >= self.max_local_keys:
+                self._prune(self._leases, lambda lease: lease.expires <= now)
+            self._leases[key] = _Lease(tokens, now + self.lease_seconds)
+        else:
+            lease.tokens += tokens
+            lease.expires = now + self.lease_seconds
+
+    def _take_remote(self, client, buckets: List[Tuple[str, str, Limit]], requests: List[Tuple[int, float]],
+                     cost: int):
+        if self._script is None or self._script_client is not client:
+            self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+            self._script_client = client
+        args = [int(time.time() * 1000), cost]
+        for (_, _, limit), (want, unspent) in zip(buckets, requests):
+            args += [limit.capacity, int(limit.period * 1000), want, unspent]
+        result = self._script(keys=[key for _, key, _ in buckets], args=args)
+        return int(result[0]), int(result[1]), [int(grant) for grant in result[2:]]
+
+    def _take_local(self, buckets: List[Tuple[str, str, Limit]], cost: int, now: float) -> Decision:
+        retry, limiting = 0.0, None
+        for scope, key, limit in buckets:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_local_keys:
+                    self._prune(self._buckets, lambda b: b.updated + b.period <= now)
+                bucket = self._buckets[key] = _Bucket(limit, now)
+            available = bucket.refill(limit, now)
+            if available < cost and (cost - available) / limit.rate > retry:
+                retry, limiting = (cost - available) / limit.rate, scope
+        if limiting is not None:
+            return self._reject(limiting, retry, "local")
+        for _, key, _ in buckets:
+            self._buckets[key].tokens -= cost
+        RATE_LIMIT_DECISIONS.labels("allowed", "local").inc()
+        return ALLOWED
+
+    def _reject(self, scope: str, retry_after: float, source: str) -> Decision:
+        RATE_LIMIT_DECISIONS.labels("limited", source).inc()
+        RATE_LIMIT_REJECTIONS.labels(scope).inc()
+        return Decision(False, scope, retry_after)
+
+    @staticmethod
+    def _prune(entries: dict, idle):
+        """Drop idle entries; if none are idle, drop the oldest half"""
+        stale = [key for key, entry in entries.items() if idle(entry)]
+        if not stale:
+            stale = list(itertools.islice(entries, len(entries) // 2 or 1))
+        for key in stale:
+            del entries[key]
+
+    async def session_started(self, session_id: str) -> float:
+        """Epoch seconds when this session first connected, shared across reconnects"""
+        now = time.time()
+        client = self._redis()
+        if not self.enabled or client is None:
+            return now
+        key = self._key("session_start", session_id)
+
+        def claim():
+            pipe = client.pipeline()
+            pipe.set(key, repr(now), nx=True, ex=SESSION_MAX_SECONDS)
+            pipe.get(key)
+            return pipe.execute()[1]
+
+        try:
+            started = await asyncio.to_thread(claim)
+            return float(started) if started else now
+        except Exception as e:
+            logger.warning("Could not read session start for %s: %s", session_id, e)
+            return now
+
+    def describe(self) -> Dict[str, dict]:
+        """Configured limits, for clients and /health"""
+        return {
+            scope: {"requests": limit.capacity, "period_seconds": limit.period}
+            for scope, limit in self.limits.items()
+        }
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "backend": "redis" if self._redis() is not None else "local",
+            "limits": self.describe(),
+            "leases": len(self._leases),
+            "local_buckets": len(self._buckets),
+        }
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,221 @@
+"""
+Readiness - Background dependency probes behind GET /ready
+
+Each dependency (database, Redis, Qdrant, LLM gateway, MCP server) is
+probed by its own background loop every READY_PROBE_INTERVAL seconds,
+bounded by READY_PROBE_TIMEOUT. /ready only reads the cached results, so a
+load balancer polling it costs nothing and never triggers a probe.
+
+To keep probes from adding to the load on a dependency that is already
+struggling:
+- one probe per dependency is in flight at a time (one loop each), and a
+  slow dependency does not delay probes of the others
+- after a failure the interval doubles per consecutive failure, up to
+  READY_PROBE_MAX_INTERVAL
+- intervals are jittered so workers and replicas don't probe in lockstep
+
+The replica is ready while every READY_REQUIRED dependency is up; the
+others are reported but only degrade features (cache, search, tools).
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+import httpx
+from sqlalchemy import text
+
+import database
+import redis_client
+from llm_client import LLM_GATEWAY_URL
+from mcp_client import MCP_SERVER_URL
+from metrics import DEPENDENCY_PROBE_SECONDS, DEPENDENCY_UP
+from qdrant_service import get_http_client as get_qdrant_client
+
+logger = logging.getLogger(__name__)
+
+# Seconds between probes of a healthy dependency
+READY_PROBE_INTERVAL = float(os.getenv("READY_PROBE_INTERVAL", "10"))
+
+# Seconds a single probe may take before the dependency counts as down
+READY_PROBE_TIMEOUT = float(os.getenv("READY_PROBE_TIMEOUT", "2"))
+
+# Longest interval after repeated failures
+READY_PROBE_MAX_INTERVAL = float(os.getenv("READY_PROBE_MAX_INTERVAL", "60"))
+
+# Dependencies that must be up for /ready to return 200
+READY_REQUIRED = [
+    name.strip() for name in os.getenv("READY_REQUIRED", "database,gateway").split(",") if name.strip()
+]
+
+# Path probed on the LLM gateway and MCP server; any non-5xx answer counts as up
+READY_HTTP_PROBE_PATH = os.getenv("READY_HTTP_PROBE_PATH", "/health")
+
+
+async def check_database(http: httpx.AsyncClient) -> Optional[bool]:
+    if database.engine is None:
+        return None
+    async with database.engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return True
+
+
+async def check_redis(http: httpx.AsyncClient) -> Optional[bool]:
+    client = redis_client.get_redis()
+    if client is None:
+        # Not reachable at startup; connecting here lets the cache recover
+        if not await asyncio.to_thread(redis_client.init_redis):
+            raise ConnectionError(f"cannot connect to {redis_client.REDIS_URL}")
+        return True
+    await asyncio.to_thread(client.ping)
+    return True
+
+
+async def check_qdrant(http: httpx.AsyncClient) -> Optional[bool]:
+    client = get_qdrant_client()
+    if client is None:
+        return None
+    response = await client.get("/readyz")
+    response.raise_for_status()
+    return True
+
+
+async def _check_http(http: httpx.AsyncClient, base_url: Optional[str]) -> Optional[bool]:
+    if not base_url:
+        return None
+    response = await http.get(f"{base_url.rstrip('/')}{READY_HTTP_PROBE_PATH}")
+    if response.status_code >= 500:
+        raise ConnectionError(f"HTTP {response.status_code}")
+    return True
+
+
+async def check_gateway(http: httpx.AsyncClient) -> Optional[bool]:
+    return await _check_http(http, LLM_GATEWAY_URL)
+
+
+async def check_mcp(http: httpx.AsyncClient) -> Optional[bool]:
+    return await _check_http(http, MCP_SERVER_URL)
+
+
+DEFAULT_CHECKS = {
+    "database": check_database,
+    "redis": check_redis,
+    "qdrant": check_qdrant,
+    "gateway": check_gateway,
+    "mcp": check_mcp,
+}
+
+
+class DependencyProber:
+    """
+    Probe dependencies in the background and cache the results.
+
+    A check is a coroutine function taking the prober's HTTP client. It
+    returns True when the dependency is up, None when it is not configured,
+    and raises (or returns False) when it is down.
+    """
+
+    def __init__(
+        self,
+        checks: Optional[Dict[str, Callable[[httpx.AsyncClient], Awaitable[Optional[bool]]]]] = None,
+        interval: float = READY_PROBE_INTERVAL,
+        timeout: float = READY_PROBE_TIMEOUT,
+        max_interval: float = READY_PROBE_MAX_INTERVAL,
+        required: Iterable[str] = READY_REQUIRED,
+        http: Optional[httpx.AsyncClient] = None,
+    ):
+        self.checks = dict(DEFAULT_CHECKS if checks is None else checks)
+        self.interval = interval
+        self.timeout = timeout
+        self.max_interval = max(interval, max_interval)
+        self.required = [name for name in required if name in self.checks]
+        self.results: Dict[str, dict] = {name: {"status": "unknown"} for name in self.checks}
+        self._http = http
+        self._owns_http = http is None
+        self._tasks = []
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        return self._http
+
+    def start(self):
+        """Start one probe loop per dependency on the running event loop"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run(name)) for name in self.checks]
+
+    async def stop(self):
+        """Stop probing and close the probe HTTP client"""
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._owns_http and self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _run(self, name: str):
+        while True:
+            result = await self.probe(name)
+            await asyncio.sleep(self.next_delay(result))
+
+    def next_delay(self, result: dict) -> float:
+        """Seconds until the next probe, backing off while a dependency is down"""
+        if result["status"] == "down":
+            delay = self.interval * 2 ** min(result["failures"], 10)
+        elif result["status"] == "unconfigured":
+            delay = self.max_interval
+        else:
+            delay = self.interval
+        return min(delay, self.max_interval) * random.uniform(0.8, 1.2)
+
+    async def probe(self, name: str) -> dict:
+        """Probe one dependency now and cache the result"""
+        start = time.perf_counter()
+        error = None
+        try:
+            ok = await asyncio.wait_for(self.checks[name](self._client()), self.timeout)
+            status = "unconfigured" if ok is None else "up" if ok else "down"
+        except asyncio.TimeoutError:
+            status, error = "down", f"no answer within {self.timeout:g}s"
+        except Exception as e:
+            status, error = "down", f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - start
+
+        previous = self.results.get(name, {})
+        result = {
+            "status": status,
+            "latency_ms": round(elapsed * 1000, 1),
+            "checked_at": round(time.time(), 3),
+            "failures": previous.get("failures", 0) + 1 if status == "down" else 0,
+        }
+        if error:
+            result["error"] = error
+        self.results[name] = result
+
+        if status != "unconfigured":
+            DEPENDENCY_UP.labels(name).set(1 if status == "up" else 0)
+            DEPENDENCY_PROBE_SECONDS.labels(name).observe(elapsed)
+        if status != previous.get("status"):
+            if status == "down":
+                logger.warning("Dependency %s is down: %s", name, error or "check failed")
+            elif previous.get("status") == "down":
+                logger.info("Dependency %s recovered (%.0fms)", name, elapsed * 1000)
+        return result
+
+    @property
+    def ready(self) -> bool:
+        return all(self.results[name]["status"] == "up" for name in self.required)
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "required": list(self.required),
+            "dependencies": {name: dict(result) for name, result in self.results.items()},
+        }
+
+
+prober = DependencyProber()
@@ -4,34 +4,46 @@ Redis connection for Sales API - Session caching
 
 import redis
 import os
-import json
 import logging
 
+from cache_codec import CacheDecodeError, decode, encode
+
 logger = logging.getLogger(__name__)
 
 # Redis connection from environment
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
 
-# Parse Redis URL for public connection
+# Created by init_redis() during startup warm-up; values are bytes (see cache_codec)
 redis_client = None
 
-try:
-    redis_client = redis.from_url(
-        REDIS_URL,
-        decode_responses=True,
-        socket_connect_timeout=5,
-        socket_timeout=5
-    )
-    # Test connection
-    redis_client.ping()
-    logger.info(f"Redis connected successfully")
-except Exception as e:
-    logger.warning(f"Redis connection failed: {e}. Running without cache.")
-    redis_client = None
+
+def init_redis() -> bool:
+    """
+    Connect to Redis and check it with a PING. Blocking; the app calls it
+    off the event loop during warm-up. Leaves the client unset (no cache)
+    if Redis is unreachable.
+    """
+    global redis_client
+    if redis_client is not None:
+        return True
+    try:
+        client = redis.from_url(
+            REDIS_URL,
+            decode_responses=False,
+            socket_connect_timeout=5,
+            socket_timeout=5
+        )
+        client.ping()
+        redis_client = client
+        logger.info("Redis connected successfully")
+        return True
+    except Exception as e:
+        logger.warning(f"Redis connection failed: {e}. Running without cache.")
+        return False
 
 
 def get_redis():
-    """Get Redis client"""
+    """Get Redis client, None until init_redis() connected"""
     return redis_client
 
 
@@ -42,8 +54,8 @@ def cache_conversation(session_id: str, data: dict, ttl: int = 3600):
     
     try:
         key = f"conversation:{session_id}"
-        redis_client.setex(key, ttl, json.dumps(data))
-        logger.info(f"Cached conversation {session_id}")
+        redis_client.setex(key, ttl, encode(data))
+        logger.debug("Cached conversation %s", session_id)
         return True
     except Exception as e:
         logger.error(f"Failed to cache conversation: {e}")
@@ -59,9 +71,13 @@ def get_cached_conversation(session_id: str):
         key = f"conversation:{session_id}"
         data = redis_client.get(key)
         if data:
-            logger.info(f"Cache hit for {session_id}")
-            return json.loads(data)
-        logger.info(f"Cache miss for {session_id}")
+            logger.debug("Cache hit for %s", session_id)
+            return decode(data)
+        logger.debug("Cache miss for %s", session_id)
+        return None
+    except CacheDecodeError as e:
+        logger.warning("Dropping undecodable cache entry for %s: %s", session_id, e)
+        invalidate_cache(session_id)
         return None
     except Exception as e:
         logger.error(f"Failed to get cached conversation: {e}")
@@ -76,7 +92,7 @@ def invalidate_cache(session_id: str):
     try:
         key = f"conversation:{session_id}"
         redis_client.delete(key)
-        logger.info(f"Invalidated cache for {session_id}")
+        logger.debug("Invalidated cache for %s", session_id)
         return True
     except Exception as e:
         logger.error(f"Failed to invalidate cache: {e}")
@@ -85,6 +101,8 @@ def invalidate_cache(session_id: str):
 
 def close_redis():
     """Close Redis connection"""
+    global redis_client
     if redis_client:
         redis_client.close()
+        redis_client = None
         logger.info("Redis connection closed")
@@ -0,0 +1,181 @@
+"""
+Retrieval - Sales knowledge from Qdrant for chat prompts
+
+    retrieval = start_retrieval(message)       # before loading history
+    ...                                        # load history, build context
+    knowledge = await retrieval.knowledge()    # ready by now, usually
+
+start_retrieval() runs a cheap intent check and, when the message is worth
+it, embeds it (see embeddings.py) and searches the sales_knowledge
+collection in a background task. The caller keeps loading history in the
+meantime, so retrieval costs nothing when it finishes first. If it is
+still running when the prompt is ready, the caller waits at most
+RAG_WAIT_SECONDS and then answers without it.
+
+The top RAG_TOP_K snippets scoring at least RAG_MIN_SCORE are packed into
+RAG_TOKEN_BUDGET tokens. Stage timings (intent, embed, search, wait) are
+recorded in sales_rag_stage_seconds and on the result.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from embeddings import embedding_service
+from metrics import RAG_REQUESTS, RAG_STAGE_SECONDS
+from qdrant_service import QDRANT_URL, search_knowledge
+
+logger = logging.getLogger(__name__)
+
+# Retrieval for chat turns (needs QDRANT_URL)
+RAG_ENABLED = os.getenv("RAG_ENABLED", "true").lower() == "true"
+
+# Snippets considered, minimum similarity, and tokens they may add to a prompt
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.3"))
+RAG_TOKEN_BUDGET = int(os.getenv("RAG_TOKEN_BUDGET", "600"))
+
+# Longest the prompt waits for retrieval once everything else is ready
+RAG_WAIT_SECONDS = float(os.getenv("RAG_WAIT_SECONDS", "0.3"))
+
+# Messages that never need the knowledge base: greetings, thanks, yes/no
+_SMALL_TALK = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks|thank you|thx|ok|okay|sure|yes|no|yep|nope|cool|great|bye|goodbye)"
+    r"[\s!.,?]*(there|so much|a lot)?[\s!.,?]*$",
+    re.IGNORECASE,
+)
+_MIN_WORDS = 3
+
+
+def needs_retrieval(message: str) -> bool:
+    """
+    Cheap intent check: False for system messages, small talk and very
+    short messages, where search results would only add prompt tokens.
+    """
+    text = message.strip()
+    if not text or text.startswith("__"):
+        return False
+    if _SMALL_TALK.match(text):
+        return False
+    return "?" in text or len(text.split()) >= _MIN_WORDS
+
+
+@dataclass
+class RetrievalResult:
+    """Snippets found for a message and how long each stage took"""
+    snippets: List[Dict] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+    outcome: str = "skipped"
+
+    def knowledge(self) -> Optional[str]:
+        """Snippets as prompt text, or None when there are none"""
+        if not self.snippets:
+            return None
+        return "Relevant sales knowledge (use when it helps answer):\n\n" + "\n\n".join(
+            f"- {snippet['content']}" for snippet in self.snippets
+        )
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def select_snippets(
+    results: List[Dict], top_k: int = RAG_TOP_K, min_score: float = RAG_MIN_SCORE,
+    token_budget: int = RAG_TOKEN_BUDGET
+) -> List[Dict]:
+    """Best-scoring distinct snippets that fit the token budget"""
+    selected, seen, used = [], set(), 0
+    for result in sorted(results, key=lambda r: r.get("score") or 0, reverse=True):
+        content = (result.get("content") or "").strip()
+        if not content or content in seen or (result.get("score") or 0) < min_score:
+            continue
+        tokens = _estimate_tokens(content)
+        if used + tokens > token_budget:
+            continue
+        selected.append(dict(result, content=content))
+        seen.add(content)
+        used += tokens
+        if len(selected) >= top_k:
+            break
+    return selected
+
+
+def _observe(timings: Dict[str, float], stage: str, start: float) -> float:
+    seconds = time.perf_counter() - start
+    RAG_STAGE_SECONDS.labels(stage).observe(seconds)
+    timings[f"{stage}_ms"] = round(seconds * 1000, 2)
+    return time.perf_counter()
+
+
+async def retrieve(message: str, top_k: int = RAG_TOP_K) -> RetrievalResult:
+    """Embed the message, search Qdrant and select snippets"""
+    result = RetrievalResult()
+    start = time.perf_counter()
+    try:
+        vector = await embedding_service.embed(message)
+        start = _observe(result.timings, "embed", start)
+        # Fetch extra candidates: some fall under the score or token limits
+        results = await search_knowledge(vector, limit=top_k * 2)
+        _observe(result.timings, "search", start)
+    except Exception as e:
+        logger.warning("Retrieval failed: %s: %s", type(e).__name__, e)
+        result.outcome = "failed"
+        return result
+    result.snippets = select_snippets(results, top_k=top_k)
+    result.outcome = "used" if result.snippets else "empty"
+    return result
+
+
+class Retrieval:
+    """A retrieval running in the background, started by start_retrieval()"""
+
+    def __init__(self, task: Optional[asyncio.Task], timings: Dict[str, float]):
+        self._task = task
+        self._timings = timings
+
+    async def result(self, wait: float = RAG_WAIT_SECONDS) -> RetrievalResult:
+        """
+        The retrieval's result; waits at most `wait` seconds for one that is
+        still running, then cancels it and returns no snippets.
+        """
+        if self._task is None:
+            result = RetrievalResult(timings=dict(self._timings))
+        else:
+            start = time.perf_counter()
+            done, _ = await asyncio.wait({self._task}, timeout=wait)
+            if done:
+                result = self._task.result()
+            else:
+                self._task.cancel()
+                result = RetrievalResult(outcome="late")
+            result.timings = {**self._timings, **result.timings}
+            _observe(result.timings, "wait", start)
+        RAG_REQUESTS.labels(result.outcome).inc()
+        logger.debug("Retrieval %s: %d snippets, %s", result.outcome, len(result.snippets), result.timings)
+        return result
+
+    async def knowledge(self, wait: float = RAG_WAIT_SECONDS) -> Optional[str]:
+        """Shortcut for the prompt text of result()"""
+        return (await self.result(wait)).knowledge()
+
+    def cancel(self):
+        """Stop a retrieval whose result is no longer wanted; no-op once finished"""
+        if self._task is not None:
+            self._task.cancel()
+
+
+def start_retrieval(message: str, enabled: Optional[bool] = None) -> Retrieval:
+    """Start retrieval for a chat message in the background, if it is worth it"""
+    enabled = (RAG_ENABLED and bool(QDRANT_URL)) if enabled is None else enabled
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    wanted = enabled and needs_retrieval(message)
+    _observe(timings, "intent", start)
+    if not wanted:
+        return Retrieval(None, timings)
+    return Retrieval(asyncio.create_task(retrieve(message)), timings)
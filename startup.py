@@ -0,0 +1,116 @@
+"""
+Startup - Background warm-up of external dependencies
+
+Nothing connects at import time. The lifespan hands the connection steps
+(database schema, Redis, Qdrant collection) to `warmup`, which runs them
+concurrently in a background task, so Uvicorn binds and answers /live
+immediately while /ready reports 503 until warm-up finishes.
+
+Each step is bounded by STARTUP_STEP_TIMEOUT. A step that fails or times
+out leaves that dependency degraded, as before; it does not keep the app
+from becoming ready. Step timings are logged as one line and served from
+/ready and /health.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds one warm-up step may take before it is given up on
+STARTUP_STEP_TIMEOUT = float(os.getenv("STARTUP_STEP_TIMEOUT", "10"))
+
+
+class Warmup:
+    """Runs startup steps concurrently and records how each one went"""
+
+    def __init__(self, step_timeout: float = STARTUP_STEP_TIMEOUT):
+        self.step_timeout = step_timeout
+        self.steps: Dict[str, dict] = {}
+        self.total_ms: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.total_ms is not None
+
+    def start(
+        self,
+        steps: Dict[str, Callable[[], Awaitable]],
+        on_complete: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Start warm-up in the background.
+
+        Args:
+            steps: Name -> coroutine function; a result of False marks the step failed
+            on_complete: Called once all steps finished, e.g. to start consumers
+        """
+        if self._task is not None:
+            return
+        self.steps = {name: {"status": "pending"} for name in steps}
+        self.total_ms = None
+        self._task = asyncio.create_task(self._run(steps, on_complete))
+
+    async def _step(self, name: str, step: Callable[[], Awaitable]):
+        start = time.perf_counter()
+        result = {}
+        try:
+            ok = await asyncio.wait_for(step(), self.step_timeout)
+            result["status"] = "failed" if ok is False else "ok"
+        except asyncio.TimeoutError:
+            result["status"] = "timeout"
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.steps[name] = result
+
+    async def _run(self, steps, on_complete):
+        start = time.perf_counter()
+        await asyncio.gather(*(self._step(name, step) for name, step in steps.items()))
+
+        if on_complete is not None:
+            try:
+                on_complete()
+            except Exception as e:
+                logger.warning(f"Post-warm-up setup failed: {e}")
+
+        self.total_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(
+            "🚀 Warm-up done in %.0fms: %s", self.total_ms,
+            ", ".join(f"{name}={step['ms']:.0f}ms {step['status']}" for name, step in self.steps.items()) or "no steps"
+        )
+
+    async def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for warm-up to finish; whether it did within timeout"""
+        if self._task is None:
+            return self.ready
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.ready
+
+    async def stop(self):
+        """Cancel warm-up if it is still running (shutdown during startup)"""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "total_ms": self.total_ms,
+            "steps": {name: dict(step) for name, step in self.steps.items()},
+        }
+
+
+warmup = Warmup()
@@ -0,0 +1,221 @@
+"""
+Stream Buffer - Resumable WebSocket streams through Redis
+
+Every stream request's Tiptap nodes are written to a Redis stream keyed by
+session and request id before they are sent, so a client that reconnects -
+to this replica or any other - can ask for the rest with
+`?resume_from_index=N` instead of re-requesting (and re-paying for) the LLM
+call.
+
+Entry ids encode positions, so a resume is one XRANGE:
+- 0-1: request accepted (speed)
+- (i+1)-1: node i
+- (n+1)-1: complete (total nodes)
+
+The nodes and the complete marker are written in one transaction. A resume
+that arrives while another replica is still waiting on the LLM polls the
+stream for up to STREAM_RESUME_WAIT_SECONDS, sleeping on the event loop
+between short non-blocking reads so waiting resumes hold no threads.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional
+
+from cache_codec import decode, encode
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Seconds buffered streams stay resumable after their last write (0 disables)
+STREAM_BUFFER_TTL = int(os.getenv("STREAM_BUFFER_TTL", "600"))
+
+# How long a resume waits for a stream that is still being generated
+STREAM_RESUME_WAIT_SECONDS = float(os.getenv("STREAM_RESUME_WAIT_SECONDS", "30"))
+
+STREAM_BUFFER_PREFIX = os.getenv("STREAM_BUFFER_PREFIX", "stream_buffer")
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+
+_START_ID = "0-1"
+
+# Polling interval while a resume waits: doubles from the first to the last
+_POLL_FIRST_SECONDS = 0.05
+_POLL_MAX_SECONDS = 0.5
+
+
+def _node_id(index: int) -> str:
+    return f"{index + 1}-1"
+
+
+def new_request_id(requested: Optional[str] = None) -> str:
+    """The client's request id if it is usable as a key, else a new one"""
+    if requested and _REQUEST_ID.match(str(requested)):
+        return str(requested)
+    return uuid.uuid4().hex
+
+
+@dataclass
+class BufferedStream:
+    """Remaining nodes of a buffered stream, from `start_index` on"""
+    request_id: str
+    speed: str
+    start_index: int
+    total_nodes: int
+    nodes: List[dict]
+
+
+class StreamBuffer:
+    """Buffers generated nodes per session and request in Redis streams"""
+
+    def __init__(
+        self,
+        client=None,
+        ttl: int = STREAM_BUFFER_TTL,
+        wait_seconds: float = STREAM_RESUME_WAIT_SECONDS,
+        prefix: str = STREAM_BUFFER_PREFIX,
+    ):
+        self._client = client
+        self.ttl = ttl
+        self.wait_seconds = wait_seconds
+        self.prefix = prefix
+
+    def _redis(self):
+        if self.ttl <= 0:
+            return None
+        return self._client if self._client is not None else get_redis()
+
+    @property
+    def enabled(self) -> bool:
+        return self._redis() is not None
+
+    def _key(self, session_id: str, request_id: str) -> str:
+        return f"{self.prefix}:{session_id}:{request_id}"
+
+    def _latest_key(self, session_id: str) -> str:
+        return f"{self.prefix}:{session_id}:latest"
+
+    async def begin(self, session_id: str, request_id: str, speed: str) -> bool:
+        """Record an accepted request; it becomes the session's latest stream"""
+        client = self._redis()
+        if client is None:
+            return False
+        key = self._key(session_id, request_id)
+
+        def write():
+            pipe = client.pipeline()
+            pipe.delete(key)
+            pipe.xadd(key, {"speed": speed}, id=_START_ID)
+            pipe.expire(key, self.ttl)
+            pipe.set(self._latest_key(session_id), request_id, ex=self.ttl)
+            pipe.execute()
+
+        try:
+            await asyncio.to_thread(write)
+            return True
+        except Exception as e:
+            logger.warning("Could not buffer stream %s for %s: %s", request_id, session_id, e)
+            return False
+
+    async def store(self, session_id: str, request_id: str, nodes: List[dict]) -> bool:
+        """Buffer all nodes of a request and mark it complete, atomically"""
+        client = self._redis()
+        if client is None:
+            return False
+        key = self._key(session_id, request_id)
+
+        def write():
+            pipe = client.pipeline(transaction=True)
+            for index, node in enumerate(nodes):
+                pipe.xadd(key, {"node": encode(node)}, id=_node_id(index))
+            pipe.xadd(key, {"total": len(nodes)}, id=_node_id(len(nodes)))
+            pipe.expire(key, self.ttl)
+            pipe.expire(self._latest_key(session_id), self.ttl)
+            pipe.execute()
+
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(write)
+            logger.debug("Buffered %d nodes for %s/%s in %.1fms",
+                         len(nodes), session_id, request_id, (time.perf_counter() - start) * 1000)
+            return True
+        except Exception as e:
+            logger.warning("Could not buffer stream %s for %s: %s", request_id, session_id, e)
+            return False
+
+    async def replay(
+        self, session_id: str, request_id: Optional[str] = None, from_index: int = 0
+    ) -> Optional[BufferedStream]:
+        """
+        The nodes of a buffered stream from `from_index` on (the session's
+        latest stream if no request id is given). None if nothing is
+        buffered, it expired, or it was not generated within wait_seconds.
+        """
+        client = self._redis()
+        if client is None:
+            return None
+        from_index = max(0, int(from_index))
+
+        try:
+            found = await asyncio.to_thread(self._find, client, session_id, request_id, from_index)
+            if found is None:
+                return None
+            request_id, key, speed, entries = found
+
+            deadline = time.monotonic() + self.wait_seconds
+            poll = _POLL_FIRST_SECONDS
+            while not entries and time.monotonic() < deadline:
+                # Possibly still waiting on the LLM somewhere; nodes arrive in one write
+                await asyncio.sleep(min(poll, max(0.0, deadline - time.monotonic())))
+                poll = min(_POLL_MAX_SECONDS, poll * 2)
+                entries = await asyncio.to_thread(client.xrange, key, _node_id(from_index), "+")
+
+            return await asyncio.to_thread(self._result, client, key, request_id, speed, from_index, entries)
+        except Exception as e:
+            logger.warning("Could not replay stream for %s: %s", session_id, e)
+            return None
+
+    def _find(self, client, session_id, request_id, from_index):
+        """The stream's request id, key, speed and the entries written so far"""
+        if request_id is None:
+            latest = client.get(self._latest_key(session_id))
+            if latest is None:
+                return None
+            request_id = latest.decode() if isinstance(latest, bytes) else latest
+        key = self._key(session_id, request_id)
+
+        start = client.xrange(key, _START_ID, _START_ID)
+        if not start:
+            return None
+        speed = start[0][1].get(b"speed", b"normal").decode()
+        return request_id, key, speed, client.xrange(key, _node_id(from_index), "+")
+
+    def _result(self, client, key, request_id, speed, from_index, entries):
+        nodes, total = [], None
+        for _, fields in entries:
+            if b"total" in fields:
+                total = int(fields[b"total"])
+            else:
+                nodes.append(decode(fields[b"node"]))
+        if total is None and not entries:
+            # Resuming past the end of a complete stream
+            total = self._total(client, key)
+        if total is None:
+            # Not generated within wait_seconds
+            return None
+        return BufferedStream(request_id, speed, min(from_index, total), total, nodes)
+
+    @staticmethod
+    def _total(client, key) -> Optional[int]:
+        last = client.xrevrange(key, "+", "-", count=1)
+        if last and b"total" in last[0][1]:
+            return int(last[0][1][b"total"])
+        return None
+
+
+stream_buffer = StreamBuffer()
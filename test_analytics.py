@@ -0,0 +1,109 @@
+"""
+Unit tests for analytics indexes, rollups and dashboard queries.
+
+Statements are compiled with the PostgreSQL dialect; the query plans
+themselves are checked against seeded data with `python analytics.py explain`.
+"""
+
+import unittest
+from datetime import date, datetime, timezone
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from analytics import (
+    daily_series_statement,
+    funnel_statement,
+    open_leads_statement,
+    refresh_watermark_statement,
+    rollup_statements,
+    updated_days_statement,
+)
+from models import Conversation
+
+
+def _sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.asyncpg.dialect()))
+
+
+class TestIndexes(unittest.TestCase):
+    """Test suite for the dashboard indexes."""
+
+    def _ddl(self, name):
+        index = next(i for i in Conversation.__table__.indexes if i.name == name)
+        return _sql(CreateIndex(index, if_not_exists=True))
+
+    def test_partial_index(self):
+        """Open leads are indexed by created_at, only where converted = false."""
+        self.assertEqual(
+            self._ddl("ix_conversations_unconverted_created"),
+            "CREATE INDEX IF NOT EXISTS ix_conversations_unconverted_created "
+            "ON conversations (created_at) WHERE converted = false"
+        )
+
+    def test_gin_index_on_jsonb_cast(self):
+        """Pain points get a GIN index over the jsonb cast of the JSON column."""
+        self.assertEqual(
+            self._ddl("ix_conversations_pain_points"),
+            "CREATE INDEX IF NOT EXISTS ix_conversations_pain_points "
+            "ON conversations USING gin (CAST(pain_points AS JSONB))"
+        )
+
+    def test_composite_indexes_lead_with_filter_column(self):
+        """Composite indexes put the equality filter first and created_at second."""
+        self.assertIn("(current_stage, created_at)", self._ddl("ix_conversations_stage_created"))
+        self.assertIn("(quality_tier, created_at)", self._ddl("ix_conversations_tier_created"))
+        self.assertIn("(industry, created_at)", self._ddl("ix_conversations_industry_created"))
+
+
+class TestStatements(unittest.TestCase):
+    """Test suite for rollup and dashboard statements."""
+
+    def test_rollup_replaces_range(self):
+        """Refresh deletes the day range and re-inserts aggregated groups."""
+        remove, add = rollup_statements(date(2024, 1, 1), date(2024, 1, 7))
+        self.assertTrue(_sql(remove).startswith("DELETE FROM conversation_daily_stats WHERE"))
+        sql = _sql(add)
+        self.assertTrue(sql.startswith("INSERT INTO conversation_daily_stats (day, current_stage"))
+        self.assertIn("CAST(timezone(", sql)
+        self.assertIn("count(*) FILTER (WHERE conversations.converted IS true)", sql)
+        self.assertIn("GROUP BY", sql)
+
+    def test_updated_days_before_range(self):
+        """Older days to refresh come from updated conversations, via the updated_at index."""
+        sql = _sql(updated_days_statement(datetime(2024, 1, 7, tzinfo=timezone.utc), date(2024, 1, 6)))
+        self.assertTrue(sql.startswith("SELECT DISTINCT CAST(timezone("))
+        self.assertIn("conversations.updated_at >= ", sql)
+        self.assertIn("conversations.created_at < ", sql)
+        self.assertIn("ix_conversations_updated_at", {i.name for i in Conversation.__table__.indexes})
+
+    def test_refresh_watermark(self):
+        """Each refresh records its start in its own row, rows written or not."""
+        sql = _sql(refresh_watermark_statement())
+        self.assertTrue(sql.startswith("INSERT INTO rollup_refreshes (name, started_at) VALUES"))
+        self.assertIn("now()", sql)
+        self.assertIn("ON CONFLICT (name) DO UPDATE SET started_at = excluded.started_at", sql)
+
+    def test_daily_series_reads_rollups(self):
+        """Dashboard series never touch the conversations table."""
+        sql = _sql(daily_series_statement(date(2024, 1, 1), date(2024, 1, 31), "quality_tier", {"industry": "SaaS"}))
+        self.assertIn("FROM conversation_daily_stats", sql)
+        self.assertNotIn("conversations.", sql)
+        self.assertIn("GROUP BY conversation_daily_stats.day, conversation_daily_stats.quality_tier", sql)
+        self.assertIn("conversation_daily_stats.industry = ", sql)
+
+    def test_funnel_groups_by_stage(self):
+        """The funnel aggregates rollups per stage."""
+        sql = _sql(funnel_statement(date(2024, 1, 1), date(2024, 1, 31)))
+        self.assertIn("GROUP BY conversation_daily_stats.current_stage", sql)
+
+    def test_open_leads_match_index_predicates(self):
+        """Open lead filters are written exactly as the partial and GIN indexes expect."""
+        sql = _sql(open_leads_statement(datetime(2024, 1, 1, tzinfo=timezone.utc), pain_point="lead generation"))
+        self.assertIn("conversations.converted = false", sql)
+        self.assertIn("CAST(conversations.pain_points AS JSONB) @> jsonb_build_array(", sql)
+        self.assertIn("ORDER BY conversations.created_at DESC", sql)
+
+
+if __name__ == "__main__":
+    unittest.main()
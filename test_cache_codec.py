@@ -0,0 +1,109 @@
+"""
+Unit tests for the cache codec and its use in the Redis cache helpers.
+"""
+
+import json
+import unittest
+import zlib
+from unittest import mock
+
+import cache_codec
+import redis_client
+from cache_codec import FORMAT_VERSION, RAW, ZLIB, ZSTD, CacheDecodeError, decode, encode
+
+CONVERSATION = {
+    "id": 7,
+    "session_id": "abc",
+    "email": "lead@example.com",
+    "messages": [
+        {"role": "user", "content": "Tell me about pricing ünd plans", "timestamp": "2024-01-01T00:00:00"},
+        {"role": "assistant", "content": "Our plans " * 200, "timestamp": "2024-01-01T00:00:30"},
+    ],
+    "qualification_score": 40,
+    "created_at": "2024-01-01T00:00:00",
+}
+
+
+class TestCodec(unittest.TestCase):
+    """Test suite for encode/decode."""
+
+    def test_round_trip_each_compression(self):
+        """Every compression decodes back to the original value."""
+        compressions = [RAW, ZLIB] + ([ZSTD] if cache_codec.zstandard is not None else [])
+        for compression in compressions:
+            with self.subTest(compression=compression):
+                value = encode(CONVERSATION, compression=compression, min_bytes=0)
+                self.assertEqual(value[:2], bytes((FORMAT_VERSION, compression)))
+                self.assertEqual(decode(value), CONVERSATION)
+
+    def test_small_values_not_compressed(self):
+        """Bodies under the threshold are stored raw."""
+        value = encode({"id": 1}, compression=ZLIB, min_bytes=512)
+        self.assertEqual(value[1], RAW)
+        self.assertEqual(decode(value), {"id": 1})
+
+    def test_large_values_compressed(self):
+        """Long histories are compressed well below their JSON size."""
+        value = encode(CONVERSATION, compression=ZLIB, min_bytes=512)
+        self.assertEqual(value[1], ZLIB)
+        self.assertLess(len(value), len(json.dumps(CONVERSATION)) / 4)
+
+    def test_legacy_json_readable(self):
+        """Plain JSON written before the codec is still decoded, as str or bytes."""
+        legacy = json.dumps(CONVERSATION)
+        self.assertEqual(decode(legacy), CONVERSATION)
+        self.assertEqual(decode(legacy.encode("utf-8")), CONVERSATION)
+        self.assertEqual(decode(b' \n{"id": 1}'), {"id": 1})
+
+    def test_unknown_version_rejected(self):
+        """Headers from a future format version are not misread."""
+        with self.assertRaises(CacheDecodeError):
+            decode(bytes((FORMAT_VERSION + 1, RAW)) + b"{}")
+
+    def test_unknown_compression_rejected(self):
+        """An unknown compression byte is an error."""
+        with self.assertRaises(CacheDecodeError):
+            decode(bytes((FORMAT_VERSION, 9)) + b"{}")
+
+    def test_corrupt_body_rejected(self):
+        """A truncated compressed body raises CacheDecodeError."""
+        value = bytes((FORMAT_VERSION, ZLIB)) + zlib.compress(b'{"id": 1}')[:-4]
+        with self.assertRaises(CacheDecodeError):
+            decode(value)
+
+
+class TestRedisCache(unittest.TestCase):
+    """Test suite for the cache helpers with a fake client."""
+
+    def setUp(self):
+        self.store = {}
+        client = mock.Mock()
+        client.setex.side_effect = lambda key, ttl, value: self.store.__setitem__(key, value)
+        client.get.side_effect = lambda key: self.store.get(key)
+        client.delete.side_effect = lambda key: self.store.pop(key, None)
+        patcher = mock.patch.object(redis_client, "redis_client", client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache_stores_encoded_bytes(self):
+        """Cached conversations are stored with the codec header."""
+        self.assertTrue(redis_client.cache_conversation("abc", CONVERSATION))
+        stored = self.store["conversation:abc"]
+        self.assertIsInstance(stored, bytes)
+        self.assertEqual(stored[0], FORMAT_VERSION)
+        self.assertEqual(redis_client.get_cached_conversation("abc"), CONVERSATION)
+
+    def test_legacy_entry_read(self):
+        """Entries written as plain JSON by earlier releases are hits."""
+        self.store["conversation:abc"] = json.dumps(CONVERSATION).encode("utf-8")
+        self.assertEqual(redis_client.get_cached_conversation("abc"), CONVERSATION)
+
+    def test_undecodable_entry_dropped(self):
+        """Undecodable entries are treated as a miss and deleted."""
+        self.store["conversation:abc"] = bytes((FORMAT_VERSION + 1, RAW))
+        self.assertIsNone(redis_client.get_cached_conversation("abc"))
+        self.assertNotIn("conversation:abc", self.store)
+
+
+if __name__ == "__main__":
+    unittest.main()
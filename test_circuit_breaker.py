@@ -0,0 +1,199 @@
+"""
+Unit tests for the circuit breaker and resilient LLM gateway calls.
+"""
+
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+
+import httpx
+
+import llm_client
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test suite for breaker state changes"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.breaker = CircuitBreaker("test", failure_rate=0.5, slow_call_seconds=5, slow_call_rate=0.5,
+                                      min_calls=4, window=60, open_seconds=30, clock=self.clock)
+
+    def _calls(self, *outcomes, seconds=0.1):
+        for ok in outcomes:
+            self.breaker.before_call()
+            self.breaker.record(ok, seconds)
+
+    def test_opens_on_failure_rate(self):
+        self._calls(True, False, True)
+        self.assertEqual(self.breaker.state, CLOSED)  # below min_calls
+        self._calls(False)
+        self.assertEqual(self.breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError) as ctx:
+            self.breaker.before_call()
+        self.assertAlmostEqual(ctx.exception.retry_after, 30)
+
+    def test_opens_on_slow_calls(self):
+        self._calls(True, True, seconds=6)
+        self._calls(True, True)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_old_calls_leave_the_window(self):
+        self._calls(False, False, False)
+        self.clock.now += 61
+        self._calls(True, True, True, False)
+        self.assertEqual(self.breaker.state, CLOSED)
+
+    def test_half_open_probe(self):
+        self._calls(False, False, False, False)
+        self.clock.now += 30
+        self.assertTrue(self.breaker.allows_calls)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+        # One probe at a time
+        self.breaker.before_call()
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record(False, 0.1)
+        self.assertEqual(self.breaker.state, OPEN)
+
+        self.clock.now += 30
+        self._calls(True)
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertEqual(self.breaker.stats()["calls"], 0)
+
+    def test_release_frees_probe(self):
+        self._calls(False, False, False, False)
+        self.clock.now += 30
+        self.breaker.before_call()
+        self.breaker.release()
+        self.breaker.before_call()
+
+
+class GatewayTestCase(unittest.IsolatedAsyncioTestCase):
+    """Runs llm_client against a MockTransport instead of the network"""
+
+    def use_gateway(self, handler, **breaker):
+        self.requests = []
+
+        async def record(request):
+            self.requests.append(json.loads(request.content))
+            return await handler(request)
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+        self.addAsyncCleanup(client.aclose)
+        settings = dict(min_calls=5, failure_rate=0.5, open_seconds=30)
+        settings.update(breaker)
+        for patcher in (
+            mock.patch.object(llm_client, "LLM_GATEWAY_URL", "http://gateway"),
+            mock.patch.object(llm_client, "_http_client", client),
+            mock.patch.object(llm_client, "gateway_breaker", CircuitBreaker("test_gateway", **settings)),
+            mock.patch.object(llm_client, "_latencies", llm_client.deque(maxlen=500)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TestFastFail(GatewayTestCase):
+    """Test suite for failing fast while the gateway is down"""
+
+    async def test_failing_gateway_trips_breaker(self):
+        async def failing(request):
+            await asyncio.sleep(0.2)
+            return httpx.Response(503, text="upstream unavailable")
+
+        self.use_gateway(failing)
+        messages = [{"role": "user", "content": "hi"}]
+        for _ in range(5):
+            self.assertIsNone(await llm_client.get_ai_response(messages))
+        self.assertEqual(len(self.requests), 5)
+        self.assertEqual(llm_client.gateway_breaker.state, OPEN)
+
+        start = time.perf_counter()
+        reply = await llm_client.get_sales_response([], "Tell me about pricing")
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertIn("trouble connecting", reply)
+        self.assertEqual(len(self.requests), 5)  # the gateway was not called
+
+    async def test_client_errors_do_not_trip(self):
+        async def bad_request(request):
+            return httpx.Response(400, text="bad")
+
+        self.use_gateway(bad_request)
+        for _ in range(6):
+            self.assertIsNone(await llm_client.get_ai_response([]))
+        self.assertEqual(llm_client.gateway_breaker.state, CLOSED)
+
+
+class TestHedging(GatewayTestCase):
+    """Test suite for hedged gateway requests"""
+
+    async def test_hedge_answers_when_first_stalls(self):
+        async def first_stalls(request):
+            if len(self.requests) == 1:
+                await asyncio.sleep(5)
+            return httpx.Response(200, json={"content": json.loads(request.content)["model"]})
+
+        self.use_gateway(first_stalls)
+        with mock.patch.object(llm_client, "LLM_HEDGE_AFTER", "0.05"), \
+                mock.patch.object(llm_client, "LLM_HEDGE_MODEL", "fallback-model"):
+            start = time.perf_counter()
+            reply = await llm_client.get_ai_response([], model="primary-model")
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(reply, "fallback-model")
+        self.assertEqual([r["model"] for r in self.requests], ["primary-model", "fallback-model"])
+        # The abandoned attempt is not counted against the gateway
+        self.assertEqual(llm_client.gateway_breaker.stats()["calls"], 1)
+
+    async def test_cancelled_caller_cancels_first_attempt(self):
+        cancelled = asyncio.Event()
+
+        async def stalls(request):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return httpx.Response(200, json={"content": "late"})
+
+        self.use_gateway(stalls)
+        with mock.patch.object(llm_client, "LLM_HEDGE_AFTER", "1"):
+            caller = asyncio.create_task(llm_client.get_ai_response([]))
+            await asyncio.sleep(0.05)  # still before the hedge delay
+            caller.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await caller
+        await asyncio.wait_for(cancelled.wait(), 1)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_no_hedge_when_fast(self):
+        async def fast(request):
+            return httpx.Response(200, json={"content": "ok"})
+
+        self.use_gateway(fast)
+        with mock.patch.object(llm_client, "LLM_HEDGE_AFTER", "0.5"):
+            self.assertEqual(await llm_client.get_ai_response([]), "ok")
+        self.assertEqual(len(self.requests), 1)
+
+    def test_p95_delay_needs_samples(self):
+        with mock.patch.object(llm_client, "_latencies", llm_client.deque([1.0] * 19 + [9.0])):
+            self.assertEqual(llm_client.hedge_delay("p95"), 9.0)
+        with mock.patch.object(llm_client, "_latencies", llm_client.deque([0.1] * 5)):
+            self.assertIsNone(llm_client.hedge_delay("p95"))
+        self.assertIsNone(llm_client.hedge_delay("off"))
+        self.assertEqual(llm_client.hedge_delay("1.5"), 1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+Unit tests for content_processor chunking.
+
+Covers the lazy ChunkStream API and its equivalence with the list-based helpers.
+"""
+
+import unittest
+from content_processor import (
+    ChunkStream,
+    FusedHTMLPass,
+    analyze_content_complexity,
+    sanitize_html,
+    validate_html_structure,
+    smart_chunk_content,
+    chunk_html_by_words,
+    iter_html_chunks,
+    chunk_by_sentences,
+    chunk_by_paragraphs,
+)
+
+
+class TestChunkStream(unittest.TestCase):
+    """Test suite for the lazy chunking API."""
+
+    def test_word_chunks_match_split(self):
+        """Plain text word chunks preserve a trailing space per word."""
+        stream = ChunkStream("one two\nthree", "text", "word")
+        self.assertEqual(list(stream), ["one ", "two ", "three "])
+
+    def test_chunks_are_lazy(self):
+        """Metrics advance as the stream is consumed."""
+        stream = ChunkStream("alpha beta gamma", "text", "word")
+        self.assertEqual(stream.chunk_count, 0)
+
+        self.assertEqual(next(stream), "alpha ")
+        self.assertEqual(stream.chunk_count, 1)
+        self.assertEqual(stream.final_length, 6)
+
+        rest = list(stream)
+        self.assertEqual(rest, ["beta ", "gamma "])
+        self.assertEqual(stream.chunk_count, 3)
+        self.assertEqual(stream.largest_chunk, 6)
+
+    def test_metadata_matches_smart_chunk_content(self):
+        """smart_chunk_content is a materialized ChunkStream."""
+        html = "<p>Hello <strong>world</strong></p> and more text"
+        stream = ChunkStream(html, "html", "word")
+        chunks = list(stream)
+
+        expected_chunks, expected_metadata = smart_chunk_content(html, "html", "word")
+        metadata = stream.metadata
+
+        self.assertEqual(chunks, expected_chunks)
+        metadata.pop("processing_time_ms")
+        expected_metadata.pop("processing_time_ms")
+        self.assertEqual(metadata, expected_metadata)
+        self.assertEqual(metadata["chunk_count"], len(chunks))
+        self.assertEqual(metadata["final_length"], sum(len(c) for c in chunks))
+
+    def test_empty_content(self):
+        """Empty content yields nothing and reports the error."""
+        stream = ChunkStream("", "text")
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.metadata["error"], "empty_content")
+
+    def test_invalid_arguments_raise_eagerly(self):
+        """Invalid content type or strategy raises before iteration."""
+        with self.assertRaises(ValueError):
+            ChunkStream("text", "pdf")
+        with self.assertRaises(ValueError):
+            ChunkStream("text", "text", "line")
+
+    def test_character_chunks_keep_tags_atomic(self):
+        """Character chunking keeps tag-led HTML chunks whole."""
+        chunks, _ = smart_chunk_content("hi <b>x</b>", "html", "character")
+        self.assertEqual(chunks, ["h", "i", "<b>x</b>"])
+
+
+class TestFusedHTMLPass(unittest.TestCase):
+    """Test suite for the single-pass HTML pipeline."""
+
+    HTML = (
+        '<h2>Launch <em>faster</em></h2>\n'
+        '<p>Our <a href="https://example.com">platform</a> helps **teams**.</p>\n'
+        '<ul><li>One</li><li>Two</li></ul> trailing words <br> end'
+    )
+
+    def test_matches_separate_passes(self):
+        """Chunks, analysis and unclosed tags match the separate passes."""
+        fused = FusedHTMLPass(self.HTML)
+        chunks = list(fused)
+
+        sanitized = sanitize_html(self.HTML)
+        self.assertEqual(chunks, chunk_html_by_words(sanitized))
+        self.assertEqual(fused.analysis, analyze_content_complexity(sanitized))
+        self.assertEqual(fused.unclosed_tags, validate_html_structure(sanitized))
+
+    def test_stream_uses_fused_pass(self):
+        """ChunkStream output is the same with and without the fused pass."""
+        fused_stream = ChunkStream(self.HTML, "html", "word")
+        legacy_stream = ChunkStream(self.HTML, "html", "word", fused_html=False)
+
+        self.assertEqual(list(fused_stream), list(legacy_stream))
+        self.assertEqual(fused_stream.analysis, legacy_stream.analysis)
+
+    def test_removes_dangerous_markup(self):
+        """Scripts, event handlers and javascript: URLs are stripped."""
+        html = (
+            '<p onclick="steal()">Hi</p><script>alert(1)</script>'
+            '<a href=" java&#x09;script:alert(1)" title="t">x</a>'
+            '<img/onerror=alert(1) src=pic.png>'
+        )
+        output = "".join(FusedHTMLPass(html))
+
+        self.assertEqual(output, '<p>Hi</p><a title="t">x</a><img src="pic.png">')
+
+    def test_escaped_markup_stays_escaped(self):
+        """Entities are not unescaped into live tags."""
+        output = "".join(FusedHTMLPass("<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>"))
+        self.assertEqual(output, "<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>")
+
+    def test_preserves_code_blocks(self):
+        """<pre> text is passed through untouched."""
+        html = "<pre><code>if a <b> c: onclick=1</code></pre>"
+        self.assertEqual("".join(FusedHTMLPass(html)), html)
+
+    def test_sanitizes_inside_code_blocks(self):
+        """Tags in and on <pre> blocks are sanitized, whatever their case."""
+        for html in ('<PRE onmouseover="alert(1)"><img src=x onerror=alert(1)></pre>',
+                     '<pre onmouseover="alert(1)"><img src=x onerror=alert(1)></pre>'):
+            with self.subTest(html=html):
+                output = "".join(FusedHTMLPass(html))
+                self.assertNotIn("alert", output)
+                self.assertIn('<img src="x">', output)
+
+    def test_quoted_gt_stays_in_tag(self):
+        """A '>' inside a quoted attribute value does not end the tag."""
+        output = "".join(FusedHTMLPass('<p><img src="x" title="a>b" onerror=alert(1)> done</p>'))
+        self.assertEqual(output, '<p><img src="x" title="a>b"> done</p>')
+
+    def test_unbalanced_quote_in_tag(self):
+        """An unclosed quote in a tag does not swallow the rest of the document."""
+        output = "".join(FusedHTMLPass("<p><img alt=it's src=x.png> after</p>"))
+        self.assertIn("after</p>", output)
+
+    def test_plain_text_is_handed_back(self):
+        """Content without tags is returned for plain word chunking."""
+        fused = FusedHTMLPass("just some words")
+        self.assertEqual(list(fused), [])
+        self.assertEqual(fused.plain_text, "just some words")
+        self.assertEqual(
+            list(ChunkStream("just some words", "html", "word")),
+            ["just ", "some ", "words "]
+        )
+
+
+class TestChunkHelpers(unittest.TestCase):
+    """Test suite for the list-based chunk helpers."""
+
+    def test_html_chunks(self):
+        """Tags stay together with their content."""
+        html = "<p>Hello <em>there</em></p> plain words"
+        self.assertEqual(
+            chunk_html_by_words(html),
+            ["<p>Hello <em>there</em></p>", " plain ", "words"]
+        )
+        self.assertEqual(list(iter_html_chunks(html)), chunk_html_by_words(html))
+
+    def test_html_forced_splits(self):
+        """Runaway and oversized chunks are split at the same boundaries as before."""
+        self.assertEqual(
+            chunk_html_by_words("<p>" + "x" * 25 + " tail</p> " + "y" * 12 + " z", 5),
+            ["<p>xxxxxxxx", "xxxxxxxxxxx", "xxxxxx", "tail</p>", " yyyyyyyyyy", "yy ", "z"]
+        )
+        self.assertEqual(
+            chunk_html_by_words("abcdefghij  next <b>open", 4),
+            ["abcdefghi", "j ", " next", "<b>open"]
+        )
+
+    def test_html_size_limit_raises_eagerly(self):
+        """Oversized input is rejected before any chunk is produced."""
+        with self.assertRaises(ValueError):
+            iter_html_chunks("x" * 1_000_001)
+
+    def test_sentences(self):
+        """Sentences are split on terminal punctuation."""
+        self.assertEqual(
+            chunk_by_sentences("First one. Second!  Third?"),
+            ["First one. ", "Second! ", "Third? "]
+        )
+
+    def test_paragraphs(self):
+        """Paragraphs are split on blank lines."""
+        self.assertEqual(
+            chunk_by_paragraphs("One\n\nTwo\n\n\n\nThree\n\n"),
+            ["One\n\n", "Two\n\n", "Three\n\n"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
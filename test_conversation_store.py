@@ -0,0 +1,70 @@
+"""
+Unit tests for the conversation upsert statements.
+"""
+
+import unittest
+
+from sqlalchemy.dialects import postgresql
+
+from conversation_store import (
+    append_statement,
+    append_turns_statement,
+    conversation_read_statement,
+    get_or_create_statement,
+)
+
+
+def _sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.asyncpg.dialect()))
+
+
+class TestUpsertStatements(unittest.TestCase):
+    """Test suite for the single-round-trip conversation writes."""
+
+    def test_get_or_create(self):
+        """Existing rows are returned unchanged by the conflict branch."""
+        sql = _sql(get_or_create_statement("s1", "a@b.com"))
+        self.assertIn("ON CONFLICT (session_id) DO UPDATE SET session_id = excluded.session_id", sql)
+        self.assertIn("RETURNING conversations.id, conversations.session_id, conversations.email, (xmax = 0) AS inserted", sql)
+
+    def test_append_is_atomic_concatenation(self):
+        """Appends concatenate onto the stored messages inside the statement."""
+        sql = _sql(append_statement("s1", [{"role": "user", "content": "hi"}]))
+        self.assertIn("ON CONFLICT (session_id) DO UPDATE SET messages = CAST(coalesce(CAST(conversations.messages AS JSONB), '[]'::jsonb) || CAST(excluded.messages AS JSONB) AS JSON)", sql)
+        self.assertIn("version = (conversations.version +", sql)
+        self.assertIn("RETURNING conversations.id, conversations.version, (xmax = 0) AS inserted", sql)
+
+    def test_new_rows_get_column_defaults(self):
+        """Inserts include the columns with model defaults, filled in at execution."""
+        sql = _sql(get_or_create_statement("s1"))
+        for column in ("current_stage", "pain_points", "goals", "qualification_score", "converted", "version"):
+            self.assertIn(column, sql.split("VALUES")[0])
+
+    def test_append_turns_skips_stored_turns(self):
+        """Replayed turns are filtered against the stored turn_ids of the conflicting row."""
+        sql = _sql(append_turns_statement("s1", [{"role": "user", "content": "hi", "turn_id": "t1"}]))
+        self.assertIn("FROM jsonb_array_elements(CAST(excluded.messages AS JSONB)) WITH ORDINALITY AS incoming(value, position)", sql)
+        self.assertIn("WHERE NOT (coalesce(CAST(conversations.messages AS JSONB), '[]'::jsonb) @> jsonb_build_array(", sql)
+        # Correlated to the row being updated, not a second scan of the table
+        self.assertNotIn(", conversations \n", sql)
+
+
+class TestReadStatements(unittest.TestCase):
+    """Test suite for projected and paginated reads."""
+
+    def test_projection_selects_only_requested_columns(self):
+        """Unrequested columns, including messages, are not selected."""
+        sql = _sql(conversation_read_statement("s1", ["id", "email"]))
+        self.assertTrue(sql.startswith("SELECT conversations.id, conversations.email \nFROM conversations"))
+
+    def test_pagination_slices_in_database(self):
+        """A page of messages is aggregated from json_array_elements."""
+        sql = _sql(conversation_read_statement("s1", ["messages"], limit=20, before=40))
+        self.assertIn("FROM json_array_elements(conversations.messages) WITH ORDINALITY AS message(value, position)", sql)
+        self.assertIn("AS messages_total", sql)
+        self.assertIn("AS messages_start", sql)
+        self.assertNotIn("conversations.messages AS", sql.split("FROM json_array_elements")[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+"""
+Unit tests for NDJSON conversation export and import.
+"""
+
+import asyncio
+import gzip
+import json
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+from sqlalchemy.dialects import postgresql
+
+from conversation_transfer import (
+    EXPORT_FIELDS,
+    IMPORT_FIELDS,
+    ImportLineError,
+    encode_lines,
+    export_statement,
+    gunzip_stream,
+    gzip_stream,
+    iter_lines,
+    dirty_days_statement,
+    merge_statement,
+    parse_line,
+)
+
+
+def _sql(statement) -> str:
+    return str(statement.compile(dialect=postgresql.asyncpg.dialect()))
+
+
+class TestExport(unittest.TestCase):
+    """Test suite for export statements and encoding."""
+
+    def test_statement_orders_by_id(self):
+        """All exported columns are selected in a stable order."""
+        sql = _sql(export_statement())
+        self.assertTrue(sql.startswith("SELECT conversations.id, conversations.session_id"))
+        self.assertTrue(sql.endswith("ORDER BY conversations.id"))
+        self.assertNotIn("WHERE", sql)
+
+    def test_updated_since_falls_back_to_created_at(self):
+        """Rows never updated are filtered on their creation time."""
+        sql = _sql(export_statement(datetime(2024, 1, 1, tzinfo=timezone.utc)))
+        self.assertIn("WHERE coalesce(conversations.updated_at, conversations.created_at) >= ", sql)
+
+    def test_encode_lines(self):
+        """Each row becomes one JSON line; timestamps are ISO 8601."""
+        created = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+        rows = [
+            {"id": 1, "messages": [{"role": "user", "content": "hi\nthere"}], "created_at": created},
+            {"id": 2, "messages": [], "created_at": None},
+        ]
+        lines = encode_lines(rows).decode("utf-8").splitlines()
+        self.assertEqual(len(lines), 2)
+        first = json.loads(lines[0])
+        self.assertEqual(first["messages"][0]["content"], "hi\nthere")
+        self.assertTrue(first["created_at"].startswith("2024-01-01T12:00:00"))
+        self.assertIsNone(json.loads(lines[1])["created_at"])
+
+    def test_gzip_stream(self):
+        """Compressed chunks concatenate into one valid gzip stream."""
+        async def chunks():
+            for i in range(3):
+                yield encode_lines([{"id": i}])
+
+        async def collect():
+            return b"".join([part async for part in gzip_stream(chunks())])
+
+        data = gzip.decompress(asyncio.run(collect())).decode("utf-8")
+        self.assertEqual([json.loads(line)["id"] for line in data.splitlines()], [0, 1, 2])
+
+    def test_export_fields_exist(self):
+        """Every exported field is a Conversation column."""
+        from models import Conversation
+        for field in EXPORT_FIELDS:
+            self.assertIn(field, Conversation.__table__.columns)
+
+
+class TestImport(unittest.TestCase):
+    """Test suite for import parsing and the merge statement."""
+
+    def test_parse_export_line(self):
+        """A line written by the export parses back into a staging record."""
+        created = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+        line = encode_lines([{"id": 9, "session_id": "s1", "messages": [{"role": "user"}], "created_at": created}])
+        record = dict(zip(IMPORT_FIELDS, parse_line(line.strip())))
+
+        self.assertEqual(record["session_id"], "s1")
+        self.assertEqual(json.loads(record["messages"]), [{"role": "user"}])
+        self.assertEqual(record["created_at"], created)
+        self.assertNotIn("id", record)
+
+    def test_parse_fills_defaults(self):
+        """Missing fields get the model defaults and naive timestamps are UTC."""
+        record = dict(zip(IMPORT_FIELDS, parse_line('{"session_id": "s1", "updated_at": "2024-01-01T00:00:00"}')))
+        self.assertEqual(json.loads(record["pain_points"]), [])
+        self.assertEqual(record["current_stage"], "greeting")
+        self.assertEqual(record["version"], 1)
+        self.assertEqual(record["updated_at"].tzinfo, timezone.utc)
+        self.assertIsNotNone(record["created_at"])
+
+    def test_parse_rejects_bad_lines(self):
+        """Invalid JSON, missing session_id and bad values raise; blank lines are skipped."""
+        self.assertIsNone(parse_line("  "))
+        for line in ("{oops", '{"email": "a@b"}', '{"session_id": "s1", "created_at": "yesterday"}'):
+            with self.subTest(line=line), self.assertRaises(ImportLineError):
+                parse_line(line)
+
+    def test_merge_skip(self):
+        """Skip mode inserts the last staged line per session and ignores conflicts."""
+        sql = _sql(merge_statement("skip"))
+        self.assertIn("SELECT DISTINCT ON (conversation_import.session_id)", sql)
+        self.assertIn("ORDER BY conversation_import.session_id, conversation_import.line DESC", sql)
+        self.assertIn("ON CONFLICT (session_id) DO NOTHING", sql)
+        self.assertTrue(sql.endswith("RETURNING (xmax = 0) AS inserted"))
+
+    def test_merge_update(self):
+        """Update mode overwrites imported fields and bumps the version."""
+        sql = _sql(merge_statement("update"))
+        self.assertIn("ON CONFLICT (session_id) DO UPDATE SET email = excluded.email", sql)
+        self.assertIn("version = (conversations.version + ", sql)
+        self.assertNotIn("session_id = excluded.session_id", sql)
+
+    def test_dirty_days(self):
+        """Imported days and the days of overwritten rows are marked for the rollup refresh."""
+        sql = _sql(dirty_days_statement())
+        self.assertTrue(sql.startswith("INSERT INTO rollup_dirty_days (day) SELECT CAST(timezone("))
+        self.assertIn("conversation_import.created_at", sql)
+        self.assertIn("JOIN conversation_import ON conversation_import.session_id = conversations.session_id", sql)
+        self.assertIn(" UNION ", sql)
+        self.assertTrue(sql.endswith("ON CONFLICT DO NOTHING"))
+
+    def test_stream_lines_through_gzip(self):
+        """Lines split across chunk boundaries survive gzip round trips."""
+        payload = b'{"session_id": "a"}\n{"session_id": "b"}\n{"session_id": "c"}'
+
+        async def chunks(data, size):
+            for i in range(0, len(data), size):
+                yield data[i:i + size]
+
+        async def collect():
+            compressed = b"".join([part async for part in gzip_stream(chunks(payload, 7))])
+            return [line async for line in iter_lines(gunzip_stream(chunks(compressed, 5)))]
+
+        self.assertEqual(asyncio.run(collect()), payload.split(b"\n"))
+
+    def test_long_line_in_small_chunks(self):
+        """A line spread over many chunks comes out whole."""
+        async def chunks():
+            for _ in range(1000):
+                yield b"x" * 10
+            yield b"\n\nend"
+
+        async def collect():
+            return [line async for line in iter_lines(chunks())]
+
+        self.assertEqual(asyncio.run(collect()), [b"x" * 10000, b"", b"end"])
+
+
+class TestEndpointAccess(unittest.TestCase):
+    """Test suite for the admin gate on the bulk endpoints."""
+
+    def setUp(self):
+        from fastapi.testclient import TestClient
+
+        import main
+        from rate_limit import RateLimiter
+
+        async def rows(updated_since):
+            yield b'{"session_id": "s1"}\n'
+
+        for patcher in (
+            mock.patch.object(main, "rate_limiter", RateLimiter(enabled=False)),
+            mock.patch.object(main, "iter_export", rows),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.main = main
+        self.client = TestClient(main.app)
+
+    def test_export_needs_admin_token(self):
+        """Export is off without ADMIN_TOKEN and needs the right token when set."""
+        with mock.patch.object(self.main, "ADMIN_TOKEN", ""):
+            self.assertEqual(self.client.get("/api/sales/conversations:export").status_code, 404)
+        with mock.patch.object(self.main, "ADMIN_TOKEN", "s3cret"):
+            self.assertEqual(self.client.get("/api/sales/conversations:export").status_code, 403)
+            response = self.client.get("/api/sales/conversations:export", headers={"X-Admin-Token": "wrong"})
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get("/api/sales/conversations:export", headers={"X-Admin-Token": "s3cret"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.text, '{"session_id": "s1"}\n')
+
+    def test_import_needs_admin_token(self):
+        """Import can't overwrite conversations without the admin token."""
+        importer = mock.AsyncMock(return_value={"inserted": 1})
+        with mock.patch.object(self.main, "import_conversations", importer), \
+                mock.patch.object(self.main, "ADMIN_TOKEN", "s3cret"):
+            url = "/api/sales/conversations:import?on_conflict=update"
+            self.assertEqual(self.client.post(url, content=b'{"session_id": "s1"}').status_code, 403)
+            importer.assert_not_called()
+            response = self.client.post(url, content=b'{"session_id": "s1"}', headers={"X-Admin-Token": "s3cret"})
+            self.assertEqual(response.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
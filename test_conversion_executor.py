@@ -0,0 +1,133 @@
+"""
+Unit tests for the conversion executor and event loop lag monitor.
+"""
+
+import asyncio
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+import conversion_executor
+from conversion_executor import (
+    ChunkedContent,
+    chunk_content,
+    convert_markdown,
+    shutdown_conversion_pool,
+    should_offload,
+)
+from content_processor import ChunkStream, smart_chunk_content
+from loop_monitor import LoopLagMonitor
+from markdown_to_tiptap import convert_markdown_to_tiptap
+
+
+MARKDOWN = "## Growth\n\nOur **platform** helps teams.\n\n- One\n- Two\n"
+
+
+class TestConversionExecutor(unittest.TestCase):
+    """Test suite for inline vs pooled conversion."""
+
+    def setUp(self):
+        self._threshold = conversion_executor.CONVERSION_INLINE_MAX_CHARS
+        self._workers = conversion_executor.CONVERSION_WORKERS
+
+    def tearDown(self):
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = self._threshold
+        conversion_executor.CONVERSION_WORKERS = self._workers
+        shutdown_conversion_pool()
+
+    def test_threshold(self):
+        """Only content above the threshold is offloaded."""
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = 10
+        conversion_executor.CONVERSION_WORKERS = 1
+        self.assertFalse(should_offload("x" * 10))
+        self.assertTrue(should_offload("x" * 11))
+
+        conversion_executor.CONVERSION_WORKERS = 0
+        self.assertFalse(should_offload("x" * 11))
+
+    def test_inline_conversion(self):
+        """Small content is converted inline with the same result."""
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = len(MARKDOWN)
+        nodes = asyncio.run(convert_markdown(MARKDOWN))
+        self.assertEqual(nodes, convert_markdown_to_tiptap(MARKDOWN))
+        self.assertIsNone(conversion_executor._pool)
+
+    def test_pooled_conversion(self):
+        """Large content is converted in the pool with the same result."""
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = 0
+        conversion_executor.CONVERSION_WORKERS = 1
+        nodes = asyncio.run(convert_markdown(MARKDOWN))
+        self.assertEqual(nodes, convert_markdown_to_tiptap(MARKDOWN))
+        self.assertIsNotNone(conversion_executor._pool)
+
+    def test_pooled_chunking(self):
+        """Chunks and metadata from the pool match smart_chunk_content."""
+        html = "<p>Hello <em>there</em></p> plain words"
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = 0
+        conversion_executor.CONVERSION_WORKERS = 1
+        result = asyncio.run(chunk_content(html, "html", "word"))
+
+        expected_chunks, expected_metadata = smart_chunk_content(html, "html", "word")
+        self.assertIsInstance(result, ChunkedContent)
+        self.assertEqual(list(result), expected_chunks)
+        self.assertEqual(result.metadata["chunk_count"], expected_metadata["chunk_count"])
+        self.assertEqual(result.analysis, expected_metadata["analysis"])
+
+    def test_broken_pool_replaced_without_joining(self):
+        """A broken pool is dropped without waiting for it and the call converts inline."""
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = 0
+        conversion_executor.CONVERSION_WORKERS = 1
+
+        class BrokenPool:
+            def submit(self, *args, **kwargs):
+                raise BrokenProcessPool("worker died")
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                self.shutdown_wait = wait
+
+        broken = BrokenPool()
+        conversion_executor._pool = broken
+        nodes = asyncio.run(convert_markdown(MARKDOWN))
+        self.assertEqual(nodes, convert_markdown_to_tiptap(MARKDOWN))
+        self.assertIsNone(conversion_executor._pool)
+        self.assertFalse(broken.shutdown_wait)
+
+    def test_inline_chunking_is_lazy(self):
+        """Small content gets a lazy ChunkStream."""
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = 1000
+        result = asyncio.run(chunk_content("a few words", "text"))
+        self.assertIsInstance(result, ChunkStream)
+
+    def test_pooled_errors_propagate(self):
+        """Validation errors raised in a worker reach the caller."""
+        conversion_executor.CONVERSION_INLINE_MAX_CHARS = 0
+        conversion_executor.CONVERSION_WORKERS = 1
+        with self.assertRaises(ValueError):
+            asyncio.run(chunk_content("text", "pdf"))
+
+
+class TestLoopLagMonitor(unittest.TestCase):
+    """Test suite for event loop lag sampling."""
+
+    def test_blocking_call_shows_as_lag(self):
+        """Holding the loop is recorded as lag."""
+        async def scenario():
+            monitor = LoopLagMonitor(interval=0.01)
+            monitor.start()
+            await asyncio.sleep(0.03)
+            time.sleep(0.1)  # Block the loop
+            await asyncio.sleep(0.03)
+            await monitor.stop()
+            return monitor.stats()
+
+        stats = asyncio.run(scenario())
+        self.assertGreater(stats["samples"], 1)
+        self.assertGreaterEqual(stats["max_ms"], 80)
+
+    def test_empty_stats(self):
+        """Stats are zero before any sample."""
+        self.assertEqual(LoopLagMonitor().stats()["samples"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Unit tests for database pool instrumentation and the idle pre-ping strategy.
+"""
+
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.util import greenlet_spawn
+
+import database
+from database import TimedQueuePool, _install_pool_events
+from metrics import DB_POOL_CHECKED_OUT, DB_POOL_PINGS, DB_POOL_TIMEOUTS, DB_POOL_WAIT_SECONDS
+
+
+class _FakeConnection:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestTimedQueuePool(unittest.TestCase):
+    """Test suite for checkout wait tracking."""
+
+    def test_wait_and_timeout_recorded(self):
+        """Every checkout is timed and pool timeouts are counted."""
+        pool = TimedQueuePool(creator=_FakeConnection, pool_size=1, max_overflow=0, timeout=0.05)
+        waits_before = DB_POOL_WAIT_SECONDS.labels().count
+        timeouts_before = DB_POOL_TIMEOUTS.labels().value
+
+        def saturate():
+            held = pool.connect()
+            with self.assertRaises(exc.TimeoutError):
+                pool.connect()
+            held.close()
+
+        asyncio.run(greenlet_spawn(saturate))
+
+        self.assertEqual(DB_POOL_WAIT_SECONDS.labels().count, waits_before + 2)
+        self.assertEqual(DB_POOL_TIMEOUTS.labels().value, timeouts_before + 1)
+
+
+class TestIdlePrePing(unittest.TestCase):
+    """Test suite for pool events on a throwaway engine."""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://", poolclass=QueuePool, pool_size=1, max_overflow=0)
+        _install_pool_events(self.engine)
+        patcher = mock.patch.object(database, "DB_POOL_PRE_PING", "idle")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.engine.dispose)
+
+    def _checkout_after_idle(self, ping):
+        with self.engine.connect():
+            pass
+        with mock.patch.object(self.engine.dialect, "do_ping", ping), \
+                mock.patch.object(database.time, "monotonic", return_value=time.monotonic() + 3600):
+            with self.engine.connect() as conn:
+                return conn
+
+    def test_fresh_connection_not_pinged(self):
+        """Connections used recently are handed out without a ping."""
+        ping = mock.Mock(return_value=True)
+        with self.engine.connect():
+            pass
+        with mock.patch.object(self.engine.dialect, "do_ping", ping):
+            with self.engine.connect():
+                self.assertEqual(DB_POOL_CHECKED_OUT.labels().value, 1)
+        ping.assert_not_called()
+        self.assertEqual(DB_POOL_CHECKED_OUT.labels().value, 0)
+
+    def test_idle_connection_pinged(self):
+        """Connections idle past the threshold are pinged once."""
+        ping = mock.Mock(return_value=True)
+        ok_before = DB_POOL_PINGS.labels("ok").value
+        self._checkout_after_idle(ping)
+        ping.assert_called_once()
+        self.assertEqual(DB_POOL_PINGS.labels("ok").value, ok_before + 1)
+
+    def test_failed_ping_replaces_connection(self):
+        """A failed ping discards the connection and the pool reconnects."""
+        ping = mock.Mock(side_effect=[ConnectionError("gone"), True])
+        failed_before = DB_POOL_PINGS.labels("failed").value
+        conn = self._checkout_after_idle(ping)
+        self.assertIsNotNone(conn)
+        self.assertEqual(DB_POOL_PINGS.labels("failed").value, failed_before + 1)
+
+    def test_never_strategy_skips_ping(self):
+        """With "never" idle connections are not pinged."""
+        ping = mock.Mock(return_value=True)
+        with mock.patch.object(database, "DB_POOL_PRE_PING", "never"):
+            self._checkout_after_idle(ping)
+        ping.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
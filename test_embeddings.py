@@ -0,0 +1,131 @@
+"""
+Unit tests for batched, cached embeddings.
+"""
+
+import asyncio
+import math
+import unittest
+
+from embeddings import EmbeddingService, HashingEmbedder
+
+try:
+    import fakeredis
+except ImportError:  # optional test dependency
+    fakeredis = None
+
+
+class CountingEmbedder(HashingEmbedder):
+    """Hashing embedder that records each provider call"""
+
+    def __init__(self, fail: bool = False):
+        super().__init__(dim=8)
+        self.calls = []
+        self.fail = fail
+
+    async def embed_many(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise ConnectionError("provider down")
+        return await super().embed_many(texts)
+
+
+def cosine(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+class TestHashingEmbedder(unittest.TestCase):
+    """Test suite for the deterministic fallback embedder"""
+
+    def test_deterministic_and_normalized(self):
+        embedder = HashingEmbedder(dim=256)
+        vector = embedder.embed_one("Do you integrate with HubSpot?")
+        self.assertEqual(len(vector), 256)
+        self.assertEqual(vector, HashingEmbedder(dim=256).embed_one("Do you integrate with HubSpot?"))
+        self.assertAlmostEqual(math.sqrt(sum(v * v for v in vector)), 1.0)
+        self.assertEqual(embedder.embed_one(""), [0.0] * 256)
+
+    def test_shared_words_are_closer(self):
+        embedder = HashingEmbedder(dim=1536)
+        query = embedder.embed_one("Which CRM integrations do you support?")
+        related = embedder.embed_one("We support CRM integrations with Salesforce")
+        unrelated = embedder.embed_one("Our office dog is called Biscuit")
+        self.assertGreater(cosine(query, related), cosine(query, unrelated))
+
+
+class TestBatching(unittest.IsolatedAsyncioTestCase):
+    """Test suite for micro-batching concurrent requests"""
+
+    async def test_concurrent_requests_share_a_call(self):
+        provider = CountingEmbedder()
+        service = EmbeddingService(provider, window=0.01, cache_ttl=0)
+        texts = [f"question {i}" for i in range(20)]
+        vectors = await asyncio.gather(*(service.embed(text) for text in texts))
+        self.assertEqual(len(provider.calls), 1)
+        self.assertEqual(vectors, [provider.embed_one(text) for text in texts])
+
+    async def test_max_batch_and_duplicates(self):
+        provider = CountingEmbedder()
+        service = EmbeddingService(provider, window=10, max_batch=4, cache_ttl=0)
+        # Doesn't wait for the 10s window: full batches go out at once
+        vectors = await asyncio.wait_for(service.embed_many(list("abacdefgh")), 1)
+        self.assertEqual(provider.calls, [list("abcd"), list("efgh")])
+        self.assertIs(vectors[0], vectors[2])
+
+    async def test_throughput_per_path(self):
+        provider = CountingEmbedder()
+        service = EmbeddingService(provider, window=0.01, cache_ttl=0)
+        await service.embed("alone")
+        await service.embed_many(["a", "b", "c"])
+        self.assertEqual(service._throughput["single"][0], 1)
+        self.assertEqual(service._throughput["batched"][0], 3)
+        self.assertEqual(set(service.stats()["provider_embeddings_per_sec"]), {"single", "batched"})
+
+    async def test_lru_hit_skips_provider(self):
+        provider = CountingEmbedder()
+        service = EmbeddingService(provider, window=0, cache_size=2, cache_ttl=0)
+        for text in ("a", "a", "b", "c", "a"):
+            await service.embed(text)
+        self.assertEqual(provider.calls, [["a"], ["b"], ["c"], ["a"]])  # "a" was evicted
+        stats = service.stats()
+        self.assertEqual((stats["requests"], stats["lru"], stats["provider"]), (5, 1, 4))
+
+    async def test_failure_reaches_every_caller(self):
+        service = EmbeddingService(CountingEmbedder(fail=True), window=0.01, cache_ttl=0)
+        results = await asyncio.gather(service.embed("a"), service.embed("b"), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+        self.assertEqual(service.stats()["failed"], 2)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis not installed")
+class TestRedisCache(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the shared Redis cache"""
+
+    async def test_vectors_shared_between_replicas(self):
+        client = fakeredis.FakeRedis()
+        first, second = CountingEmbedder(), CountingEmbedder()
+        await EmbeddingService(first, window=0, client=client).embed_many(["pricing", "onboarding"])
+
+        replica = EmbeddingService(second, window=0, client=client)
+        vectors = await replica.embed_many(["pricing", "support"])
+        self.assertEqual(second.calls, [["support"]])
+        self.assertEqual(replica.stats()["redis"], 1)
+        # Stored as float32
+        for cached, exact in zip(vectors[0], first.embed_one("pricing")):
+            self.assertAlmostEqual(cached, exact, places=6)
+        self.assertTrue(all(0 < ttl <= replica.cache_ttl for ttl in map(client.ttl, client.keys("embedding:*"))))
+
+    async def test_redis_errors_fall_through(self):
+        class Broken:
+            def mget(self, keys):
+                raise ConnectionError("redis down")
+
+            def pipeline(self, transaction=True):
+                raise ConnectionError("redis down")
+
+        provider = CountingEmbedder()
+        service = EmbeddingService(provider, window=0, client=Broken())
+        self.assertEqual(await service.embed("pricing"), provider.embed_one("pricing"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Unit tests for worker sizing in the launcher.
+"""
+
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+import launcher
+from launcher import per_worker_defaults, startup_done, worker_count
+
+
+class TestWorkerCount(unittest.TestCase):
+    """Test suite for MAX_WORKERS"""
+
+    def test_explicit(self):
+        self.assertEqual(worker_count("3"), 3)
+        self.assertEqual(worker_count("0"), 1)
+
+    def test_auto_and_invalid_use_cpus(self):
+        with mock.patch.object(launcher, "usable_cpus", return_value=6):
+            self.assertEqual(worker_count("auto"), 6)
+            self.assertEqual(worker_count(""), 6)
+            self.assertEqual(worker_count("lots"), 6)
+
+    def test_cgroup_quota_caps_cpus(self):
+        """A 1.5 CPU quota on an 8 CPU host gives 2 workers"""
+        opener = mock.mock_open(read_data="150000 100000\n")
+        with mock.patch.object(launcher.os, "sched_getaffinity", return_value=set(range(8)), create=True), \
+                mock.patch("builtins.open", opener):
+            self.assertEqual(launcher.usable_cpus(), 2)
+
+    def test_unlimited_cgroup(self):
+        opener = mock.mock_open(read_data="max 100000\n")
+        with mock.patch.object(launcher.os, "sched_getaffinity", return_value=set(range(4)), create=True), \
+                mock.patch("builtins.open", opener):
+            self.assertEqual(launcher.usable_cpus(), 4)
+
+
+class TestPerWorkerDefaults(unittest.TestCase):
+    """Test suite for dividing per-process resources"""
+
+    def test_totals_stay_close_to_one_worker(self):
+        defaults = per_worker_defaults(4, cpus=4)
+        self.assertEqual(defaults, {"DB_POOL_SIZE": "2", "DB_MAX_OVERFLOW": "3", "CONVERSION_WORKERS": "1"})
+
+    def test_minimums(self):
+        defaults = per_worker_defaults(16, cpus=8)
+        self.assertEqual(defaults["DB_POOL_SIZE"], "2")
+        self.assertEqual(defaults["CONVERSION_WORKERS"], "1")
+
+    def test_connection_totals(self):
+        """Floors make totals grow past 4 workers; max_connections reports it"""
+        self.assertEqual(launcher.max_connections(1, {}), 15)
+        self.assertEqual(launcher.max_connections(4, per_worker_defaults(4, cpus=4)), 20)
+        self.assertEqual(launcher.max_connections(16, per_worker_defaults(16, cpus=8)), 64)
+        self.assertEqual(launcher.max_connections(16, {"DB_POOL_SIZE": "1", "DB_MAX_OVERFLOW": "0"}), 16)
+
+    def test_worker_labels(self):
+        """Only workers started alongside others label their metrics"""
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(launcher.worker_labels(), {})
+        with mock.patch.dict(os.environ, {launcher.WORKERS_ENV: "4"}):
+            self.assertEqual(launcher.worker_labels(), {"worker": str(os.getpid())})
+
+    def test_startup_done_flag(self):
+        with mock.patch.dict(os.environ, {launcher.STARTUP_DONE_ENV: "1"}):
+            self.assertTrue(startup_done())
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertFalse(startup_done())
+
+
+class TestStartupTasks(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the launcher's one-time startup work"""
+
+    def _patch(self, init_db):
+        import database
+        import qdrant_service
+
+        for patcher in (
+            mock.patch.object(database, "init_db", init_db),
+            mock.patch.object(database, "close_db", mock.AsyncMock()),
+            mock.patch.object(qdrant_service, "QDRANT_URL", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_success(self):
+        self._patch(mock.AsyncMock(return_value=True))
+        self.assertTrue(await launcher.run_startup_tasks())
+
+    async def test_failed_or_slow_schema_setup(self):
+        """Workers must retry schema setup that failed or hung"""
+        self._patch(mock.AsyncMock(return_value=False))
+        self.assertFalse(await launcher.run_startup_tasks())
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        self._patch(hang)
+        self.assertFalse(await asyncio.wait_for(launcher.run_startup_tasks(step_timeout=0.05), 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+"""
+Unit tests for model routing and per-route accounting.
+"""
+
+import json
+import unittest
+from unittest import mock
+
+import httpx
+
+import llm_client
+from circuit_breaker import CircuitBreaker
+from llm_client import ROUTES, parse_prices, request_cost, route_request
+
+
+class TestRouteRequest(unittest.TestCase):
+    """Test suite for picking a route per turn"""
+
+    def test_early_stages_short_messages_are_light(self):
+        self.assertEqual(route_request("greeting", "hi there").name, "light")
+        self.assertEqual(route_request("discovery", "We sell shoes").name, "light")
+        self.assertEqual(route_request(None, "hello").name, "light")
+
+    def test_later_stages_and_long_messages_are_full(self):
+        for stage in ("qualification", "pitch", "objection_handling", "closing"):
+            with self.subTest(stage=stage):
+                self.assertEqual(route_request(stage, "ok").name, "full")
+        long_message = "x" * (llm_client.LLM_LIGHT_MAX_MESSAGE_CHARS + 1)
+        self.assertEqual(route_request("discovery", long_message).name, "full")
+
+    def test_test_mode_and_routing_off(self):
+        self.assertEqual(route_request("greeting", "hi", test_mode=True).name, "test")
+        with mock.patch.object(llm_client, "LLM_ROUTING", False):
+            self.assertEqual(route_request("greeting", "hi").name, "full")
+
+
+class TestCost(unittest.TestCase):
+    """Test suite for prices and cost"""
+
+    def test_parse_prices(self):
+        prices = parse_prices("a=1/2, b = 0.5/1.5,bad,c=x/y")
+        self.assertEqual(prices, {"a": (1.0, 2.0), "b": (0.5, 1.5)})
+
+    def test_request_cost(self):
+        with mock.patch.object(llm_client, "_PRICES", {"m": (1.0, 4.0)}):
+            self.assertAlmostEqual(request_cost("m", 1_000_000, 500_000), 3.0)
+            self.assertIsNone(request_cost("unpriced", 10, 10))
+
+
+class TestAccounting(unittest.IsolatedAsyncioTestCase):
+    """Test suite for routed calls through a stub gateway"""
+
+    def setUp(self):
+        self.payloads = []
+
+        def gateway(request):
+            payload = json.loads(request.content)
+            self.payloads.append(payload)
+            if "usage" in payload["messages"][-1]["content"]:
+                return httpx.Response(200, json={
+                    "content": "Sure!", "usage": {"prompt_tokens": 1000, "completion_tokens": 200}
+                })
+            return httpx.Response(200, json={"content": "x" * 400})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(gateway))
+        self.addAsyncCleanup(client.aclose)
+        routes = dict(ROUTES, light=llm_client.Route("light", "cheap", 300),
+                      full=llm_client.Route("full", "big", 3000))
+        for patcher in (
+            mock.patch.object(llm_client, "LLM_GATEWAY_URL", "http://gateway"),
+            mock.patch.object(llm_client, "_http_client", client),
+            mock.patch.object(llm_client, "gateway_breaker", CircuitBreaker("test_routing")),
+            mock.patch.object(llm_client, "ROUTES", routes),
+            mock.patch.object(llm_client, "_PRICES", {"cheap": (1.0, 2.0), "big": (10.0, 20.0)}),
+            mock.patch.object(llm_client, "_route_totals", {}),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_routes_pick_model_and_budget(self):
+        await llm_client.get_sales_response([], "hi, usage please", context={"stage": "greeting"})
+        await llm_client.get_sales_response([], "what does it cost?", context={"stage": "pitch"})
+        self.assertEqual([(p["model"], p["max_tokens"]) for p in self.payloads], [("cheap", 300), ("big", 3000)])
+
+        routes = llm_client.route_stats()["routes"]
+        light, full = routes["light"], routes["full"]
+        # Reported usage is used as is
+        self.assertEqual((light["requests"], light["prompt_tokens"], light["completion_tokens"]), (1, 1000, 200))
+        self.assertAlmostEqual(light["cost_usd"], (1000 * 1.0 + 200 * 2.0) / 1_000_000)
+        # Without usage, tokens are estimated from the text
+        self.assertEqual(full["completion_tokens"], 100)
+        self.assertGreater(full["prompt_tokens"], 0)
+        self.assertGreater(full["cost_usd"], light["cost_usd"])
+
+    async def test_failures_counted(self):
+        with mock.patch.object(llm_client, "LLM_GATEWAY_URL", "http://gateway"), \
+                mock.patch.object(llm_client, "_generate", side_effect=httpx.ConnectError("down")):
+            self.assertIsNone(await llm_client.get_ai_response([], model="big", route="full"))
+        full = llm_client.route_stats()["routes"]["full"]
+        self.assertEqual((full["requests"], full["failed"], full["cost_usd"]), (1, 1, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
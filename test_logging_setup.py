@@ -0,0 +1,160 @@
+"""
+Unit tests for structured, queue-based logging.
+"""
+
+import io
+import json
+import logging
+import threading
+import unittest
+
+import logging_setup
+from metrics import LOG_RECORDS_DROPPED
+from logging_setup import (
+    JSONFormatter,
+    NonBlockingQueueHandler,
+    SamplingFilter,
+    configure_logging,
+    parse_sample_rates,
+    stop_logging,
+)
+
+
+def _record(name="main", level=logging.INFO, msg="hello %s", args=("world",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+class TestFormatting(unittest.TestCase):
+    """Test suite for the JSON formatter."""
+
+    def test_json_fields(self):
+        """Records become one JSON object with extra fields at the top level."""
+        record = _record()
+        record.session_id = "abc"
+        entry = json.loads(JSONFormatter().format(record))
+
+        self.assertEqual(entry["message"], "hello world")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "main")
+        self.assertEqual(entry["session_id"], "abc")
+        self.assertIn("ts", entry)
+
+    def test_json_exception(self):
+        """Exceptions are included as formatted text."""
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord("main", logging.ERROR, __file__, 1, "failed", (), True)
+            record.exc_info = __import__("sys").exc_info()
+        entry = json.loads(JSONFormatter().format(record))
+        self.assertIn("ValueError: boom", entry["exc_info"])
+
+
+class TestSampling(unittest.TestCase):
+    """Test suite for per-module sampling."""
+
+    def test_parse_rates(self):
+        """Rates are parsed, clamped and malformed entries skipped."""
+        self.assertEqual(
+            parse_sample_rates("redis_client=0.01, main=2,bad,x=y"),
+            {"redis_client": 0.01, "main": 1.0}
+        )
+
+    def test_rates_by_prefix(self):
+        """The most specific configured logger prefix wins."""
+        sampler = SamplingFilter({"main": 0.0, "main.ws": 1.0})
+        self.assertFalse(sampler.filter(_record("main")))
+        self.assertFalse(sampler.filter(_record("main.db")))
+        self.assertTrue(sampler.filter(_record("main.ws.frames")))
+        self.assertTrue(sampler.filter(_record("redis_client")))
+
+    def test_warnings_not_sampled(self):
+        """WARNING and above always pass."""
+        sampler = SamplingFilter({"main": 0.0})
+        self.assertTrue(sampler.filter(_record("main", logging.WARNING)))
+
+    def test_partial_rate(self):
+        """A fractional rate keeps roughly that share of records."""
+        sampler = SamplingFilter({"redis_client": 0.1})
+        kept = sum(sampler.filter(_record("redis_client")) for _ in range(5000))
+        self.assertGreater(kept, 300)
+        self.assertLess(kept, 700)
+
+
+class TestQueueLogging(unittest.TestCase):
+    """Test suite for the queue handler and writer thread."""
+
+    def setUp(self):
+        root = logging.getLogger()
+        self._handlers = list(root.handlers)
+        self._level = root.level
+
+    def tearDown(self):
+        stop_logging()
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in self._handlers:
+            root.addHandler(handler)
+        root.setLevel(self._level)
+
+    def test_formatting_happens_off_the_caller_thread(self):
+        """Arguments are formatted by the writer thread, not the logging call."""
+        formatted_in = []
+
+        class Probe:
+            def __str__(self):
+                formatted_in.append(threading.current_thread())
+                return "probe"
+
+        output = io.StringIO()
+        configure_logging(level="INFO", fmt="text", sample_rates="", stream=output)
+        logging.getLogger("test.queue").info("value=%s", Probe())
+        stop_logging()
+
+        self.assertEqual(output.getvalue(), "INFO:test.queue:value=probe\n")
+        self.assertEqual(len(formatted_in), 1)
+        self.assertIsNot(formatted_in[0], threading.current_thread())
+
+    def test_sampling_applied(self):
+        """Configured sampling drops records before they are queued."""
+        output = io.StringIO()
+        configure_logging(level="DEBUG", fmt="json", sample_rates="noisy=0", stream=output)
+        logging.getLogger("noisy").debug("dropped")
+        logging.getLogger("noisy").warning("kept")
+        logging.getLogger("quiet").info("kept too")
+        stop_logging()
+
+        messages = [json.loads(line)["message"] for line in output.getvalue().splitlines()]
+        self.assertEqual(messages, ["kept", "kept too"])
+
+    def test_full_queue_drops(self):
+        """A full queue drops records instead of blocking."""
+        handler = NonBlockingQueueHandler(__import__("queue").Queue(maxsize=1))
+        handler.handle(_record())
+        handler.handle(_record())
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.qsize(), 1)
+
+    def test_drops_exposed(self):
+        """Dropped records show in stats() and the metrics counter."""
+        before = LOG_RECORDS_DROPPED.labels().value
+        handler = configure_logging(stream=io.StringIO())
+        self.addCleanup(stop_logging)
+        handler.queue = __import__("queue").Queue(maxsize=1)
+        handler.handle(_record())
+        handler.handle(_record())
+        self.assertEqual(logging_setup.stats(), {"queued": 1, "dropped": 1})
+        self.assertEqual(LOG_RECORDS_DROPPED.labels().value, before + 1)
+
+    def test_reconfigure_stops_previous_listener(self):
+        """Calling configure_logging twice leaves a single writer."""
+        configure_logging(stream=io.StringIO())
+        first = logging_setup._listener
+        configure_logging(stream=io.StringIO())
+        self.assertIsNot(logging_setup._listener, first)
+        self.assertEqual(len(logging.getLogger().handlers), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
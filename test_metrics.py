@@ -0,0 +1,122 @@
+"""
+Unit tests for the in-process metrics and Prometheus text rendering.
+"""
+
+import time
+import unittest
+
+from metrics import Counter, Gauge, Histogram, Registry, RequestSpans, STREAM_STAGE_SECONDS
+
+
+class TestMetrics(unittest.TestCase):
+    """Test suite for counters, gauges and histograms."""
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        """Counters render per label set and refuse to go down."""
+        requests = self.registry.register(Counter("requests_total", "Requests", ["outcome"]))
+        requests.labels("ok").inc()
+        requests.labels("ok").inc(2)
+        requests.labels("failed").inc()
+
+        output = self.registry.render()
+        self.assertIn("# TYPE requests_total counter", output)
+        self.assertIn('requests_total{outcome="ok"} 3', output)
+        self.assertIn('requests_total{outcome="failed"} 1', output)
+
+        with self.assertRaises(ValueError):
+            Counter("c", "c").inc(-1)
+
+    def test_const_labels(self):
+        """Labels passed to render() are added to every sample."""
+        requests = self.registry.register(Counter("requests_total", "Requests", ["outcome"]))
+        latency = self.registry.register(Histogram("latency_seconds", "Latency", buckets=(0.1,)))
+        requests.labels("ok").inc()
+        latency.observe(0.05)
+
+        output = self.registry.render({"worker": "42"})
+        self.assertIn('requests_total{worker="42",outcome="ok"} 1', output)
+        self.assertIn('latency_seconds_bucket{worker="42",le="0.1"} 1', output)
+        self.assertIn('latency_seconds_count{worker="42"} 1', output)
+
+    def test_labels_required(self):
+        """Labelled metrics must be used through labels()."""
+        requests = Counter("requests_total", "Requests", ["outcome"])
+        with self.assertRaises(ValueError):
+            requests.inc()
+        with self.assertRaises(ValueError):
+            requests.labels("ok", "extra")
+
+    def test_gauge(self):
+        """Gauges go up and down."""
+        connections = self.registry.register(Gauge("connections", "Open connections"))
+        connections.inc()
+        connections.inc()
+        connections.dec()
+        self.assertIn("connections 1\n", self.registry.render())
+
+    def test_histogram_buckets(self):
+        """Buckets are cumulative with le semantics, plus sum and count."""
+        latency = self.registry.register(Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)))
+        for value in (0.05, 0.1, 0.5, 5.0):
+            latency.observe(value)
+
+        output = self.registry.render()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 2', output)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', output)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', output)
+        self.assertIn("latency_seconds_sum 5.65", output)
+        self.assertIn("latency_seconds_count 4", output)
+
+    def test_histogram_memory_is_bounded(self):
+        """Observations only touch the fixed bucket counts."""
+        latency = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+        for i in range(10_000):
+            latency.observe(i / 1000)
+        child = latency.labels()
+        self.assertEqual(len(child.counts), 3)
+        self.assertEqual(child.count, 10_000)
+
+    def test_label_values_are_escaped(self):
+        """Quotes, backslashes and newlines in label values are escaped."""
+        errors = self.registry.register(Counter("errors_total", "Errors", ["message"]))
+        errors.labels('bad "quote"\\\n').inc()
+        self.assertIn('errors_total{message="bad \\"quote\\"\\\\\\n"} 1', self.registry.render())
+
+    def test_duplicate_registration(self):
+        """A metric name can only be registered once."""
+        self.registry.register(Counter("requests_total", "Requests"))
+        with self.assertRaises(ValueError):
+            self.registry.register(Counter("requests_total", "Requests"))
+
+
+class TestRequestSpans(unittest.TestCase):
+    """Test suite for per-request stage timings."""
+
+    def test_span_records_stage(self):
+        """Spans accumulate locally and feed the stage histogram."""
+        before = STREAM_STAGE_SECONDS.labels("test_stage").count
+        spans = RequestSpans()
+        with spans.span("test_stage"):
+            time.sleep(0.01)
+        spans.add("send", 0.002)
+        spans.add("send", 0.003)
+
+        self.assertGreaterEqual(spans.stages["test_stage"], 0.01)
+        self.assertAlmostEqual(spans.stages["send"], 0.005)
+        self.assertEqual(STREAM_STAGE_SECONDS.labels("test_stage").count, before + 1)
+        self.assertIn("send=5.0ms", spans.summary())
+
+    def test_mark_is_set_once(self):
+        """mark() keeps the first offset."""
+        spans = RequestSpans()
+        self.assertTrue(spans.mark("first_frame"))
+        first = spans.stages["first_frame"]
+        self.assertFalse(spans.mark("first_frame"))
+        self.assertEqual(spans.stages["first_frame"], first)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+Unit tests for the cache-friendly prompt layout.
+"""
+
+import json
+import unittest
+from unittest import mock
+
+import httpx
+
+import llm_client
+from circuit_breaker import CircuitBreaker
+from llm_client import SALES_SYSTEM_PROMPT, TEST_MODE_SYSTEM_PROMPT, build_prompt
+
+CONTEXT = {"name": "Ada", "company": "Acme", "email": "ada@acme.test", "stage": "discovery"}
+
+
+class TestBuildPrompt(unittest.TestCase):
+    """Test suite for prompt assembly"""
+
+    def test_system_message_is_reused(self):
+        first = build_prompt([{"role": "user", "content": "hi"}])
+        second = build_prompt([{"role": "user", "content": "hello"}])
+        self.assertIs(first.messages[0], second.messages[0])
+        self.assertEqual(first.messages[0]["content"], SALES_SYSTEM_PROMPT)
+        self.assertEqual(build_prompt([], test_mode=True).messages[0]["content"], TEST_MODE_SYSTEM_PROMPT)
+
+    def test_prefix_is_stable_across_turns(self):
+        turn1 = [{"role": "user", "content": "hi"}]
+        turn2 = turn1 + [{"role": "assistant", "content": "Hello!"}, {"role": "user", "content": "pricing?"}]
+        first = build_prompt(turn1, context=CONTEXT)
+        second = build_prompt(turn2, context=dict(CONTEXT, stage="pitch"))
+
+        self.assertEqual(first.prefix_messages, 2)
+        self.assertEqual(first.cache_key, second.cache_key)
+        encoded = json.dumps(first.messages)[:-1]
+        self.assertTrue(json.dumps(second.messages).startswith(encoded))
+
+    def test_context_in_prefix(self):
+        prompt = build_prompt([], context=CONTEXT)
+        self.assertEqual(prompt.messages[1], {"role": "system", "content": "Lead context:\nName: Ada\nCompany: Acme"})
+        self.assertNotIn("ada@acme.test", json.dumps(prompt.messages))
+        self.assertEqual(build_prompt([], context={"stage": "greeting"}).prefix_messages, 1)
+
+    def test_cache_key_per_prefix(self):
+        keys = {
+            build_prompt([]).cache_key,
+            build_prompt([], test_mode=True).cache_key,
+            build_prompt([], context=CONTEXT).cache_key,
+            build_prompt([], context=dict(CONTEXT, company="Other")).cache_key,
+        }
+        self.assertEqual(len(keys), 4)
+
+
+class TestPayload(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the gateway payload"""
+
+    def setUp(self):
+        self.bodies = []
+
+        def gateway(request):
+            self.bodies.append(request.content)
+            return httpx.Response(200, json={"content": "ok"})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(gateway))
+        self.addAsyncCleanup(client.aclose)
+        for patcher in (
+            mock.patch.object(llm_client, "LLM_GATEWAY_URL", "http://gateway"),
+            mock.patch.object(llm_client, "_http_client", client),
+            mock.patch.object(llm_client, "gateway_breaker", CircuitBreaker("test_prompt")),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_cache_hints(self):
+        await llm_client.get_sales_response([], "hi", context=CONTEXT)
+        payload = json.loads(self.bodies[0])
+        self.assertEqual(payload["prompt_cache"], {
+            "key": build_prompt([], context=CONTEXT).cache_key, "prefix_messages": 2
+        })
+        self.assertEqual(payload["messages"][-1], {"role": "user", "content": "hi"})
+
+        with mock.patch.object(llm_client, "LLM_PROMPT_CACHE_HINTS", False):
+            await llm_client.get_sales_response([], "hi", context=CONTEXT)
+        self.assertNotIn("prompt_cache", json.loads(self.bodies[1]))
+
+
+if __name__ == "__main__":
+    unittest.main()
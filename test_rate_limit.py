@@ -0,0 +1,210 @@
+"""
+Unit tests for the shared rate limiter.
+"""
+
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import rate_limit
+from rate_limit import Limit, RateLimiter, client_identity, parse_limit
+
+try:
+    import fakeredis
+    import lupa  # noqa: F401 - fakeredis needs it for EVAL
+except ImportError:
+    fakeredis = None
+
+
+class _ScriptClient:
+    """Stands in for Redis: grants whatever is asked for until `budget` runs out"""
+
+    def __init__(self, budget, delay=0.0):
+        self.budget = budget
+        self.delay = delay
+        self.calls = 0
+        self.returned = 0.0
+
+    def register_script(self, script):
+        return self._run
+
+    def _run(self, keys, args):
+        self.calls += 1
+        self.returned += sum(args[5::4])
+        time.sleep(self.delay)
+        cost = args[1]
+        if self.budget < cost:
+            return [2000, 0] + [0] * len(keys)
+        wants = args[4::4]
+        grant = min(wants[0], self.budget)
+        self.budget -= grant
+        return [0, 0] + [grant] * len(keys)
+
+
+class TestParseLimit(unittest.TestCase):
+    """Test suite for limit settings"""
+
+    def test_formats(self):
+        self.assertEqual(parse_limit("100/h"), Limit(100, 3600))
+        self.assertEqual(parse_limit("30/m"), Limit(30, 60))
+        self.assertEqual(parse_limit("5/0.5"), Limit(5, 0.5))
+        for spec in ("", "0", "off", None):
+            self.assertIsNone(parse_limit(spec))
+
+    def test_invalid(self):
+        for spec in ("100", "x/m", "-1/m", "10/0"):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_limit(spec)
+
+
+class TestLocalBuckets(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the in-process fallback used without Redis"""
+
+    def setUp(self):
+        patcher = mock.patch.object(rate_limit, "get_redis", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_limits_each_scope(self):
+        """The first exhausted bucket rejects, and a rejection spends nothing"""
+        limiter = RateLimiter({"session": Limit(2, 3600), "ip": Limit(3, 3600)}, enabled=True)
+        self.assertTrue((await limiter.check(session="a", ip="1.1.1.1")).allowed)
+        self.assertTrue((await limiter.check(session="a", ip="1.1.1.1")).allowed)
+
+        decision = await limiter.check(session="a", ip="1.1.1.1")
+        self.assertFalse(decision.allowed)
+        self.assertEqual(decision.scope, "session")
+        self.assertAlmostEqual(decision.retry_after, 1800, delta=1)
+        self.assertEqual(decision.retry_after_header, "1800")
+
+        # The rejected request did not spend the IP's last token
+        self.assertTrue((await limiter.check(session="b", ip="1.1.1.1")).allowed)
+        decision = await limiter.check(session="c", ip="1.1.1.1")
+        self.assertEqual(decision.scope, "ip")
+
+    async def test_unlimited_identities_pass(self):
+        """Missing identities, unlimited scopes and a disabled limiter allow everything"""
+        limiter = RateLimiter({"session": Limit(1, 60)}, enabled=True)
+        for _ in range(3):
+            self.assertTrue((await limiter.check(session=None, api_key="k")).allowed)
+        disabled = RateLimiter({"session": Limit(1, 60)}, enabled=False)
+        for _ in range(3):
+            self.assertTrue((await disabled.check(session="a")).allowed)
+
+    async def test_idle_buckets_pruned(self):
+        """Local state stays bounded"""
+        limiter = RateLimiter({"ip": Limit(10, 60)}, enabled=True, max_local_keys=4)
+        for i in range(20):
+            await limiter.check(ip=f"10.0.0.{i}")
+        self.assertLessEqual(len(limiter._buckets), 4)
+
+
+class TestLeases(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the local lease fast path"""
+
+    async def test_lease_spent_locally(self):
+        """One Redis call leases several tokens; requests beyond the budget are rejected"""
+        client = _ScriptClient(budget=10)
+        limiter = RateLimiter({"ip": Limit(100, 60)}, client=client, lease=0.05, enabled=True)
+        results = [(await limiter.check(ip="1.1.1.1")).allowed for _ in range(12)]
+        self.assertEqual(results, [True] * 10 + [False] * 2)
+        # One token while the key is cold, leases of 5 and 4 once it is hot,
+        # then two rejections
+        self.assertEqual(client.calls, 5)
+
+    async def test_lease_expires(self):
+        """Leases end after lease_seconds"""
+        client = _ScriptClient(budget=100)
+        limiter = RateLimiter({"ip": Limit(100, 60)}, client=client, lease=0.05, lease_seconds=30, enabled=True)
+        await limiter.check(ip="1.1.1.1")
+        with mock.patch.object(rate_limit.time, "monotonic", return_value=rate_limit.time.monotonic() + 31):
+            await limiter.check(ip="1.1.1.1")
+        self.assertEqual(client.calls, 2)
+
+    async def test_expired_lease_returned_once(self):
+        """Concurrent checks on an expired lease hand its unspent tokens back once"""
+        client = _ScriptClient(budget=1000, delay=0.05)
+        limiter = RateLimiter({"ip": Limit(100, 60)}, client=client, lease=0.5, lease_seconds=30, enabled=True)
+        await limiter.check(ip="1.1.1.1")  # cold: one token
+        await limiter.check(ip="1.1.1.1")  # hot: a lease of 50, one spent
+        self.assertEqual(limiter._leases[limiter._key("ip", "1.1.1.1")].tokens, 49)
+        with mock.patch.object(rate_limit.time, "monotonic", return_value=rate_limit.time.monotonic() + 31):
+            results = await asyncio.gather(*(limiter.check(ip="1.1.1.1") for _ in range(5)))
+        self.assertTrue(all(result.allowed for result in results))
+        self.assertEqual(client.returned, 49)
+
+    async def test_redis_error_falls_back_to_local(self):
+        """A failing Redis call is answered from local buckets"""
+        client = mock.Mock()
+        client.register_script.return_value = mock.Mock(side_effect=ConnectionError("down"))
+        limiter = RateLimiter({"ip": Limit(1, 60)}, client=client, enabled=True)
+        self.assertTrue((await limiter.check(ip="1.1.1.1")).allowed)
+        self.assertFalse((await limiter.check(ip="1.1.1.1")).allowed)
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis with lupa is not installed")
+class TestRedisScript(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the Lua token bucket"""
+
+    async def asyncSetUp(self):
+        self.redis = fakeredis.FakeRedis()
+
+    def _limiter(self, **kwargs):
+        return RateLimiter({"session": Limit(3, 60), "ip": Limit(5, 60)}, client=self.redis, enabled=True, **kwargs)
+
+    async def test_shared_between_limiters(self):
+        """Two processes (limiters) draw from the same buckets"""
+        first, second = self._limiter(lease=0), self._limiter(lease=0)
+        allowed = [(await limiter.check(session="a", ip="1.1.1.1")).allowed for limiter in (first, second, first, second)]
+        self.assertEqual(allowed, [True, True, True, False])
+
+        tokens = float(self.redis.hget("ratelimit:ip:1.1.1.1", "tokens"))
+        self.assertAlmostEqual(tokens, 2, delta=0.01)
+        self.assertGreater(self.redis.pttl("ratelimit:session:a"), 0)
+
+    async def test_sparse_requests_get_full_limit(self):
+        """Requests spaced wider than the lease don't lose leased tokens"""
+        limiter = RateLimiter({"session": Limit(20, 3600)}, client=self.redis, lease=0.5, lease_seconds=0.01,
+                              enabled=True)
+        allowed = 0
+        for i in range(30):
+            if i % 3 == 0:
+                await asyncio.sleep(0.02)  # bursts of three, then the lease expires
+            allowed += (await limiter.check(session="a")).allowed
+        self.assertEqual(allowed, 20)
+
+    async def test_api_key_is_hashed(self):
+        """API keys never appear in Redis keys"""
+        limiter = RateLimiter({"api_key": Limit(5, 60)}, client=self.redis, enabled=True)
+        await limiter.check(api_key="secret-key")
+        keys = [key.decode() for key in self.redis.keys("ratelimit:*")]
+        self.assertEqual(len(keys), 1)
+        self.assertNotIn("secret-key", keys[0])
+
+    async def test_session_start_shared(self):
+        """A reconnect sees the first connection's start time"""
+        limiter = self._limiter()
+        started = await limiter.session_started("a")
+        with mock.patch.object(rate_limit.time, "time", return_value=started + 100):
+            self.assertEqual(await limiter.session_started("a"), started)
+
+
+class TestClientIdentity(unittest.TestCase):
+    """Test suite for identifying callers"""
+
+    def test_api_key_headers(self):
+        client = SimpleNamespace(host="10.1.2.3")
+        self.assertEqual(
+            client_identity(SimpleNamespace(headers={"x-api-key": "k1"}, client=client)),
+            {"ip": "10.1.2.3", "api_key": "k1"}
+        )
+        self.assertEqual(
+            client_identity(SimpleNamespace(headers={"authorization": "Bearer k2"}, client=None)),
+            {"ip": None, "api_key": "k2"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
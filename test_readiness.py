@@ -0,0 +1,92 @@
+"""
+Unit tests for cached dependency probes.
+"""
+
+import asyncio
+import unittest
+
+import httpx
+
+from readiness import DependencyProber, _check_http
+
+
+async def up(http):
+    return True
+
+
+async def unconfigured(http):
+    return None
+
+
+async def refused(http):
+    raise ConnectionError("refused")
+
+
+async def hang(http):
+    await asyncio.sleep(10)
+
+
+class TestProbe(unittest.IsolatedAsyncioTestCase):
+    """Test suite for single probes and readiness"""
+
+    async def test_results(self):
+        prober = DependencyProber(
+            {"db": up, "cache": refused, "search": unconfigured, "gateway": hang},
+            timeout=0.05, required=["db", "gateway"], http=object()
+        )
+        self.assertFalse(prober.ready)
+
+        for name in prober.checks:
+            await prober.probe(name)
+        results = prober.report()["dependencies"]
+        self.assertEqual(results["db"]["status"], "up")
+        self.assertEqual(results["cache"]["status"], "down")
+        self.assertIn("refused", results["cache"]["error"])
+        self.assertEqual(results["search"]["status"], "unconfigured")
+        self.assertEqual(results["gateway"]["status"], "down")
+        self.assertIn("no answer", results["gateway"]["error"])
+        self.assertLess(results["gateway"]["latency_ms"], 1000)
+        self.assertFalse(prober.ready)
+
+        prober.checks["gateway"] = up
+        await prober.probe("gateway")
+        # Optional dependencies being down doesn't make the replica unready
+        self.assertTrue(prober.ready)
+
+    async def test_backoff_while_down(self):
+        prober = DependencyProber({"db": refused}, interval=10, max_interval=60, http=object())
+        delays = []
+        for _ in range(4):
+            delays.append(prober.next_delay(await prober.probe("db")))
+        self.assertEqual(prober.results["db"]["failures"], 4)
+        self.assertTrue(16 <= delays[0] <= 24)
+        self.assertTrue(48 <= delays[-1] <= 72)
+
+        prober.checks["db"] = up
+        self.assertLessEqual(prober.next_delay(await prober.probe("db")), 12)
+
+    async def test_loops_fill_cache(self):
+        prober = DependencyProber({"db": up, "cache": hang}, interval=0.01, timeout=0.05,
+                                  required=["db"], http=object())
+        prober.start()
+        await asyncio.sleep(0.02)
+        # A hanging dependency does not hold up the others
+        self.assertTrue(prober.ready)
+        await prober.stop()
+
+
+class TestHttpCheck(unittest.IsolatedAsyncioTestCase):
+    """Test suite for gateway and MCP probes"""
+
+    async def test_status_codes(self):
+        codes = iter([404, 503])
+        transport = httpx.MockTransport(lambda request: httpx.Response(next(codes)))
+        async with httpx.AsyncClient(transport=transport) as http:
+            self.assertTrue(await _check_http(http, "http://gateway/"))
+            with self.assertRaises(ConnectionError):
+                await _check_http(http, "http://gateway")
+            self.assertIsNone(await _check_http(http, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
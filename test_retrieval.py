@@ -0,0 +1,159 @@
+"""
+Unit tests for knowledge retrieval.
+"""
+
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+import httpx
+
+import llm_client
+import retrieval
+from embeddings import EmbeddingService, GatewayEmbedder
+from llm_client import build_prompt
+from retrieval import needs_retrieval, select_snippets, start_retrieval
+
+
+class TestIntent(unittest.TestCase):
+    """Test suite for the cheap intent check"""
+
+    def test_skips_small_talk(self):
+        for message in ("hi", "Hello there!", "thanks so much", "ok", "yes", "__GREETING__|USER:Ada", "  "):
+            with self.subTest(message=message):
+                self.assertFalse(needs_retrieval(message))
+
+    def test_questions_and_statements(self):
+        for message in ("Pricing?", "Do you integrate with Salesforce?", "We need better lead scoring"):
+            with self.subTest(message=message):
+                self.assertTrue(needs_retrieval(message))
+
+
+class TestSelectSnippets(unittest.TestCase):
+    """Test suite for packing snippets into the token budget"""
+
+    def test_score_budget_and_duplicates(self):
+        results = [
+            {"content": "a" * 400, "score": 0.9},   # 100 tokens
+            {"content": "a" * 400, "score": 0.8},   # duplicate
+            {"content": "b" * 2000, "score": 0.85},  # 500 tokens, over budget
+            {"content": "c" * 200, "score": 0.5},
+            {"content": "d" * 40, "score": 0.1},    # below min score
+        ]
+        selected = select_snippets(results, top_k=4, min_score=0.3, token_budget=300)
+        self.assertEqual([s["content"][0] for s in selected], ["a", "c"])
+
+    def test_top_k(self):
+        results = [{"content": f"snippet {i}", "score": 0.9 - i / 100} for i in range(10)]
+        self.assertEqual(len(select_snippets(results, top_k=3)), 3)
+
+
+class TestRetrieval(unittest.IsolatedAsyncioTestCase):
+    """Test suite for background retrieval"""
+
+    def use_gateway(self, vector=(0.1, 0.2)):
+        self.embedded = []
+
+        def gateway(request):
+            self.embedded.extend(json.loads(request.content)["input"])
+            return httpx.Response(200, json={"data": [{"embedding": list(vector)}]})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(gateway))
+        self.addAsyncCleanup(client.aclose)
+        for patcher in (
+            mock.patch.object(llm_client, "LLM_GATEWAY_URL", "http://gateway"),
+            mock.patch.object(llm_client, "_http_client", client),
+            mock.patch.object(retrieval, "embedding_service", EmbeddingService(GatewayEmbedder(), cache_ttl=0)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_snippets_in_knowledge(self):
+        self.use_gateway()
+        search = mock.AsyncMock(return_value=[{"content": "We integrate with Salesforce and HubSpot.", "score": 0.8}])
+        with mock.patch.object(retrieval, "search_knowledge", search):
+            result = await start_retrieval("Which CRMs do you support?", enabled=True).result(wait=1)
+        self.assertEqual(result.outcome, "used")
+        self.assertEqual(self.embedded, ["Which CRMs do you support?"])
+        search.assert_awaited_once_with([0.1, 0.2], limit=retrieval.RAG_TOP_K * 2)
+        self.assertIn("Salesforce and HubSpot", result.knowledge())
+        self.assertEqual(set(result.timings), {"intent_ms", "embed_ms", "search_ms", "wait_ms"})
+
+    async def test_finished_retrieval_adds_no_wait(self):
+        self.use_gateway()
+        with mock.patch.object(retrieval, "search_knowledge", mock.AsyncMock(return_value=[])):
+            pending = start_retrieval("Tell me about pricing", enabled=True)
+            await asyncio.sleep(0.05)  # history loading
+            result = await pending.result(wait=1)
+        self.assertEqual(result.outcome, "empty")
+        self.assertLess(result.timings["wait_ms"], 5)
+
+    async def test_late_retrieval_is_dropped(self):
+        async def slow(vector, limit):
+            await asyncio.sleep(5)
+
+        self.use_gateway()
+        with mock.patch.object(retrieval, "search_knowledge", slow):
+            pending = start_retrieval("Tell me about pricing", enabled=True)
+            result = await pending.result(wait=0.05)
+        self.assertEqual(result.outcome, "late")
+        self.assertIsNone(result.knowledge())
+        await asyncio.sleep(0)
+        self.assertTrue(pending._task.cancelled())
+
+    async def test_cancel(self):
+        async def slow(vector, limit):
+            await asyncio.sleep(5)
+
+        self.use_gateway()
+        with mock.patch.object(retrieval, "search_knowledge", slow):
+            pending = start_retrieval("Tell me about pricing", enabled=True)
+            pending.cancel()
+            await asyncio.sleep(0)
+        self.assertTrue(pending._task.cancelled())
+        start_retrieval("hi", enabled=True).cancel()
+
+    async def test_failures_and_skips(self):
+        self.assertEqual((await start_retrieval("hi", enabled=True).result()).outcome, "skipped")
+        self.assertEqual((await start_retrieval("Tell me about pricing", enabled=False).result()).outcome, "skipped")
+        failing = mock.Mock(embed=mock.AsyncMock(side_effect=httpx.ConnectError("down")))
+        with mock.patch.object(retrieval, "embedding_service", failing):
+            result = await start_retrieval("Tell me about pricing", enabled=True).result(wait=1)
+        self.assertEqual(result.outcome, "failed")
+
+
+class TestSendMessage(unittest.TestCase):
+    """Test suite for the retrieval started by the chat endpoint"""
+
+    def test_retrieval_cancelled_when_loading_fails(self):
+        from fastapi.testclient import TestClient
+
+        import main
+        from rate_limit import RateLimiter
+
+        pending = mock.Mock(spec=retrieval.Retrieval)
+        with mock.patch.object(main, "rate_limiter", RateLimiter(enabled=False)), \
+                mock.patch.object(main, "start_retrieval", return_value=pending), \
+                mock.patch.object(main, "load_conversation", mock.AsyncMock(side_effect=ConnectionError("db down"))):
+            response = TestClient(main.app).post("/api/sales/message", json={"session_id": "s1", "message": "Pricing?"})
+        self.assertEqual(response.status_code, 500)
+        pending.cancel.assert_called_once_with()
+
+
+class TestPromptPlacement(unittest.TestCase):
+    """Test suite for where knowledge goes in the prompt"""
+
+    def test_knowledge_before_message_after_prefix(self):
+        history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"},
+                   {"role": "user", "content": "CRMs?"}]
+        plain = build_prompt(history, context={"company": "Acme"})
+        prompt = build_prompt(history, context={"company": "Acme"}, knowledge="Relevant: Salesforce")
+        self.assertEqual(prompt.cache_key, plain.cache_key)
+        self.assertEqual(prompt.messages[:-2], plain.messages[:-1])
+        self.assertEqual(prompt.messages[-2], {"role": "system", "content": "Relevant: Salesforce"})
+        self.assertEqual(prompt.messages[-1], history[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Unit tests for background startup warm-up.
+"""
+
+import asyncio
+import unittest
+from unittest import mock
+
+import redis_client
+from startup import Warmup
+
+
+class TestWarmup(unittest.IsolatedAsyncioTestCase):
+    """Test suite for running and reporting warm-up steps"""
+
+    async def test_steps_run_concurrently(self):
+        """Total time is the slowest step, not the sum"""
+        async def slow():
+            await asyncio.sleep(0.2)
+
+        warmup = Warmup(step_timeout=5)
+        warmup.start({"a": slow, "b": slow, "c": slow})
+        self.assertFalse(warmup.ready)
+        self.assertEqual(warmup.report()["steps"]["a"], {"status": "pending"})
+        self.assertTrue(await warmup.wait(5))
+        self.assertLess(warmup.total_ms, 500)
+        self.assertEqual({s["status"] for s in warmup.report()["steps"].values()}, {"ok"})
+
+    async def test_failures_and_timeouts_still_become_ready(self):
+        async def hang():
+            await asyncio.sleep(10)
+
+        async def boom():
+            raise ConnectionError("refused")
+
+        async def unavailable():
+            return False
+
+        completed = []
+        warmup = Warmup(step_timeout=0.1)
+        warmup.start({"hang": hang, "boom": boom, "off": unavailable}, on_complete=lambda: completed.append(1))
+        self.assertTrue(await warmup.wait(5))
+
+        steps = warmup.report()["steps"]
+        self.assertEqual(steps["hang"]["status"], "timeout")
+        self.assertEqual(steps["boom"]["status"], "failed")
+        self.assertIn("refused", steps["boom"]["error"])
+        self.assertEqual(steps["off"]["status"], "failed")
+        self.assertEqual(completed, [1])
+
+    async def test_stop_cancels(self):
+        async def hang():
+            await asyncio.sleep(10)
+
+        warmup = Warmup(step_timeout=30)
+        warmup.start({"hang": hang})
+        await warmup.stop()
+        self.assertFalse(warmup.ready)
+
+
+class TestLazyRedis(unittest.TestCase):
+    """Test suite for deferring the Redis connection to warm-up"""
+
+    def test_unreachable_redis_leaves_no_client(self):
+        with mock.patch.object(redis_client, "redis_client", None), \
+                mock.patch.object(redis_client, "REDIS_URL", "redis://127.0.0.1:1"):
+            self.assertFalse(redis_client.init_redis())
+            self.assertIsNone(redis_client.get_redis())
+            self.assertFalse(redis_client.cache_conversation("abc", {}))
+
+    def test_connects_once(self):
+        client = mock.Mock()
+        with mock.patch.object(redis_client, "redis_client", None), \
+                mock.patch.object(redis_client.redis, "from_url", return_value=client) as from_url:
+            self.assertTrue(redis_client.init_redis())
+            self.assertTrue(redis_client.init_redis())
+            self.assertIs(redis_client.get_redis(), client)
+        from_url.assert_called_once()
+        client.ping.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
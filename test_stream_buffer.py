@@ -0,0 +1,107 @@
+"""
+Unit tests for resumable stream buffering.
+"""
+
+import asyncio
+import unittest
+
+from stream_buffer import StreamBuffer, new_request_id
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+NODES = [{"type": "paragraph", "content": [{"type": "text", "text": f"node {i}"}]} for i in range(5)]
+
+
+class TestRequestId(unittest.TestCase):
+    """Test suite for request ids"""
+
+    def test_client_id_kept_when_safe(self):
+        self.assertEqual(new_request_id("req-1.a:b"), "req-1.a:b")
+        for requested in (None, "", "has space", "x" * 65, "a*b"):
+            with self.subTest(requested=requested):
+                self.assertRegex(new_request_id(requested), r"^[0-9a-f]{32}$")
+
+
+class TestDisabled(unittest.IsolatedAsyncioTestCase):
+    """Test suite for running without a buffer"""
+
+    async def test_ttl_zero_disables(self):
+        buffer = StreamBuffer(client=object(), ttl=0)
+        self.assertFalse(buffer.enabled)
+        self.assertFalse(await buffer.begin("s", "r", "fast"))
+        self.assertIsNone(await buffer.replay("s", "r", 0))
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestStreamBuffer(unittest.IsolatedAsyncioTestCase):
+    """Test suite for buffering and replaying nodes"""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        self.buffer = StreamBuffer(client=self.redis, ttl=60, wait_seconds=0)
+
+    async def _buffered(self, request_id="r1"):
+        await self.buffer.begin("s", request_id, "fast")
+        await self.buffer.store("s", request_id, NODES)
+
+    async def test_replay_remainder(self):
+        """A resume returns the nodes from the given index on"""
+        await self._buffered()
+        replay = await self.buffer.replay("s", "r1", 3)
+        self.assertEqual(replay.nodes, NODES[3:])
+        self.assertEqual((replay.start_index, replay.total_nodes, replay.speed), (3, 5, "fast"))
+        self.assertGreater(self.redis.ttl("stream_buffer:s:r1"), 0)
+
+    async def test_latest_request(self):
+        """Without a request id the session's latest stream is replayed"""
+        await self._buffered("r1")
+        await self._buffered("r2")
+        replay = await self.buffer.replay("s", None, 0)
+        self.assertEqual(replay.request_id, "r2")
+        self.assertEqual(replay.nodes, NODES)
+
+    async def test_past_the_end(self):
+        """Resuming after the last node replays nothing but still completes"""
+        await self._buffered()
+        replay = await self.buffer.replay("s", "r1", 9)
+        self.assertEqual((replay.nodes, replay.start_index, replay.total_nodes), ([], 5, 5))
+
+    async def test_unknown_or_unfinished(self):
+        """Nothing to resume for unknown requests or ones never generated"""
+        self.assertIsNone(await self.buffer.replay("s", "missing", 0))
+        await self.buffer.begin("s", "pending", "normal")
+        self.assertIsNone(await self.buffer.replay("s", "pending", 0))
+
+    async def test_waits_for_generation(self):
+        """A resume waits until the nodes are written elsewhere"""
+        buffer = StreamBuffer(client=self.redis, ttl=60, wait_seconds=2)
+        await buffer.begin("s", "r1", "normal")
+
+        async def generate():
+            await asyncio.sleep(0.2)
+            await buffer.store("s", "r1", NODES)
+
+        writer = asyncio.create_task(generate())
+        replay = await buffer.replay("s", "r1", 1)
+        await writer
+        self.assertEqual(replay.nodes, NODES[1:])
+
+    async def test_waiting_resumes_hold_no_threads(self):
+        """Many waiting resumes leave the default executor free"""
+        buffer = StreamBuffer(client=self.redis, ttl=60, wait_seconds=2)
+        await buffer.begin("s", "r1", "normal")
+        waiting = [asyncio.create_task(buffer.replay("s", "r1", 0)) for _ in range(50)]
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(await asyncio.wait_for(asyncio.to_thread(lambda: "free"), 0.5), "free")
+        await buffer.store("s", "r1", NODES)
+        replays = await asyncio.wait_for(asyncio.gather(*waiting), 2)
+        self.assertTrue(all(replay.nodes == NODES for replay in replays))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+"""
+Unit tests for write-behind turn persistence with the file queue.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import write_behind
+from write_behind import FileQueue, WriteBehind
+
+
+class TestFileQueue(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the append-only file queue."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "turns.wal")
+
+    def _queue(self):
+        queue = FileQueue(self.path, fsync=False)
+        queue.setup()
+        return queue
+
+    async def test_read_ack(self):
+        """Entries are read in order and the file is reset once all are acknowledged."""
+        queue = self._queue()
+        for i in range(3):
+            queue.append(json.dumps({"n": i}).encode())
+
+        entries = await queue.read(2, 10)
+        self.assertEqual([json.loads(payload)["n"] for _, payload in entries], [0, 1])
+        queue.ack([entry_id for entry_id, _ in entries])
+        self.assertEqual(queue.backlog(), 1)
+
+        entries = await queue.read(10, 10)
+        queue.ack([entry_id for entry_id, _ in entries])
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.assertEqual(await queue.read(10, 10), [])
+
+    async def test_unacknowledged_entries_replayed_after_restart(self):
+        """A new queue on the same file resumes from the last checkpoint."""
+        queue = self._queue()
+        for i in range(3):
+            queue.append(json.dumps({"n": i}).encode())
+        first = await queue.read(1, 10)
+        queue.ack([first[0][0]])
+        await queue.read(10, 10)  # read but never acknowledged: "crash"
+
+        restarted = self._queue()
+        entries = await restarted.read(10, 10)
+        self.assertEqual([json.loads(payload)["n"] for _, payload in entries], [1, 2])
+
+    async def test_rewind(self):
+        """A failed batch is read again after rewind()."""
+        queue = self._queue()
+        queue.append(b'{"n": 0}')
+        first = await queue.read(10, 10)
+        queue.rewind()
+        self.assertEqual(await queue.read(10, 10), first)
+
+    async def test_read_wakes_on_append(self):
+        """A blocked read returns as soon as a turn is appended."""
+        queue = self._queue()
+        reader = asyncio.create_task(queue.read(10, 5000))
+        await asyncio.sleep(0.01)
+        queue.append(b'{"n": 0}')
+        entries = await asyncio.wait_for(reader, 1)
+        self.assertEqual(len(entries), 1)
+
+    async def test_concurrent_append_and_ack(self):
+        """Turns appended while others are acknowledged are never truncated away."""
+        queue = self._queue()
+        writers, per_writer = 4, 200
+        received = []
+
+        def write(n):
+            for i in range(per_writer):
+                queue.append(json.dumps({"n": n * per_writer + i}).encode())
+                time.sleep(0.0005)  # let the consumer catch up and truncate
+
+        def consume():
+            deadline = time.monotonic() + 5
+            while len(received) < writers * per_writer and time.monotonic() < deadline:
+                entries = queue._read(20)
+                if entries:
+                    received.extend(json.loads(payload)["n"] for _, payload in entries)
+                    queue.ack([entry_id for entry_id, _ in entries])
+
+        # Widen the window between the size check and the truncate
+        getsize = os.path.getsize
+
+        def slow_getsize(path):
+            size = getsize(path)
+            time.sleep(0.001)
+            return size
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+        threads.append(threading.Thread(target=consume))
+        with mock.patch.object(write_behind.os.path, "getsize", slow_getsize):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sorted(received), list(range(writers * per_writer)))
+
+
+class TestWriteBehind(unittest.IsolatedAsyncioTestCase):
+    """Test suite for batching, retries and flush."""
+
+    async def asyncSetUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.appends = []
+        self.append_turns = mock.AsyncMock(side_effect=lambda appends: self.appends.append(appends))
+        patcher = mock.patch.object(write_behind, "append_turns", self.append_turns)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.writer = WriteBehind(mode="file", batch_size=50, block_ms=20)
+
+    async def asyncTearDown(self):
+        await self.writer.stop(timeout=1)
+
+    def _start(self):
+        queue = FileQueue(os.path.join(self.dir.name, "turns.wal"), fsync=False)
+        self.writer.start(queue)
+        return queue
+
+    async def test_turns_grouped_per_session(self):
+        """Queued turns are written one append per session per batch, in order."""
+        # Hold the database write until every turn is queued
+        release = asyncio.Event()
+
+        async def append_turns(appends):
+            await release.wait()
+            self.appends.append(appends)
+
+        self.append_turns.side_effect = append_turns
+        queue = self._start()
+        await self.writer.enqueue("a", [{"role": "user", "content": "1"}], email="a@b")
+        await self.writer.enqueue("b", [{"role": "user", "content": "2"}])
+        await self.writer.enqueue("a", [{"role": "user", "content": "3"}])
+        self.assertEqual([m["content"] for m in self.writer.pending_messages("a")], ["1", "3"])
+
+        release.set()
+        self.assertTrue(await self.writer.flush(timeout=2))
+        by_session = {}
+        for batch in self.appends:
+            sessions = [session_id for session_id, _, _ in batch]
+            self.assertEqual(len(sessions), len(set(sessions)))
+            for session_id, messages, email in batch:
+                by_session.setdefault(session_id, ([], email))[0].extend(messages)
+        self.assertEqual([m["content"] for m in by_session["a"][0]], ["1", "3"])
+        self.assertEqual(by_session["a"][1], "a@b")
+        self.assertTrue(all("turn_id" in m for m in by_session["a"][0]))
+        self.assertEqual(self.writer.pending_messages("a"), [])
+        self.assertEqual(queue.backlog(), 0)
+
+    async def test_failed_batch_retried(self):
+        """A failed write is not acknowledged and is retried."""
+        self.append_turns.side_effect = [ConnectionError("db down"), None]
+        with mock.patch.object(write_behind.asyncio, "sleep", mock.AsyncMock()):
+            self._start()
+            await self.writer.enqueue("a", [{"role": "user", "content": "1"}])
+            self.assertTrue(await self.writer.flush(timeout=2))
+        self.assertEqual(self.append_turns.await_count, 2)
+
+    async def test_pending_turns_capped(self):
+        """While the database is down, enqueue refuses beyond max_pending."""
+        self.append_turns.side_effect = ConnectionError("db down")
+        self.writer.max_pending = 2
+        self._start()
+        await self.writer.enqueue("a", [{"role": "user", "content": "1"}])
+        await self.writer.enqueue("a", [{"role": "user", "content": "2"}])
+        with self.assertRaises(write_behind.WriteBehindFull):
+            await self.writer.enqueue("a", [{"role": "user", "content": "3"}])
+        self.assertEqual((await self.writer.stats())["pending_local"], 2)
+        await self.writer.stop(timeout=0)
+
+    async def test_disabled_without_queue(self):
+        """WRITE_BEHIND=off never starts a consumer."""
+        writer = WriteBehind(mode="off")
+        writer.start()
+        self.assertFalse(writer.enabled)
+        self.assertEqual(await writer.stats(), {"mode": "off"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,409 @@
+"""
+Write Behind - Persist chat turns to Postgres after the response is sent
+
+With WRITE_BEHIND=redis (or file), send_message appends each turn to a
+durable queue and returns; a background consumer reads turns in batches and
+appends them to their conversations in one transaction per batch. Turns are
+acknowledged only after the commit, so a crash replays them, and every
+message carries its turn_id so a replayed turn is not appended twice.
+
+Queues:
+- redis: a Redis stream with a consumer group. Entries left pending by a
+  dead process are claimed after WRITE_BEHIND_CLAIM_IDLE_MS.
+- file: an append-only local file plus an offset checkpoint. Single process
+  only; meant for tests and local development.
+
+Queue I/O (XADD/XACK, file appends and fsync) runs in worker threads, off
+the event loop. At most WRITE_BEHIND_MAX_PENDING turns of this process may
+wait to be written; beyond that enqueue() refuses and callers write
+synchronously, so a database outage can't grow memory without bound.
+
+One consumer writes a conversation's turns in queue order. With several
+replicas consuming, two turns of one conversation queued within the same
+batch window can be written by different replicas in either order.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from conversation_store import append_turns
+from metrics import (
+    WRITE_BEHIND_BATCHES, WRITE_BEHIND_LAG_SECONDS, WRITE_BEHIND_PENDING, WRITE_BEHIND_TURNS
+)
+from redis_client import get_redis, invalidate_cache
+
+logger = logging.getLogger(__name__)
+
+# off|redis|file
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "off").lower()
+
+WRITE_BEHIND_STREAM = os.getenv("WRITE_BEHIND_STREAM", "conversation_turns")
+WRITE_BEHIND_GROUP = os.getenv("WRITE_BEHIND_GROUP", "persisters")
+WRITE_BEHIND_WAL_PATH = os.getenv("WRITE_BEHIND_WAL_PATH", "write_behind.wal")
+
+# Turns written per transaction, and how long a read waits for the first one
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))
+WRITE_BEHIND_BLOCK_MS = int(os.getenv("WRITE_BEHIND_BLOCK_MS", "500"))
+
+# Pending entries of other consumers idle this long are taken over
+WRITE_BEHIND_CLAIM_IDLE_MS = int(os.getenv("WRITE_BEHIND_CLAIM_IDLE_MS", "60000"))
+
+# Seconds shutdown waits for this process's queued turns to be written
+WRITE_BEHIND_FLUSH_TIMEOUT = float(os.getenv("WRITE_BEHIND_FLUSH_TIMEOUT", "10"))
+
+# Unwritten turns this process may hold before enqueue() refuses
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+
+# fsync the file queue after every append
+WRITE_BEHIND_FSYNC = os.getenv("WRITE_BEHIND_FSYNC", "true").lower() == "true"
+
+if WRITE_BEHIND not in ("off", "redis", "file"):
+    logger.warning(f"Unknown WRITE_BEHIND '{WRITE_BEHIND}', using 'off'")
+    WRITE_BEHIND = "off"
+
+
+class WriteBehindFull(RuntimeError):
+    """Raised by enqueue() while too many turns are waiting to be written"""
+
+
+class RedisStreamQueue:
+    """Turn queue on a Redis stream, consumed through a consumer group"""
+
+    def __init__(self, client, stream: str = WRITE_BEHIND_STREAM, group: str = WRITE_BEHIND_GROUP):
+        self.client = client
+        self.stream = stream
+        self.group = group
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        # Re-read our own pending entries first (after a restart or a failed batch)
+        self._replay = True
+        self._next_claim = 0.0
+
+    def setup(self):
+        try:
+            self.client.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def append(self, payload: bytes) -> str:
+        return self.client.xadd(self.stream, {"turn": payload})
+
+    def _read(self, count: int, block_ms: int) -> List[Tuple[bytes, bytes]]:
+        if self._replay:
+            response = self.client.xreadgroup(self.group, self.consumer, {self.stream: "0"}, count=count)
+            entries = response[0][1] if response else []
+            if entries:
+                return [(entry_id, fields[b"turn"]) for entry_id, fields in entries]
+            self._replay = False
+
+        if time.monotonic() >= self._next_claim:
+            self._next_claim = time.monotonic() + WRITE_BEHIND_CLAIM_IDLE_MS / 1000
+            claimed = self.client.xautoclaim(
+                self.stream, self.group, self.consumer, WRITE_BEHIND_CLAIM_IDLE_MS, count=count
+            )
+            entries = [(entry_id, fields[b"turn"]) for entry_id, fields in claimed[1] if fields]
+            if entries:
+                logger.warning("Claimed %s write-behind turns from idle consumers", len(entries))
+                return entries
+
+        response = self.client.xreadgroup(
+            self.group, self.consumer, {self.stream: ">"}, count=count, block=block_ms
+        )
+        return [(entry_id, fields[b"turn"]) for entry_id, fields in response[0][1]] if response else []
+
+    async def read(self, count: int, block_ms: int) -> List[Tuple[bytes, bytes]]:
+        # XREADGROUP blocks, so it runs off the event loop
+        return await asyncio.to_thread(self._read, count, block_ms)
+
+    def ack(self, entry_ids: List[bytes]):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.xack(self.stream, self.group, *entry_ids)
+        pipe.xdel(self.stream, *entry_ids)
+        pipe.execute()
+
+    def rewind(self):
+        self._replay = True
+
+    def backlog(self) -> int:
+        return self.client.xlen(self.stream)
+
+
+class FileQueue:
+    """
+    Turn queue in an append-only file, one JSON line per turn.
+
+    The byte offset up to which turns are persisted is checkpointed in
+    `<path>.offset`; once everything is persisted both files are truncated.
+    Appends, reads and acks run in worker threads and hold one lock, so a
+    turn can't be appended between the size check and the truncate.
+    """
+
+    def __init__(self, path: str = WRITE_BEHIND_WAL_PATH, fsync: bool = WRITE_BEHIND_FSYNC):
+        self.path = path
+        self.offset_path = f"{path}.offset"
+        self.fsync = fsync
+        self._committed = 0
+        self._position = 0
+        self._appended = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def setup(self):
+        open(self.path, "ab").close()
+        try:
+            with open(self.offset_path) as f:
+                self._committed = int(f.read().strip() or 0)
+        except FileNotFoundError:
+            self._committed = 0
+        self._committed = min(self._committed, os.path.getsize(self.path))
+        self._position = self._committed
+
+    def append(self, payload: bytes) -> int:
+        with self._lock, open(self.path, "ab") as f:
+            f.write(payload + b"\n")
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            end = f.tell()
+        # Appends come from worker threads; wake the reader on its loop
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._appended.set)
+        else:
+            self._appended.set()
+        return end
+
+    async def read(self, count: int, block_ms: int) -> List[Tuple[int, bytes]]:
+        self._loop = asyncio.get_running_loop()
+        entries = await asyncio.to_thread(self._read, count)
+        if not entries:
+            self._appended.clear()
+            try:
+                await asyncio.wait_for(self._appended.wait(), block_ms / 1000)
+            except asyncio.TimeoutError:
+                return []
+            entries = await asyncio.to_thread(self._read, count)
+        return entries
+
+    def _read(self, count: int) -> List[Tuple[int, bytes]]:
+        entries = []
+        with self._lock, open(self.path, "rb") as f:
+            f.seek(self._position)
+            while len(entries) < count:
+                line = f.readline()
+                # A line without its newline is still being written
+                if not line.endswith(b"\n"):
+                    break
+                entries.append((f.tell(), line.rstrip(b"\n")))
+            if entries:
+                self._position = entries[-1][0]
+        return entries
+
+    def ack(self, entry_ids: List[int]):
+        with self._lock:
+            self._ack(max(entry_ids))
+
+    def _ack(self, committed: int):
+        if committed >= os.path.getsize(self.path):
+            # Everything is persisted: start both files over. The checkpoint
+            # is reset first; a crash in between only replays written turns
+            self._write_checkpoint(0)
+            with open(self.path, "wb"):
+                pass
+            self._committed = self._position = 0
+        else:
+            self._write_checkpoint(committed)
+            self._committed = committed
+
+    def _write_checkpoint(self, offset: int):
+        tmp = f"{self.offset_path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(str(offset))
+        os.replace(tmp, self.offset_path)
+
+    def rewind(self):
+        with self._lock:
+            self._position = self._committed
+
+    def backlog(self) -> int:
+        with self._lock, open(self.path, "rb") as f:
+            f.seek(self._committed)
+            return sum(1 for _ in f)
+
+
+class WriteBehind:
+    """
+    Queue chat turns and write them to Postgres in background batches.
+
+    `pending_messages(session_id)` returns the messages of turns this
+    process queued that are not written yet, so a follow-up message on the
+    same replica sees them in its history.
+    """
+
+    def __init__(self, mode: str = WRITE_BEHIND, batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 block_ms: int = WRITE_BEHIND_BLOCK_MS, max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self.mode = mode
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.max_pending = max_pending
+        self.queue = None
+        self._task: Optional[asyncio.Task] = None
+        # turn_id -> turn, for turns queued by this process
+        self._pending: "OrderedDict[str, Dict]" = OrderedDict()
+        self._persisted = asyncio.Event()
+
+    @property
+    def enabled(self) -> bool:
+        return self.queue is not None
+
+    def start(self, queue=None):
+        """Open the queue and start the consumer; no-op when WRITE_BEHIND=off"""
+        if self._task is not None:
+            return
+        if queue is None:
+            if self.mode == "redis":
+                client = get_redis()
+                if client is None:
+                    logger.warning("WRITE_BEHIND=redis but Redis is unavailable; writing synchronously")
+                    return
+                queue = RedisStreamQueue(client)
+            elif self.mode == "file":
+                queue = FileQueue()
+            else:
+                return
+        queue.setup()
+        self.queue = queue
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"📝 Write-behind enabled ({type(queue).__name__}, batch={self.batch_size})")
+
+    async def enqueue(self, session_id: str, messages: List[Dict], email: str = None) -> str:
+        """
+        Durably queue one turn and return its turn_id.
+
+        The turn_id is added to every message. Raises if the queue is
+        unavailable, or WriteBehindFull while max_pending turns are
+        unwritten; callers then write synchronously.
+        """
+        if len(self._pending) >= self.max_pending:
+            raise WriteBehindFull(f"{len(self._pending)} turns are waiting to be written")
+        turn_id = uuid.uuid4().hex
+        messages = [{**message, "turn_id": turn_id} for message in messages]
+        turn = {
+            "turn_id": turn_id,
+            "session_id": session_id,
+            "email": email,
+            "messages": messages,
+            "enqueued_at": time.time(),
+        }
+        # Registered before the append: the consumer may write the turn
+        # before the append call returns
+        self._pending[turn_id] = turn
+        try:
+            await asyncio.to_thread(self.queue.append, json.dumps(turn).encode("utf-8"))
+        except BaseException:
+            self._pending.pop(turn_id, None)
+            raise
+        finally:
+            WRITE_BEHIND_PENDING.set(len(self._pending))
+        return turn_id
+
+    def pending_messages(self, session_id: str) -> List[Dict]:
+        """Messages of this process's unwritten turns for a session, in order"""
+        messages = []
+        for turn in self._pending.values():
+            if turn["session_id"] == session_id:
+                messages.extend(turn["messages"])
+        return messages
+
+    async def _run(self):
+        failures = 0
+        while True:
+            try:
+                entries = await self.queue.read(self.batch_size, self.block_ms)
+                if not entries:
+                    continue
+                await self._write(entries)
+                await asyncio.to_thread(self.queue.ack, [entry_id for entry_id, _ in entries])
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                WRITE_BEHIND_BATCHES.labels("failed").inc()
+                logger.error(f"Write-behind batch failed (attempt {failures}): {e}")
+                self.queue.rewind()
+                await asyncio.sleep(min(30.0, 0.5 * 2 ** min(failures, 6)))
+
+    async def _write(self, entries: List[Tuple[object, bytes]]):
+        # One append per session, turns in queue order
+        appends: "OrderedDict[str, Tuple[List[Dict], Optional[str]]]" = OrderedDict()
+        turns = []
+        for _, payload in entries:
+            turn = json.loads(payload)
+            turns.append(turn)
+            messages, email = appends.setdefault(turn["session_id"], ([], turn.get("email")))
+            messages.extend(turn["messages"])
+
+        await append_turns([(session_id, messages, email) for session_id, (messages, email) in appends.items()])
+
+        now = time.time()
+        for turn in turns:
+            WRITE_BEHIND_LAG_SECONDS.observe(max(0.0, now - turn["enqueued_at"]))
+            self._pending.pop(turn["turn_id"], None)
+        for session_id in appends:
+            invalidate_cache(session_id)
+        WRITE_BEHIND_TURNS.inc(len(turns))
+        WRITE_BEHIND_BATCHES.labels("ok").inc()
+        WRITE_BEHIND_PENDING.set(len(self._pending))
+        self._persisted.set()
+        logger.debug("Wrote %s turns for %s conversations", len(turns), len(appends))
+
+    async def flush(self, timeout: float = WRITE_BEHIND_FLUSH_TIMEOUT) -> bool:
+        """Wait until every turn queued by this process is written"""
+        deadline = time.monotonic() + timeout
+        while self._pending and self._task is not None and not self._task.done():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._persisted.clear()
+            try:
+                await asyncio.wait_for(self._persisted.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return not self._pending
+
+    async def stop(self, timeout: float = WRITE_BEHIND_FLUSH_TIMEOUT):
+        """Flush this process's turns, then stop the consumer"""
+        if self._task is None:
+            return
+        if not await self.flush(timeout):
+            logger.warning(
+                f"Write-behind stopped with {len(self._pending)} turns unwritten; they stay queued and are replayed"
+            )
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.queue = None
+
+    async def stats(self) -> Dict:
+        """Queue status for /health"""
+        if not self.enabled:
+            return {"mode": "off"}
+        try:
+            backlog = await asyncio.to_thread(self.queue.backlog)
+        except Exception:
+            backlog = None
+        return {"mode": self.mode, "pending_local": len(self._pending), "backlog": backlog}
+
+
+write_behind = WriteBehind()